@@ -0,0 +1,56 @@
+"""
+Throughput of insert_batch(k) against insert_next in vertices per second.
+Every configuration inserts the same number of vertices, the best of
+--repeat runs is reported together with the pixels scanned per vertex and
+the greatest remaining error, which shows the deviation from greedy order.
+
+    python -m benchmarks.bench_batch --vertices 15000 --batch 1 8 32 128
+"""
+
+import argparse
+import time
+
+from grid2tin.triangulation import Triangulation
+
+from .bench_lazy import DGM5, synthetic_dem
+
+
+def run(dem, vertices, k):
+    tri = Triangulation(dem, minimum_gap=0, keep_history=False)
+    start = time.perf_counter()
+    while len(tri.vertex_dict) < vertices:
+        if k:
+            tri.insert_batch(min(k, vertices - len(tri.vertex_dict)))
+        else:
+            tri.insert_next()
+    elapsed = time.perf_counter() - start
+    inserted = len(tri.vertex_dict) - 4
+    return (inserted / elapsed, tri.pixels_scanned / inserted,
+            tri.heap.max()[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--vertices', type=int, default=10000)
+    parser.add_argument('--size', type=int, default=800)
+    parser.add_argument('--batch', type=int, nargs='+',
+                        default=[1, 4, 16, 64, 256])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for name, dem in (('dgm5.tif', DGM5),
+                      ('synthetic {0}x{0}'.format(args.size),
+                       synthetic_dem(args.size))):
+        print('{}, {} vertices'.format(name, args.vertices))
+        print('{:>14}{:>12}{:>14}{:>14}'.format('', 'vertices/s',
+                                                'pixels/vertex', 'max error'))
+        for k in [0] + args.batch:
+            runs = [run(dem, args.vertices, k) for _ in range(args.repeat)]
+            rate = max(r[0] for r in runs)
+            label = 'insert_next' if k == 0 else 'batch {}'.format(k)
+            print('{:>14}{:>12.0f}{:>14.1f}{:>14.3f}'.format(
+                label, rate, runs[0][1], runs[0][2]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Write time and file size of every mesh export format for a triangulation of
+test/data/dgm5.tif.
+
+    python -m benchmarks.bench_export --vertices 20000
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from grid2tin.triangulation import Triangulation
+
+from .bench_lazy import DGM5
+
+FORMATS = ('obj', 'ply', 'stl', 'glb', 'npz')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--vertices', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    tri = Triangulation(DGM5, minimum_gap=0, keep_history=False)
+    while len(tri.vertex_dict) < args.vertices:
+        tri.insert_next()
+    print('dgm5.tif, {} vertices, {} triangles'.format(
+        len(tri.vertex_dict), len(tri.live_triangles)))
+    print('{:<6}{:>12}{:>14}'.format('format', 'write [s]', 'size [bytes]'))
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name in FORMATS:
+            filename = os.path.join(directory, 'mesh.' + name)
+            writer = getattr(tri, 'write_' + name)
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                writer(filename)
+                times.append(time.perf_counter() - start)
+            print('{:<6}{:>12.4f}{:>14}'.format(
+                name, statistics.median(times), os.path.getsize(filename)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Throughput of insert, pop, delete and change_key of grid2tin.heap.Heap
+compared to the heap of the first commit (float32 keys, no id reuse), which
+is loaded with git show. The old heap has no change_key, it is emulated by
+delete plus insert as Triangulation used to do.
+
+    python -m benchmarks.bench_heap --size 200000
+"""
+
+import argparse
+import random
+import subprocess
+import time
+import types
+
+from grid2tin.heap import Heap
+
+from .bench_import import ROOT
+
+
+def baseline_heap():
+    root = subprocess.check_output(
+        ['git', 'rev-list', '--max-parents=0', 'HEAD'], cwd=ROOT,
+        universal_newlines=True).split()[0]
+    source = subprocess.check_output(
+        ['git', 'show', root + ':grid2tin/heap.py'], cwd=ROOT,
+        universal_newlines=True)
+    module = types.ModuleType('baseline_heap')
+    exec(source, module.__dict__)
+    return module.Heap
+
+
+def timed(function, n):
+    start = time.perf_counter()
+    function()
+    return n / (time.perf_counter() - start)
+
+
+def run(heap_class, keys, new_keys):
+    n = len(keys)
+    result = {}
+    heap = heap_class()
+    ids = []
+    result['insert'] = timed(
+        lambda: ids.extend(heap.insert(k, None) for k in keys), n)
+
+    def change():
+        if hasattr(heap, 'change_key'):
+            for i, k in zip(ids, new_keys):
+                heap.change_key(i, k)
+        else:
+            for j, (i, k) in enumerate(zip(ids, new_keys)):
+                heap.delete(i)
+                ids[j] = heap.insert(k, None)
+    result['change_key'] = timed(change, n)
+
+    def delete():
+        for i in ids[::2]:
+            heap.delete(i)
+    result['delete'] = timed(delete, len(ids[::2]))
+    result['pop'] = timed(lambda: [heap.pop() for _ in range(len(heap.pq) - 1)],
+                          n - len(ids[::2]))
+    result['slots'] = len(heap.keys) - 1
+
+    if hasattr(heap, 'heapify'):
+        heap = heap_class()
+        result['heapify'] = timed(lambda: heap.heapify(keys, [None] * n), n)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', type=int, default=200000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    keys = [rng.uniform(0, 1000) for _ in range(args.size)]
+    new_keys = [rng.uniform(0, 1000) for _ in range(args.size)]
+
+    results = [('baseline', run(baseline_heap(), keys, new_keys)),
+               ('current', run(Heap, keys, new_keys))]
+    print('operations per second, {} elements'.format(args.size))
+    print('{:<12}'.format('') + ''.join('{:>14}'.format(name)
+                                        for name, _ in results))
+    for op in ('insert', 'change_key', 'delete', 'pop', 'heapify', 'slots'):
+        row = ['{:>14.0f}'.format(r[op]) if op in r else '{:>14}'.format('-')
+               for _, r in results]
+        print('{:<12}'.format(op) + ''.join(row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Cold start of ``import grid2tin.triangulation`` with the ahead-of-time
+compiled extension, compared to compiling calculation.pyx with pyximport on
+first import (the former behaviour) and to the pure-Python fallback.
+
+Every measurement runs in a fresh interpreter, pyximport gets an empty build
+directory each time so it has to compile, as in a new worker container.
+
+    python setup.py build_ext --inplace
+    python -m benchmarks.bench_import
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMPILED = "import grid2tin.triangulation"
+
+PYXIMPORT = """
+import sys
+import pyximport
+pyximport.install(build_dir={build_dir!r}, language_level=3)
+sys.path.insert(0, {src_dir!r})
+import calculation
+import grid2tin.triangulation
+"""
+
+FALLBACK = """
+import sys
+sys.modules['grid2tin.calculation'] = None
+import grid2tin.triangulation
+"""
+
+
+def run(code, env=None):
+    start = time.perf_counter()
+    subprocess.check_call([sys.executable, '-c', code], cwd=ROOT, env=env,
+                          stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def measure_pyximport():
+    tmp = tempfile.mkdtemp()
+    try:
+        src_dir = os.path.join(tmp, 'src')
+        os.mkdir(src_dir)
+        shutil.copy(os.path.join(ROOT, 'grid2tin', 'calculation.pyx'), src_dir)
+        code = PYXIMPORT.format(build_dir=os.path.join(tmp, 'build'),
+                                src_dir=src_dir)
+        return run(code)
+    finally:
+        shutil.rmtree(tmp)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', '--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    results = {
+        'compiled': [run(COMPILED) for _ in range(args.repeat)],
+        'pyximport (cold)': [measure_pyximport() for _ in range(args.repeat)],
+        'pure-Python fallback': [run(FALLBACK) for _ in range(args.repeat)],
+    }
+    for name, times in results.items():
+        print('{:<22} median {:7.3f} s   min {:7.3f} s'.format(
+            name, statistics.median(times), min(times)))
+
+
+if __name__ == '__main__':
+    main()
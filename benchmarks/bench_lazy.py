@@ -0,0 +1,67 @@
+"""
+Pixels scanned per inserted vertex with eager and lazy rescanning.
+
+Both modes run the same number of insertions. The script reports the time,
+the pixels scanned per inserted vertex and whether both final meshes are
+identical. For minimum_gap=0 they only differ where
+equal errors are popped from the heap in a different order.
+
+    python -m benchmarks.bench_lazy --vertices 5000
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from grid2tin.triangulation import Triangulation
+
+DGM5 = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    'test', 'data', 'dgm5.tif')
+
+
+def synthetic_dem(size, seed=0):
+    rng = np.random.RandomState(seed)
+    x = np.linspace(0, 8 * np.pi, size)
+    mx, my = np.meshgrid(x, x)
+    return 50 * np.sin(mx) * np.cos(0.7 * my) + 3 * mx + \
+        rng.normal(0, 0.5, (size, size))
+
+
+def run(dem, vertices, minimum_gap, lazy):
+    start = time.perf_counter()
+    tri = Triangulation(dem, minimum_gap=minimum_gap, lazy=lazy)
+    while len(tri.vertex_dict) < vertices:
+        tri.insert_next()
+    elapsed = time.perf_counter() - start
+    inserted = len(tri.vertex_dict) - 4
+    mesh = sorted(tuple(sorted((v.x, v.y) for v in t.vertices))
+                  for t in tri.triangles)
+    return elapsed, tri.pixels_scanned / inserted, mesh
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--vertices', type=int, default=5000)
+    parser.add_argument('--size', type=int, default=1000)
+    parser.add_argument('--minimum-gap', type=int, default=0)
+    args = parser.parse_args()
+
+    for name, dem in (('dgm5.tif', DGM5),
+                      ('synthetic {0}x{0}'.format(args.size),
+                       synthetic_dem(args.size))):
+        print('{}, {} vertices, minimum_gap={}'.format(
+            name, args.vertices, args.minimum_gap))
+        meshes = []
+        for lazy in (False, True):
+            elapsed, pixels, mesh = run(dem, args.vertices, args.minimum_gap,
+                                        lazy)
+            meshes.append(mesh)
+            print('  {:<6} {:7.2f} s   {:9.1f} pixels scanned per vertex'.format(
+                'lazy' if lazy else 'eager', elapsed, pixels))
+        print('  identical mesh: {}'.format(meshes[0] == meshes[1]))
+
+
+if __name__ == '__main__':
+    main()
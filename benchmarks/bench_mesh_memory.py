@@ -0,0 +1,99 @@
+"""
+Memory and time of the two mesh backends of Triangulation.
+
+Runs the same greedy insertion on a synthetic DEM with the object based
+quad-edge structures and with the array-backed ArrayMesh, each with and
+without the history DAG, and reports the memory held by the triangulation
+(tracemalloc) next to the run time. A
+second measurement isolates the topology: a strip of connected edges built
+with each backend's make_edge / connect / splice.
+
+    python -m benchmarks.bench_mesh_memory --size 512 --vertices 20000
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+import numpy as np
+
+from grid2tin.arraymesh import ArrayMesh
+from grid2tin.quadedge import QuadEdgeMesh, Vertex
+from grid2tin.triangulation import Triangulation
+
+
+def synthetic_dem(size, seed=0):
+    rng = np.random.RandomState(seed)
+    x = np.linspace(0, 8 * np.pi, size)
+    mx, my = np.meshgrid(x, x)
+    return 50 * np.sin(mx) * np.cos(0.7 * my) + rng.normal(0, 1, (size, size))
+
+
+def measure(func):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, current, peak
+
+
+def triangulate(dem, backend, keep_history, vertices):
+    def run():
+        tri = Triangulation(dem, minimum_gap=1, backend=backend,
+                            keep_history=keep_history)
+        while len(tri.vertex_dict) < vertices:
+            tri.insert_next()
+        return tri
+    return run
+
+
+def edge_strip(mesh, vertices):
+    def run():
+        e = mesh.make_edge(vertices[0], vertices[1])
+        first = e
+        for v in vertices[2:]:
+            f = mesh.make_edge(e.destination, v)
+            mesh.splice(e.sym, f)
+            e = f
+        mesh.connect(e, first)
+        return mesh
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', type=int, default=512)
+    parser.add_argument('--vertices', type=int, default=20000)
+    parser.add_argument('--edges', type=int, default=200000)
+    args = parser.parse_args()
+
+    dem = synthetic_dem(args.size)
+    print('Triangulation of a {0}x{0} DEM up to {1} vertices'.format(
+        args.size, args.vertices))
+    for backend in ('quadedge', 'array'):
+        for keep_history in (True, False):
+            tri, elapsed, current, peak = measure(
+                triangulate(dem, backend, keep_history, args.vertices))
+            name = backend + ('' if keep_history else ', no history')
+            print('  {:<21} {:7.2f} s   held {:8.1f} MB   peak {:8.1f} MB'.format(
+                name, elapsed, current / 2 ** 20, peak / 2 ** 20))
+            del tri
+
+    print('Edge strip with {} quad-edges'.format(args.edges))
+    for name, mesh in (('quadedge', QuadEdgeMesh()), ('array', ArrayMesh())):
+        # Vertices are created outside of the measurement, both backends
+        # reference the same kind of Vertex objects
+        vertices = [Vertex(i, i % 2) for i in range(args.edges)]
+        result, elapsed, current, peak = measure(edge_strip(mesh, vertices))
+        print('  {:<21} {:7.2f} s   held {:8.1f} MB   {:6.0f} bytes/edge'.format(
+            name, elapsed, current / 2 ** 20, current / args.edges))
+        del result, vertices
+
+
+if __name__ == '__main__':
+    main()
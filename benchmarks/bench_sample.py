@@ -0,0 +1,67 @@
+"""
+Throughput of Triangulation.sample for random query points on a
+triangulation of test/data/dgm5.tif, against locating points one by one
+with Triangulation.search on a subset.
+
+    python -m benchmarks.bench_sample --points 1000000 --vertices 20000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from grid2tin.pointindex import PointIndex
+from grid2tin.quadedge import Vertex
+from grid2tin.triangulation import Triangulation
+
+from .bench_lazy import DGM5
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--points', type=int, default=1000000)
+    parser.add_argument('--vertices', type=int, default=20000)
+    parser.add_argument('--search-points', type=int, default=5000)
+    args = parser.parse_args()
+
+    tri = Triangulation(DGM5, minimum_gap=0)
+    tri.refine(max_vertices=args.vertices)
+    print('dgm5.tif, {} vertices, {} triangles, {} points'.format(
+        len(tri.vertex_dict), len(tri.live_triangles), args.points))
+
+    rng = np.random.RandomState(0)
+    xs = rng.uniform(0, tri.max_x, args.points)
+    ys = rng.uniform(0, tri.max_y, args.points)
+
+    start = time.perf_counter()
+    index = PointIndex(*tri.mesh_arrays())
+    build = time.perf_counter() - start
+    print('{:<24}{:>10.3f} s  ({:.0f} cells, {:.1f} faces per cell)'.format(
+        'index build', build, index.rows * index.columns,
+        len(index.cell_faces) / (index.rows * index.columns)))
+
+    start = time.perf_counter()
+    tri.sample(xs, ys)
+    elapsed = time.perf_counter() - start
+    print('{:<24}{:>10.3f} s  {:>12.0f} points/s'.format(
+        'sample incl. build', elapsed, args.points / elapsed))
+
+    start = time.perf_counter()
+    z, ids = tri.sample(xs, ys)
+    elapsed = time.perf_counter() - start
+    print('{:<24}{:>10.3f} s  {:>12.0f} points/s'.format(
+        'sample', elapsed, args.points / elapsed))
+
+    n = args.search_points
+    start = time.perf_counter()
+    for x, y in zip(xs[:n].tolist(), ys[:n].tolist()):
+        t = tri.search(Vertex(x, y)).triangle
+        t.a * x + t.b * y + t.c
+    elapsed = time.perf_counter() - start
+    print('{:<24}{:>10.3f} s  {:>12.0f} points/s  ({} points)'.format(
+        'search per point', elapsed, n / elapsed, n))
+
+
+if __name__ == '__main__':
+    main()
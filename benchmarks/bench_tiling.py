@@ -0,0 +1,50 @@
+"""
+Speedup of the tiled triangulation with the number of worker processes on a
+synthetic DEM. Every run builds the same mesh, only the pool size differs.
+
+    python -m benchmarks.bench_tiling --size 4000 --tile-size 500
+"""
+
+import argparse
+import os
+import time
+
+from grid2tin.tiling import TiledTriangulation
+
+from .bench_lazy import synthetic_dem
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', type=int, default=2000)
+    parser.add_argument('--tile-size', type=int, default=250)
+    parser.add_argument('--max-error', type=float, default=2.0)
+    parser.add_argument('--workers', type=int, nargs='+')
+    args = parser.parse_args()
+
+    workers = args.workers
+    if not workers:
+        cpus = os.cpu_count() or 1
+        workers = sorted({1, cpus} | {2 ** i for i in range(cpus.bit_length())
+                                      if 2 ** i <= cpus})
+
+    dem = synthetic_dem(args.size)
+    print('synthetic {0}x{0}, tiles of {1} px, max_error {2}, {3} CPUs'.format(
+        args.size, args.tile_size, args.max_error, os.cpu_count()))
+    print('{:>8}{:>10}{:>9}{:>11}'.format('workers', 'time [s]', 'speedup',
+                                          'vertices'))
+    reference = None
+    for n in workers:
+        tiled = TiledTriangulation(dem, tile_size=args.tile_size,
+                                   max_error=args.max_error, workers=n)
+        start = time.perf_counter()
+        vertices, faces = tiled.run()
+        elapsed = time.perf_counter() - start
+        reference = reference or elapsed
+        print('{:>8}{:>10.2f}{:>9.2f}{:>11}'.format(n, elapsed,
+                                                    reference / elapsed,
+                                                    len(vertices)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+"""
+Benchmark suite of the triangulation pipeline, with results written to JSON
+so that runs can be compared across changes.
+
+Every case runs in a fresh interpreter, so the peak resident set size of
+one case is not inflated by the ones before it. A case is repeated and the
+fastest wall time is kept. Cases:
+
+    construct/dgm5               Triangulation of test/data/dgm5.tif
+    construct/synthetic-N        Triangulation of a synthetic N x N DEM
+    insert_next/V                insert_next up to V vertices, 1000 x 1000
+    insert_points                10000 random points with insert_points
+    scan_triangle                scan of the two initial triangles
+    mark_availability            disks and segments of mark_availability
+    heap                         insert, change_key and pop of the Heap
+    interpolated_map             interpolated_map of a 20000 vertex mesh
+    write_obj                    write_obj of the same mesh
+
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --output after.json --sizes 1000 4000 16000
+    python -m benchmarks.suite --compare before.json after.json
+"""
+
+import argparse
+import datetime
+import fnmatch
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from grid2tin import triangulation
+from grid2tin.heap import Heap
+from grid2tin.quadedge import Vertex
+from grid2tin.triangulation import Triangulation
+
+from .bench_import import ROOT
+
+DGM5 = os.path.join(ROOT, 'test', 'data', 'dgm5.tif')
+
+# DEM size and vertex count of the insert_next, interpolated_map and
+# write_obj cases
+MESH_SIZE = 1000
+MESH_VERTICES = 20000
+
+
+def synthetic_dem(size, seed=0):
+    """
+    Smooth terrain with noise as float32, generated in strips of rows so
+    that 16k x 16k DEMs fit into memory
+    """
+    rng = np.random.RandomState(seed)
+    x = np.linspace(0, 8 * np.pi, size)
+    dem = np.empty((size, size), dtype=np.float32)
+    for start in range(0, size, 1024):
+        y = x[start:start + 1024, np.newaxis]
+        dem[start:start + 1024] = 50 * np.sin(x) * np.cos(0.7 * y) + 3 * x + \
+            rng.normal(0, 0.5, (len(y), size))
+    return dem
+
+
+def refined(size, vertices):
+    tri = Triangulation(synthetic_dem(size), minimum_gap=1,
+                        keep_history=False)
+    tri.refine(max_vertices=vertices)
+    return tri
+
+
+class Case:
+    """
+    A benchmark: setup creates the input outside of the timing, run is
+    timed and returns the number of vertices it inserted or None
+    :param fresh: call setup before every repetition, for runs that modify
+    their input
+    """
+    def __init__(self, setup, run, fresh=False):
+        self.setup = setup
+        self.run = run
+        self.fresh = fresh
+
+
+def construct_case(dem):
+    def run(dem):
+        Triangulation(dem)
+    return Case(lambda: dem() if callable(dem) else dem, run)
+
+
+def insert_next_case(vertices):
+    def setup():
+        return Triangulation(synthetic_dem(MESH_SIZE), minimum_gap=1)
+
+    def run(tri):
+        start = len(tri.vertex_dict)
+        while len(tri.vertex_dict) < vertices:
+            tri.insert_next()
+        return len(tri.vertex_dict) - start
+    return Case(setup, run, fresh=True)
+
+
+def insert_points_case():
+    def setup():
+        points = np.random.RandomState(0).randint(0, MESH_SIZE, (2, 10000))
+        return Triangulation(synthetic_dem(MESH_SIZE), minimum_gap=0), points
+
+    def run(state):
+        tri, (xs, ys) = state
+        return tri.insert_points(xs, ys)
+    return Case(setup, run, fresh=True)
+
+
+def scan_triangle_case():
+    def setup():
+        tri = Triangulation(synthetic_dem(MESH_SIZE), minimum_gap=1)
+        return tri, tri.triangles
+
+    def run(state):
+        tri, triangles = state
+        for _ in range(10):
+            tri.rescan(triangles)
+    return Case(setup, run)
+
+
+def mark_availability_case():
+    def setup():
+        rng = np.random.RandomState(0)
+        tri = Triangulation(np.zeros((MESH_SIZE, MESH_SIZE)), minimum_gap=0)
+        points = [Vertex(int(x), int(y)) for x, y in
+                  rng.randint(0, MESH_SIZE, (20000, 2))]
+        return tri, points
+
+    def run(state):
+        tri, points = state
+        for v in points:
+            tri.mark_availability(v, radius=5)
+        for v0, v1 in zip(points[:2000], points[1:2001]):
+            if v0 != v1:
+                tri.mark_availability(v0, v1, radius=2)
+    return Case(setup, run)
+
+
+def heap_case():
+    def setup():
+        rng = random.Random(0)
+        return [rng.uniform(0, 1000) for _ in range(400000)]
+
+    def run(keys):
+        heap = Heap()
+        n = len(keys) // 2
+        ids = [heap.insert(k, None) for k in keys[:n]]
+        for i, k in zip(ids, keys[n:]):
+            heap.change_key(i, k)
+        while len(heap):
+            heap.del_max()
+    return Case(setup, run)
+
+
+def interpolated_map_case():
+    def run(tri):
+        tri.interpolated_map()
+    return Case(lambda: refined(MESH_SIZE, MESH_VERTICES), run)
+
+
+def write_obj_case():
+    def run(tri):
+        fd, path = tempfile.mkstemp(suffix='.obj')
+        os.close(fd)
+        try:
+            tri.write_obj(path)
+        finally:
+            os.remove(path)
+    return Case(lambda: refined(MESH_SIZE, MESH_VERTICES), run)
+
+
+def make_case(name):
+    kind, _, parameter = name.partition('/')
+    if kind == 'construct' and parameter == 'dgm5':
+        return construct_case(DGM5)
+    if kind == 'construct':
+        size = int(parameter.split('-')[1])
+        return construct_case(lambda: synthetic_dem(size))
+    if kind == 'insert_next':
+        return insert_next_case(int(parameter))
+    return {'insert_points': insert_points_case,
+            'scan_triangle': scan_triangle_case,
+            'mark_availability': mark_availability_case,
+            'heap': heap_case,
+            'interpolated_map': interpolated_map_case,
+            'write_obj': write_obj_case}[kind]()
+
+
+def case_names(sizes, budgets):
+    return (['construct/dgm5'] +
+            ['construct/synthetic-{}'.format(size) for size in sizes] +
+            ['insert_next/{}'.format(budget) for budget in budgets] +
+            ['insert_points', 'scan_triangle', 'mark_availability', 'heap',
+             'interpolated_map', 'write_obj'])
+
+
+def run_case(name, repeat):
+    """
+    Run one case in this process
+    :return: dict of the results
+    """
+    case = make_case(name)
+    times = []
+    vertices = None
+    state = None
+    for i in range(repeat):
+        if case.fresh or i == 0:
+            state = case.setup()
+        start = time.perf_counter()
+        vertices = case.run(state)
+        times.append(time.perf_counter() - start)
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    result = {'wall': min(times), 'walls': times,
+              'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss *
+              scale}
+    if vertices is not None:
+        result['vertices'] = vertices
+        result['vertices_per_second'] = vertices / min(times)
+    return result
+
+
+def run_isolated(name, repeat):
+    output = subprocess.check_output(
+        [sys.executable, '-m', 'benchmarks.suite', '--run-case', name,
+         '--repeat', str(repeat)], cwd=ROOT, universal_newlines=True)
+    return json.loads(output.splitlines()[-1])
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT, universal_newlines=True,
+            stderr=subprocess.DEVNULL).strip()
+        dirty = bool(subprocess.check_output(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+            universal_newlines=True).strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+    return {'commit': commit, 'dirty': dirty,
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpus': os.cpu_count(),
+            'compiled_kernel':
+                triangulation.scan_triangle_candidate.__module__ ==
+                'grid2tin.calculation'}
+
+
+def compare(old_path, new_path, threshold):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print('{:<28}{:>12}{:>12}{:>9}{:>12}{:>12}'.format(
+        'case', 'old s', 'new s', 'ratio', 'old MB', 'new MB'))
+    regressions = 0
+    for name, result in new['results'].items():
+        if name not in old['results']:
+            continue
+        before = old['results'][name]
+        ratio = result['wall'] / before['wall']
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  slower'
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = '  faster'
+        print('{:<28}{:>12.3f}{:>12.3f}{:>9.2f}{:>12.0f}{:>12.0f}{}'.format(
+            name, before['wall'], result['wall'], ratio,
+            before['peak_rss'] / 2 ** 20, result['peak_rss'] / 2 ** 20, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--output', default='benchmark.json',
+                        help='JSON file for the results')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 4000],
+                        help='edge lengths of the synthetic DEMs')
+    parser.add_argument('--budgets', type=int, nargs='+',
+                        default=[1000, 5000, 20000],
+                        help='vertex counts of the insert_next cases')
+    parser.add_argument('--cases', nargs='+', default=['*'],
+                        help='glob patterns of the cases to run')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two result files instead of running')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative change of the wall time reported as '
+                             'slower or faster by --compare')
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(args.run_case, args.repeat)))
+        return
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, threshold=args.threshold) else 0)
+
+    names = [name for name in case_names(args.sizes, args.budgets)
+             if any(fnmatch.fnmatch(name, pattern) for pattern in args.cases)]
+    results = {}
+    for name in names:
+        result = run_isolated(name, args.repeat)
+        results[name] = result
+        rate = ', {:.0f} vertices/s'.format(result['vertices_per_second']) \
+            if 'vertices_per_second' in result else ''
+        print('{:<28}{:>10.3f} s {:>8.0f} MB{}'.format(
+            name, result['wall'], result['peak_rss'] / 2 ** 20, rate))
+        # Written after every case, so an aborted run keeps its results
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'repeat': args.repeat,
+                       'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
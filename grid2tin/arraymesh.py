@@ -0,0 +1,281 @@
+# Array-backed quad-edge mesh. The topology is the same as in quadedge.py,
+# but instead of four Edge objects per quad-edge all links live in flat
+# buffers addressed by integer edge indices: the directed edges of quad-edge
+# q are 4 * q ... 4 * q + 3, so rot and sym are plain bit arithmetic.
+
+from array import array
+
+import numpy as np
+
+
+def rot(i):
+    return (i & ~3) | ((i + 1) & 3)
+
+
+def sym(i):
+    return i ^ 2
+
+
+def inv_rot(i):
+    return (i & ~3) | ((i + 3) & 3)
+
+
+class ArrayMesh:
+    """
+    Quad-edge mesh stored in contiguous buffers.
+
+    The integer level (make_edge_index, splice_index, ...) works on edge
+    indices only. The object level (make_edge, splice, connect, swap,
+    delete_edge) takes Vertex objects and ArrayEdge handles, so it is a
+    drop-in replacement for the functions in quadedge.py and can be used as
+    the mesh backend of a Triangulation.
+    """
+
+    def __init__(self):
+        # Per directed edge
+        self.next = array('i')
+        self.org = array('i')
+        self.triangles = []
+        # Per quad-edge
+        self.quad_id = array('i')
+        # Per vertex
+        self.x = array('d')
+        self.y = array('d')
+        self.z = array('d')
+        self.vertices = []
+
+        self.free = []
+
+    def __len__(self):
+        """
+        Number of live quad-edges
+        """
+        return len(self.quad_id) - len(self.free)
+
+    # Vertex buffers
+
+    def add_vertex(self, v):
+        """
+        Register a vertex and copy its coordinates into the vertex buffers
+        :param v: Vertex
+        :return: index of the vertex
+        """
+        index = getattr(v, 'index', -1)
+        if 0 <= index < len(self.vertices) and self.vertices[index] is v:
+            return index
+        index = len(self.vertices)
+        v.index = index
+        self.vertices.append(v)
+        self.x.append(v.x)
+        self.y.append(v.y)
+        self.z.append(v.z)
+        return index
+
+    def coordinates(self):
+        """
+        :return: (n, 3) array of all registered vertex coordinates
+        """
+        return np.column_stack([np.frombuffer(self.x),
+                                np.frombuffer(self.y),
+                                np.frombuffer(self.z)])
+
+    # Integer level
+
+    def o_next(self, i):
+        return self.next[i]
+
+    def o_prev(self, i):
+        return rot(self.next[rot(i)])
+
+    def d_next(self, i):
+        return sym(self.next[sym(i)])
+
+    def d_prev(self, i):
+        return inv_rot(self.next[inv_rot(i)])
+
+    def l_next(self, i):
+        return rot(self.next[inv_rot(i)])
+
+    def l_prev(self, i):
+        return sym(self.next[i])
+
+    def r_next(self, i):
+        return inv_rot(self.next[rot(i)])
+
+    def r_prev(self, i):
+        return self.next[sym(i)]
+
+    def destination_index(self, i):
+        return self.org[sym(i)]
+
+    def make_edge_index(self, origin=-1, destination=-1):
+        """
+        :param origin: vertex index of the origin
+        :param destination: vertex index of the destination
+        :return: index of the new primal edge
+        """
+        if self.free:
+            q = self.free.pop()
+            e = 4 * q
+            self.quad_id[q] = -1
+            self.next[e:e + 4] = array('i', (e, e + 3, e + 2, e + 1))
+            self.org[e:e + 4] = array('i', (origin, -1, destination, -1))
+        else:
+            e = len(self.next)
+            self.quad_id.append(-1)
+            self.next.extend((e, e + 3, e + 2, e + 1))
+            self.org.extend((origin, -1, destination, -1))
+            self.triangles.extend((None, None, None, None))
+        return e
+
+    def splice_index(self, a, b):
+        nxt = self.next
+        alpha = rot(nxt[a])
+        beta = rot(nxt[b])
+
+        t1 = nxt[b]
+        t2 = nxt[a]
+        t3 = nxt[beta]
+        t4 = nxt[alpha]
+
+        nxt[a] = t1
+        nxt[b] = t2
+        nxt[alpha] = t3
+        nxt[beta] = t4
+
+    def connect_index(self, a, b):
+        e = self.make_edge_index(self.destination_index(a), self.org[b])
+        self.splice_index(e, self.l_next(a))
+        self.splice_index(sym(e), b)
+        return e
+
+    def swap_index(self, e):
+        a = self.o_prev(e)
+        b = self.o_prev(sym(e))
+        self.splice_index(e, a)
+        self.splice_index(sym(e), b)
+        self.splice_index(e, self.l_next(a))
+        self.splice_index(sym(e), self.l_next(b))
+        self.org[e] = self.destination_index(a)
+        self.org[sym(e)] = self.destination_index(b)
+
+    def delete_edge_index(self, e):
+        self.splice_index(e, self.o_prev(e))
+        self.splice_index(sym(e), self.o_prev(sym(e)))
+        q = e >> 2
+        e = 4 * q
+        self.org[e:e + 4] = array('i', (-1, -1, -1, -1))
+        self.triangles[e:e + 4] = [None, None, None, None]
+        self.quad_id[q] = -1
+        self.free.append(q)
+
+    # Object level, same interface as the functions in quadedge.py
+
+    def edge(self, i):
+        return ArrayEdge(self, i)
+
+    def make_edge(self, origin, destination):
+        e = self.make_edge_index(self.add_vertex(origin),
+                                 self.add_vertex(destination))
+        return ArrayEdge(self, e)
+
+    def splice(self, a, b):
+        self.splice_index(a.index, b.index)
+
+    def connect(self, a, b):
+        return ArrayEdge(self, self.connect_index(a.index, b.index))
+
+    def swap(self, e):
+        self.swap_index(e.index)
+
+    def delete_edge(self, e):
+        self.delete_edge_index(e.index)
+
+
+class ArrayEdge:
+    """
+    Lightweight handle to a directed edge of an ArrayMesh. Handles are created
+    on demand and compare equal if they refer to the same edge. Unlike Edge,
+    setting the origin does not store a back reference in Vertex.edge.
+    """
+    __slots__ = ('mesh', 'index')
+
+    def __init__(self, mesh, index):
+        self.mesh = mesh
+        self.index = index
+
+    def __eq__(self, other):
+        if isinstance(other, ArrayEdge):
+            return self.index == other.index and self.mesh is other.mesh
+        else:
+            return NotImplemented
+
+    def __hash__(self):
+        return hash(self.index)
+
+    def __str__(self):
+        return "(" + str(self.origin.x) + "," + str(self.origin.y) + \
+               ") -- (" + str(self.destination.x) + "," + str(self.destination.y) + ")"
+
+    @property
+    def origin(self):
+        v = self.mesh.org[self.index]
+        return self.mesh.vertices[v] if v >= 0 else None
+
+    @origin.setter
+    def origin(self, origin):
+        self.mesh.org[self.index] = self.mesh.add_vertex(origin)
+
+    @property
+    def destination(self): return self.sym.origin
+
+    @destination.setter
+    def destination(self, dest): self.sym.origin = dest
+
+    @property
+    def id(self): return self.mesh.quad_id[self.index >> 2]
+
+    @id.setter
+    def id(self, id_): self.mesh.quad_id[self.index >> 2] = id_
+
+    @property
+    def triangle(self): return self.mesh.triangles[self.index]
+
+    @triangle.setter
+    def triangle(self, triangle): self.mesh.triangles[self.index] = triangle
+
+    @property
+    def rot(self): return ArrayEdge(self.mesh, rot(self.index))
+
+    @property
+    def sym(self): return ArrayEdge(self.mesh, sym(self.index))
+
+    @property
+    def inv_rot(self): return ArrayEdge(self.mesh, inv_rot(self.index))
+
+    @property
+    def next(self): return ArrayEdge(self.mesh, self.mesh.next[self.index])
+
+    @property
+    def o_next(self): return ArrayEdge(self.mesh, self.mesh.next[self.index])
+
+    @property
+    def o_prev(self): return ArrayEdge(self.mesh, self.mesh.o_prev(self.index))
+
+    @property
+    def d_next(self): return ArrayEdge(self.mesh, self.mesh.d_next(self.index))
+
+    @property
+    def d_prev(self): return ArrayEdge(self.mesh, self.mesh.d_prev(self.index))
+
+    @property
+    def l_next(self): return ArrayEdge(self.mesh, self.mesh.l_next(self.index))
+
+    @property
+    def l_prev(self): return ArrayEdge(self.mesh, self.mesh.l_prev(self.index))
+
+    @property
+    def r_next(self): return ArrayEdge(self.mesh, self.mesh.r_next(self.index))
+
+    @property
+    def r_prev(self): return ArrayEdge(self.mesh, self.mesh.r_prev(self.index))
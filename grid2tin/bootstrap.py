@@ -0,0 +1,200 @@
+# Start of a triangulation from many vertices at once instead of the two
+# triangles of the boundary rectangle. The Delaunay triangulation of the
+# vertices is built with the divide and conquer algorithm of Guibas and
+# Stolfi directly on the mesh backend, all triangles are scanned and the heap
+# is built with one heapify.
+
+import gc
+
+import numpy as np
+
+from .quadedge import Vertex, Triangle, ccw, in_circle
+
+
+def lattice(shape, spacing):
+    """
+    Pixel coordinates of a regular lattice covering a raster, including the
+    last row and column
+    :param shape: (rows, columns) of the raster
+    :param spacing: distance in pixels between lattice points
+    :return: tuple (xs, ys) of integer arrays
+    """
+    columns = np.unique(np.r_[np.arange(0, shape[1], spacing), shape[1] - 1])
+    rows = np.unique(np.r_[np.arange(0, shape[0], spacing), shape[0] - 1])
+    xs, ys = np.meshgrid(columns, rows)
+    return xs.ravel(), ys.ravel()
+
+
+def build(cls, dem, xs=None, ys=None, zs=None, spacing=None, minimum_gap=5,
+          backend='quadedge', lazy=False, windowed=False, progressive=False,
+          pyramid=False, nodata=None, mask=None):
+    """
+    Create a Triangulation whose mesh is the Delaunay triangulation of the
+    given points and the four corners of the DEM
+    :param cls: Triangulation or a subclass
+    :param xs: x pixel coordinates
+    :param ys: y pixel coordinates
+    :param zs: heights, taken from the DEM if None
+    :param spacing: use the points of a lattice with this spacing instead
+    of xs and ys
+    :return: Triangulation, see Triangulation.from_points
+    """
+    # Only long lived objects are created, see checkpoint.load
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return populate(cls, dem, xs, ys, zs, spacing, minimum_gap, backend,
+                        lazy, windowed, progressive, pyramid, nodata, mask)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def populate(cls, dem, xs, ys, zs, spacing, minimum_gap, backend, lazy,
+             windowed, progressive, pyramid, nodata, mask):
+    tri = cls.__new__(cls)
+    tri.setup(dem, minimum_gap, backend, lazy, windowed, progressive,
+              pyramid, nodata, mask)
+    tri.history = None
+    if spacing is not None:
+        xs, ys = lattice(tri.dem.shape, spacing)
+
+    xs, ys, zs = tri.pixel_points(xs, ys, zs)
+
+    # The corners first, then the points in the order given. The first of
+    # several points at the same position wins.
+    corners = [(tri.min_x, tri.min_y), (tri.max_x, tri.min_y),
+               (tri.max_x, tri.max_y), (tri.min_x, tri.max_y)]
+    positions = {}
+    for x, y in corners:
+        positions[x, y] = tri.valid_height(x, y)
+    heights = [None] * len(xs) if zs is None else zs
+    for x, y, z in zip(xs, ys, heights):
+        if (x, y) not in positions:
+            positions[x, y] = tri.valid_height(x, y) if z is None else z
+    vertices = [Vertex(x, y, z) for (x, y), z in positions.items()]
+    for v in vertices:
+        tri.add_vertex(v)
+
+    tri.mark_border(vertices[:4])
+    for v in vertices[4:]:
+        tri.mark_availability(v, radius=tri.minimum_gap, value=0)
+
+    ordered = sorted(vertices, key=lambda v: (v.x, v.y))
+    tri.base = divide(tri, ordered, 0, len(ordered))[0]
+    triangles = faces(tri)
+
+    keys = [tri.heap_key(t) for t in triangles]
+    queued = [(key, t) for key, t in zip(keys, triangles)
+              if not tri.is_void(t)]
+    ids = tri.heap.heapify([key for key, t in queued],
+                           [(t.candidate, t) for key, t in queued])
+    for t in triangles:
+        t.id = -1
+        tri.walk_anchors[tri.walk_cell(t.vertices[0])] = t
+    for (key, t), i in zip(queued, ids):
+        t.id = i
+    tri.live_triangles = dict.fromkeys(triangles)
+    tri.last_triangle = triangles[0]
+    tri.initial_vertices = len(vertices)
+    tri.record_triangles(triangles, [])
+    return tri
+
+
+def divide(tri, vertices, lo, hi):
+    """
+    Delaunay triangulation of vertices[lo:hi], sorted by x and then y
+    :return: tuple (ldo, rdo) of the counterclockwise convex hull edge out
+    of the leftmost vertex and the clockwise one out of the rightmost
+    """
+    mesh = tri.mesh
+    n = hi - lo
+    if n == 2:
+        a = mesh.make_edge(vertices[lo], vertices[lo + 1])
+        tri.add_edge(a)
+        return a, a.sym
+    if n == 3:
+        s1, s2, s3 = vertices[lo:hi]
+        a = mesh.make_edge(s1, s2)
+        b = mesh.make_edge(s2, s3)
+        tri.add_edge(a)
+        tri.add_edge(b)
+        mesh.splice(a.sym, b)
+        if ccw(s1, s2, s3):
+            tri.add_edge(mesh.connect(b, a))
+            return a, b.sym
+        if ccw(s1, s3, s2):
+            c = mesh.connect(b, a)
+            tri.add_edge(c)
+            return c.sym, c
+        # Collinear
+        return a, b.sym
+
+    middle = lo + n // 2
+    ldo, ldi = divide(tri, vertices, lo, middle)
+    rdi, rdo = divide(tri, vertices, middle, hi)
+
+    # Lower common tangent of the two halves
+    while True:
+        if rdi.origin.left_of(ldi):
+            ldi = ldi.l_next
+        elif ldi.origin.right_of(rdi):
+            rdi = rdi.r_prev
+        else:
+            break
+
+    basel = mesh.connect(rdi.sym, ldi)
+    tri.add_edge(basel)
+    if ldi.origin == ldo.origin:
+        ldo = basel.sym
+    if rdi.origin == rdo.origin:
+        rdo = basel
+
+    # Zip the halves together from the bottom up
+    while True:
+        lcand = basel.sym.o_next
+        if lcand.destination.right_of(basel):
+            while in_circle(lcand.o_next.destination, basel.destination,
+                            basel.origin, lcand.destination):
+                t = lcand.o_next
+                tri.delete_edge(lcand)
+                lcand = t
+        rcand = basel.o_prev
+        if rcand.destination.right_of(basel):
+            while in_circle(rcand.o_prev.destination, basel.destination,
+                            basel.origin, rcand.destination):
+                t = rcand.o_prev
+                tri.delete_edge(rcand)
+                rcand = t
+        left_valid = lcand.destination.right_of(basel)
+        right_valid = rcand.destination.right_of(basel)
+        if not left_valid and not right_valid:
+            break
+        if not left_valid or (right_valid and in_circle(
+                rcand.destination, lcand.destination, lcand.origin,
+                rcand.origin)):
+            basel = mesh.connect(rcand, basel.sym)
+        else:
+            basel = mesh.connect(basel.sym, lcand.sym)
+        tri.add_edge(basel)
+    return ldo, rdo
+
+
+def faces(tri):
+    """
+    Create a Triangle for every bounded face of the mesh
+    :return: list of the triangles
+    """
+    triangles = []
+    seen = set()
+    for edge in tri.edge_dict.values():
+        for e in (edge, edge.sym):
+            if e in seen:
+                continue
+            second = e.l_next
+            third = second.l_next
+            if third.l_next == e and ccw(e.origin, e.destination,
+                                         second.destination):
+                seen.update((e, second, third))
+                triangles.append(Triangle(e))
+    return triangles
@@ -1,17 +1,60 @@
-from math import ceil, floor
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+# cython: initializedcheck=False
+from cpython.long cimport PyLong_CheckExact, PyLong_AsLongLongAndOverflow
+from libc.math cimport ceil, floor, fabs, sqrt
+from libc.stdint cimport int64_t
+
+cdef extern from *:
+    """
+    #ifdef __SIZEOF_INT128__
+    typedef __int128 grid2tin_int128;
+    #define GRID2TIN_EXACT_PREDICATES 1
+    #else
+    typedef long long grid2tin_int128;
+    #define GRID2TIN_EXACT_PREDICATES 0
+    #endif
+    """
+    # 128 bit integers of GCC and Clang. Other compilers, like MSVC, lack
+    # them and use the double precision predicates only.
+    ctypedef long long int128 "grid2tin_int128"
+    const bint exact_predicates "GRID2TIN_EXACT_PREDICATES"
+
+ctypedef fused dem_t:
+    short
+    unsigned short
+    int
+    int64_t
+    float
+    double
+
+
+# Value of the availability mask for pixels without data
+VOID = 2
+cdef unsigned char void_value = 2
+
+
+cdef struct Candidate:
+    double error
+    int x
+    int y
+    long pixels
+    double squared_error
+
 
 def calc_interpolation(double a, double b, double c, int x, int y):
     # for call from external
     return a * x + b * y + c
 
-cdef double interpolation(double a, double b, double c, int x, int y):
+cdef inline double interpolation(double a, double b, double c, int x,
+                                 int y) noexcept nogil:
     # for call from internal
     return a * x + b * y + c
 
 def scan_triangle_line(available, dem, t, int y, x_a, x_b, interpolation_map=None,
                        only_return_points=False):
     """
-    This is the most time consuming part of the triangulation.
+    Scan a single row of a triangle. Only used for the interpolation map,
+    the candidate search uses scan_triangle_candidate.
     """
 
     cdef int x_start
@@ -20,6 +63,7 @@ def scan_triangle_line(available, dem, t, int y, x_a, x_b, interpolation_map=Non
     cdef double b
     cdef double c
     cdef int x
+    cdef double z_map
 
     x_start = int(ceil(min(x_a, x_b)))
     x_end = int(floor(max(x_a, x_b)))
@@ -41,3 +85,403 @@ def scan_triangle_line(available, dem, t, int y, x_a, x_b, interpolation_map=Non
                 t.candidate_error = error
                 t.candidate.pos = (x, y, z_map)
     return points
+
+
+cdef inline void scan_line(const unsigned char[:, :] available,
+                           const dem_t[:, :] dem,
+                           int y, double x_a, double x_b,
+                           double a, double b, double c,
+                           int x_off, int y_off, int step, bint voids,
+                           Candidate* best) noexcept nogil:
+    cdef int x
+    cdef int x_start = <int>ceil(x_a if x_a < x_b else x_b)
+    cdef int x_end = <int>floor(x_b if x_a < x_b else x_a)
+    cdef double error, difference
+    cdef unsigned char flag
+
+    if step > 1:
+        scan_line_decimated(available, dem, y, x_start, x_end, a, b, c,
+                            x_off, y_off, step, voids, best)
+        return
+    if y < y_off or y >= y_off + dem.shape[0]:
+        return
+    if voids:
+        # Pixels without data are skipped entirely
+        for x in range(x_start, x_end + 1):
+            flag = available[y - y_off, x - x_off]
+            if flag == void_value:
+                continue
+            best.pixels += 1
+            difference = dem[y - y_off, x - x_off] - \
+                interpolation(a, b, c, x, y)
+            best.squared_error += difference * difference
+            error = fabs(difference)
+            if error > best.error and flag == 1:
+                best.error = error
+                best.x = x
+                best.y = y
+        return
+    if x_end >= x_start:
+        best.pixels += x_end - x_start + 1
+    for x in range(x_start, x_end + 1):
+        difference = dem[y - y_off, x - x_off] - interpolation(a, b, c, x, y)
+        best.squared_error += difference * difference
+        error = fabs(difference)
+        if error > best.error and available[y - y_off, x - x_off] == 1:
+            best.error = error
+            best.x = x
+            best.y = y
+
+
+cdef inline void scan_line_decimated(const unsigned char[:, :] available,
+                                     const dem_t[:, :] dem,
+                                     int y, int x_start, int x_end,
+                                     double a, double b, double c,
+                                     int x_off, int y_off, int step,
+                                     bint voids,
+                                     Candidate* best) noexcept nogil:
+    # Every step-th pixel of every step-th row, available and dem hold only
+    # these pixels
+    cdef int x, i, row
+    cdef double error, difference
+
+    if y < y_off or (y - y_off) % step != 0:
+        return
+    row = (y - y_off) // step
+    if row >= dem.shape[0]:
+        return
+    i = (x_start - x_off + step - 1) // step
+    x = x_off + i * step
+    while x <= x_end:
+        if voids and available[row, i] == void_value:
+            x += step
+            i += 1
+            continue
+        best.pixels += 1
+        difference = dem[row, i] - interpolation(a, b, c, x, y)
+        best.squared_error += difference * difference
+        error = fabs(difference)
+        if error > best.error and available[row, i] == 1:
+            best.error = error
+            best.x = x
+            best.y = y
+        x += step
+        i += 1
+
+
+def scan_triangle_candidate(const unsigned char[:, :] available,
+                            const dem_t[:, :] dem,
+                            double x0, int y0, double x1, int y1,
+                            double x2, int y2,
+                            double a, double b, double c, double threshold,
+                            int x_off=0, int y_off=0, int step=1,
+                            bint voids=False):
+    """
+    This is the most time consuming part of the triangulation.
+
+    Rasterize the whole triangle row by row, exactly like the former per-row
+    scan, and find the available pixel with the greatest error against the
+    plane a * x + b * y + c.
+    :param available: uint8 mask, only pixels with value 1 are candidates
+    :param threshold: only pixels with an error greater than this value are
+    considered
+    :param x_off: column of the DEM grid at which available and dem start,
+    if they are windows of the grid
+    :param y_off: row of the DEM grid at which available and dem start.
+    Rows of the triangle outside the window are skipped, so a large triangle
+    can be scanned in bands of rows, passing on the error found so far as
+    threshold.
+    :param step: only scan the pixels whose column and row relative to
+    x_off and y_off are multiples of step. available and dem then hold only
+    these pixels, as level of a pyramid.
+    :param voids: skip pixels whose availability is VOID, they count neither
+    as scanned pixels nor in the squared error
+    :return: tuple (pixels, error, x, y, z, squared_error) with the number
+    of pixels scanned, the candidate and the sum of the squared errors of
+    all scanned pixels, available or not. x and y are -1 if no available
+    pixel exceeds the threshold.
+    """
+    cdef Candidate best
+    cdef double tx, dx0, dx1, x_a, x_b
+    cdef int ty, y
+
+    best.error = threshold
+    best.x = -1
+    best.y = -1
+    best.pixels = 0
+    best.squared_error = 0.0
+
+    # Sort vertices in ascending order
+    if y0 > y1:
+        tx = x0; x0 = x1; x1 = tx
+        ty = y0; y0 = y1; y1 = ty
+    if y0 > y2:
+        tx = x0; x0 = x2; x2 = tx
+        ty = y0; y0 = y2; y2 = ty
+    if y1 > y2:
+        tx = x1; x1 = x2; x2 = tx
+        ty = y1; y1 = y2; y2 = ty
+
+    with nogil:
+        # Check if base of triangle is flat
+        if y1 == y0:
+            dx0 = 0.0
+        else:
+            dx0 = (x1 - x0) / (y1 - y0)
+
+        dx1 = (x2 - x0) / (y2 - y0)
+
+        x_a = x0
+        x_b = x0
+
+        # If the base of the triangle is flat, this loop won't be executed
+        for y in range(y0, y1):
+            scan_line(available, dem, y, x_a, x_b, a, b, c, x_off, y_off,
+                      step, voids, &best)
+            x_a += dx0
+            x_b += dx1
+
+        # Check if top of triangle is flat
+        if y2 == y1:
+            dx0 = 0.0
+        else:
+            dx0 = (x2 - x1) / (y2 - y1)
+
+        x_a = x1
+
+        # If the top of the triangle is flat, this loop will be executed once
+        for y in range(y1, y2 + 1):
+            scan_line(available, dem, y, x_a, x_b, a, b, c, x_off, y_off,
+                      step, voids, &best)
+            x_a += dx0
+            x_b += dx1
+
+    if best.x < 0:
+        return best.pixels, best.error, -1, -1, 0.0, best.squared_error
+    return (best.pixels, best.error, best.x, best.y,
+            <double>dem[(best.y - y_off) // step, (best.x - x_off) // step],
+            best.squared_error)
+
+
+cdef inline void fill_line(double[:, :] out, int y, double x_a, double x_b,
+                           double a, double b, double c,
+                           int x_off, int y_off) noexcept nogil:
+    cdef int x
+    cdef int x_start = <int>ceil(x_a if x_a < x_b else x_b)
+    cdef int x_end = <int>floor(x_b if x_a < x_b else x_a)
+
+    if y < y_off or y >= y_off + out.shape[0]:
+        return
+    for x in range(x_start, x_end + 1):
+        out[y - y_off, x - x_off] = interpolation(a, b, c, x, y)
+
+
+def rasterize_faces(double[:, :] out, const double[:, :] vertices,
+                    const Py_ssize_t[:, :] faces, int x_off=0, int y_off=0):
+    """
+    Write the planes of all faces into out, rasterized row by row exactly
+    like scan_triangle_candidate. Pixels on shared edges get the value of the
+    later face.
+    :param out: window of the grid, float64
+    :param vertices: (n, 3) pixel coordinates and heights
+    :param faces: (m, 3) vertex indices
+    :param x_off: column of the grid at which out starts
+    :param y_off: row of the grid at which out starts, rows of the faces
+    outside of out are skipped
+    """
+    cdef Py_ssize_t i
+    cdef int y, y0, y1, y2, ty
+    cdef double x0, x1, x2, z0, z1, z2, tx
+    cdef double ux, uy, uz, vx, vy, vz, den, a, b, c
+    cdef double dx0, dx1, x_a, x_b
+
+    with nogil:
+        for i in range(faces.shape[0]):
+            x0 = vertices[faces[i, 0], 0]
+            y0 = <int>vertices[faces[i, 0], 1]
+            z0 = vertices[faces[i, 0], 2]
+            x1 = vertices[faces[i, 1], 0]
+            y1 = <int>vertices[faces[i, 1], 1]
+            z1 = vertices[faces[i, 1], 2]
+            x2 = vertices[faces[i, 2], 0]
+            y2 = <int>vertices[faces[i, 2], 1]
+            z2 = vertices[faces[i, 2], 2]
+
+            # Plane equation as in Triangle.calculate_plane_equation
+            ux = x1 - x0
+            uy = y1 - y0
+            uz = z1 - z0
+            vx = x2 - x0
+            vy = y2 - y0
+            vz = z2 - z0
+            den = ux * vy - uy * vx
+            a = (uz * vy - uy * vz) / den
+            b = (ux * vz - uz * vx) / den
+            c = z0 - a * x0 - b * y0
+
+            # Skip faces outside of the window
+            if max(y0, y1, y2) < y_off or \
+                    min(y0, y1, y2) >= y_off + out.shape[0]:
+                continue
+
+            # Sort vertices in ascending order
+            if y0 > y1:
+                tx = x0; x0 = x1; x1 = tx
+                ty = y0; y0 = y1; y1 = ty
+            if y0 > y2:
+                tx = x0; x0 = x2; x2 = tx
+                ty = y0; y0 = y2; y2 = ty
+            if y1 > y2:
+                tx = x1; x1 = x2; x2 = tx
+                ty = y1; y1 = y2; y2 = ty
+
+            if y1 == y0:
+                dx0 = 0.0
+            else:
+                dx0 = (x1 - x0) / (y1 - y0)
+            dx1 = (x2 - x0) / (y2 - y0)
+
+            x_a = x0
+            x_b = x0
+            for y in range(y0, y1):
+                fill_line(out, y, x_a, x_b, a, b, c, x_off, y_off)
+                x_a += dx0
+                x_b += dx1
+
+            if y2 == y1:
+                dx0 = 0.0
+            else:
+                dx0 = (x2 - x1) / (y2 - y1)
+
+            x_a = x1
+            for y in range(y1, y2 + 1):
+                fill_line(out, y, x_a, x_b, a, b, c, x_off, y_off)
+                x_a += dx0
+                x_b += dx1
+
+
+# Geometric predicates. Vertices with Python int coordinates of magnitude
+# below 2 ** 30 are evaluated exactly in 128 bit integers, all others in
+# double precision with the tolerance eps, like the former pure-Python
+# predicates.
+
+cdef double eps = 1e-6
+cdef long long exact_limit = 1 << 30
+
+
+cdef inline bint in_exact_range(value) except -1:
+    cdef int overflow = 0
+    cdef long long n
+    if not PyLong_CheckExact(value):
+        return False
+    n = PyLong_AsLongLongAndOverflow(value, &overflow)
+    return not overflow and -exact_limit < n < exact_limit
+
+
+cdef inline bint integral(v) except -1:
+    return exact_predicates and in_exact_range(v.x) and in_exact_range(v.y)
+
+
+cdef inline int128 area_int(long long x0, long long y0, long long x1,
+                            long long y1, long long x2,
+                            long long y2) noexcept nogil:
+    return <int128>(x1 - x0) * (y2 - y0) - <int128>(y1 - y0) * (x2 - x0)
+
+
+cdef inline double area_double(double x0, double y0, double x1, double y1,
+                               double x2, double y2) noexcept nogil:
+    return (x1 - x0) * (y2 - y0) - (y1 - y0) * (x2 - x0)
+
+
+def triangle_area(v0, v1, v2):
+    """
+    Twice the signed area of the triangle v0, v1, v2, positive if the
+    vertices are counter-clockwise in a y-up coordinate system
+    """
+    if integral(v0) and integral(v1) and integral(v2):
+        return <long long>area_int(v0.x, v0.y, v1.x, v1.y, v2.x, v2.y)
+    return area_double(v0.x, v0.y, v1.x, v1.y, v2.x, v2.y)
+
+
+def ccw(v0, v1, v2):
+    if integral(v0) and integral(v1) and integral(v2):
+        return area_int(v0.x, v0.y, v1.x, v1.y, v2.x, v2.y) > 0
+    return area_double(v0.x, v0.y, v1.x, v1.y, v2.x, v2.y) > 0
+
+
+def in_triangle(v, v0, v1, v2):
+    """
+    True if v lies inside of or on the counter-clockwise triangle v0, v1, v2
+    """
+    cdef long long x, y, x0, y0, x1, y1, x2, y2
+    if integral(v) and integral(v0) and integral(v1) and integral(v2):
+        x = v.x; y = v.y
+        x0 = v0.x; y0 = v0.y
+        x1 = v1.x; y1 = v1.y
+        x2 = v2.x; y2 = v2.y
+        return area_int(x0, y0, x1, y1, x, y) >= 0 and \
+            area_int(x1, y1, x2, y2, x, y) >= 0 and \
+            area_int(x2, y2, x0, y0, x, y) >= 0
+    return area_double(v0.x, v0.y, v1.x, v1.y, v.x, v.y) >= 0 and \
+        area_double(v1.x, v1.y, v2.x, v2.y, v.x, v.y) >= 0 and \
+        area_double(v2.x, v2.y, v0.x, v0.y, v.x, v.y) >= 0
+
+
+def in_circle(v, v0, v1, v2):
+    """
+    True if v lies strictly inside of the circumcircle of the
+    counter-clockwise triangle v0, v1, v2
+    """
+    cdef long long x, y, x0, y0, x1, y1, x2, y2
+    cdef int128 det
+    cdef double x_d, y_d, x0_d, y0_d, x1_d, y1_d, x2_d, y2_d
+    if integral(v) and integral(v0) and integral(v1) and integral(v2):
+        x = v.x; y = v.y
+        x0 = v0.x; y0 = v0.y
+        x1 = v1.x; y1 = v1.y
+        x2 = v2.x; y2 = v2.y
+        det = <int128>(x0 * x0 + y0 * y0) * area_int(x1, y1, x2, y2, x, y) - \
+            <int128>(x1 * x1 + y1 * y1) * area_int(x0, y0, x2, y2, x, y) + \
+            <int128>(x2 * x2 + y2 * y2) * area_int(x0, y0, x1, y1, x, y) - \
+            <int128>(x * x + y * y) * area_int(x0, y0, x1, y1, x2, y2)
+        return det > 0
+    x_d = v.x; y_d = v.y
+    x0_d = v0.x; y0_d = v0.y
+    x1_d = v1.x; y1_d = v1.y
+    x2_d = v2.x; y2_d = v2.y
+    return (x0_d ** 2 + y0_d ** 2) * \
+        area_double(x1_d, y1_d, x2_d, y2_d, x_d, y_d) - \
+        (x1_d ** 2 + y1_d ** 2) * \
+        area_double(x0_d, y0_d, x2_d, y2_d, x_d, y_d) + \
+        (x2_d ** 2 + y2_d ** 2) * \
+        area_double(x0_d, y0_d, x1_d, y1_d, x_d, y_d) - \
+        (x_d ** 2 + y_d ** 2) * \
+        area_double(x0_d, y0_d, x1_d, y1_d, x2_d, y2_d) > eps
+
+
+def on_segment(v, v0, v1):
+    """
+    True if v lies on the segment v0, v1, including its end points
+    """
+    cdef long long x, y, x0, y0, x1, y1
+    cdef double t1, t2, t3, dx, dy, length
+    if integral(v) and integral(v0) and integral(v1):
+        x = v.x; y = v.y
+        x0 = v0.x; y0 = v0.y
+        x1 = v1.x; y1 = v1.y
+        return area_int(x0, y0, x1, y1, x, y) == 0 and \
+            min(x0, x1) <= x <= max(x0, x1) and \
+            min(y0, y1) <= y <= max(y0, y1)
+    t1 = sqrt((v.x - v0.x) ** 2 + (v.y - v0.y) ** 2)
+    t2 = sqrt((v.x - v1.x) ** 2 + (v.y - v1.y) ** 2)
+    if t1 < eps or t2 < eps:
+        return True
+    dx = v1.x - v0.x
+    dy = v1.y - v0.y
+    t3 = sqrt(dx ** 2 + dy ** 2)
+    if t1 > t3 or t2 > t3:
+        return False
+    # Distance from the line through v0 and v1
+    length = t3
+    return fabs(dy / length * v.x - dx / length * v.y -
+                (dy / length * v0.x - dx / length * v0.y)) < eps
@@ -0,0 +1,242 @@
+# Checkpoints of a running triangulation. The object graph is flattened into
+# a few arrays: vertices by id, the live triangles as vertex id triples with
+# their candidates, the raw arrays of the heap and the availability mask as
+# bits. The quad-edge topology is rebuilt from the triangles on load.
+
+import gc
+import os
+from array import array
+
+import numpy as np
+
+from .heap import Heap
+from .quadedge import Vertex, Triangle
+
+try:
+    from .calculation import VOID
+except ImportError:
+    from .pycalculation import VOID, warn_fallback
+    warn_fallback()
+
+# Increased whenever the layout of the arrays changes
+VERSION = 1
+
+
+def save(tri, filename):
+    """
+    Write the state of a Triangulation to an uncompressed NumPy archive. The
+    DEM itself is not stored. The file is written under a temporary name and
+    renamed, so an interrupted save leaves the previous checkpoint intact.
+    """
+    vertices = np.array([v.pos for v in tri.vertex_dict.values()],
+                        dtype=float).reshape(-1, 3)
+    triangles = list(tri.live_triangles)
+    index = {t: i for i, t in enumerate(triangles)}
+    faces = np.array([[v.id for v in t.vertices] for t in triangles],
+                     dtype=np.int64).reshape(-1, 3)
+    candidates = np.array([t.candidate.pos for t in triangles],
+                          dtype=float).reshape(-1, 3)
+    state = np.array([(t.candidate_error, t.squared_error) for t in triangles],
+                     dtype=float).reshape(-1, 2)
+    counters = np.array([(t.id, t.record, t.pixels, t.scanned)
+                         for t in triangles], dtype=np.int64).reshape(-1, 4)
+
+    heap = tri.heap
+    heap_faces = np.array([-1 if element is None else index[element[1]]
+                           for element in heap.elements], dtype=np.int64)
+
+    def face_index(t):
+        return index.get(t, -1) if t is not None else -1
+
+    arrays = {
+        'version': np.array(VERSION),
+        'shape': np.array(tri.dem.shape),
+        'minimum_gap': np.array(tri.minimum_gap, dtype=float),
+        'backend': np.array(tri.backend),
+        'lazy': np.array(tri.lazy),
+        'progressive': np.array(tri.progressive),
+        'pyramid': np.array(tri.pyramid),
+        'totals': np.array([tri.squared_error]),
+        'counts': np.array([tri.error_pixels, tri.pixels_scanned],
+                           dtype=np.int64),
+        'vertices': vertices,
+        'initial_vertices': np.array(tri.initial_vertices),
+        'insertion_errors': np.array(tri.insertion_errors),
+        'faces': faces,
+        'candidates': candidates,
+        'triangle_state': state,
+        'triangle_counters': counters,
+        'triangle_steps': np.array([t.step for t in triangles],
+                                   dtype=np.int64),
+        'heap_pq': np.array(heap.pq),
+        'heap_qp': np.array(heap.qp),
+        'heap_keys': np.array(heap.keys),
+        'heap_faces': heap_faces,
+        'heap_free': np.array(heap.free, dtype=np.int64),
+        'last_triangle': np.array(face_index(tri.last_triangle)),
+        'walk_anchors': np.array([face_index(t) for t in tri.walk_anchors],
+                                 dtype=np.int64),
+        'available': np.packbits(tri.available == 1, axis=None),
+        'record_faces': np.array(tri.record_faces),
+        'record_born': np.array(tri.record_born),
+        'record_died': np.array(tri.record_died),
+    }
+    if tri.voids:
+        arrays['void'] = np.packbits(tri.available == VOID, axis=None)
+        arrays['nodata'] = np.array(np.nan if tri.nodata is None
+                                    else tri.nodata, dtype=float)
+    temporary = filename + '.tmp'
+    with open(temporary, 'wb') as outfile:
+        np.savez(outfile, **arrays)
+    os.replace(temporary, filename)
+
+
+def load(cls, filename, dem, windowed=False):
+    """
+    Restore a Triangulation saved by save
+    :param cls: Triangulation or a subclass
+    :param dem: the height map the checkpoint was made for, as accepted by
+    Triangulation
+    :param windowed: see Triangulation
+    :return: Triangulation that continues exactly where the saved one
+    stopped. Points are located by walking, the history DAG is not restored.
+    """
+    # Nothing created here is garbage, collecting while the object graph is
+    # built only costs time
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return restore(cls, filename, dem, windowed)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def restore(cls, filename, dem, windowed):
+    with np.load(filename, allow_pickle=False) as data:
+        data = dict(data)
+    if int(data['version']) != VERSION:
+        raise ValueError("unsupported checkpoint version {}".format(
+            int(data['version'])))
+
+    tri = cls.__new__(cls)
+    gap = float(data['minimum_gap'])
+    tri.setup(dem, int(gap) if gap == int(gap) else gap,
+              str(data['backend']), bool(data['lazy']), windowed,
+              bool(data['progressive']), bool(data.get('pyramid', False)),
+              float(data['nodata']) if 'nodata' in data else None)
+    if tri.dem.shape != tuple(data['shape']):
+        tri.close()
+        raise ValueError("checkpoint is for a DEM of shape {}, not {}".format(
+            tuple(data['shape']), tri.dem.shape))
+    tri.history = None
+
+    vertices = [Vertex(*position) for position in
+                integral_positions(data['vertices'])]
+    for v in vertices:
+        tri.add_vertex(v)
+    tri.insertion_errors = array('d', data['insertion_errors'].tolist())
+    if 'initial_vertices' in data:
+        tri.initial_vertices = int(data['initial_vertices'])
+    faces = data['faces']
+    half_edges = rebuild_edges(tri, vertices, faces)
+
+    triangles = []
+    candidates = integral_positions(data['candidates'])
+    state = data['triangle_state'].tolist()
+    counters = data['triangle_counters'].tolist()
+    steps = data['triangle_steps'].tolist() if 'triangle_steps' in data \
+        else [1] * len(faces)
+    for i, (v0, v1, v2) in enumerate(faces.tolist()):
+        t = Triangle(half_edges[v0, v1])
+        t.candidate.pos = candidates[i]
+        t.candidate_error, t.squared_error = state[i]
+        t.id, t.record, t.pixels, scanned = counters[i]
+        t.scanned = bool(scanned)
+        t.step = steps[i]
+        triangles.append(t)
+    tri.live_triangles = dict.fromkeys(triangles)
+
+    heap = Heap()
+    heap.pq = array('i', data['heap_pq'].tolist())
+    heap.qp = array('i', data['heap_qp'].tolist())
+    heap.keys = array('d', data['heap_keys'].tolist())
+    heap.elements = [None if i < 0 else (triangles[i].candidate, triangles[i])
+                     for i in data['heap_faces'].tolist()]
+    heap.free = data['heap_free'].tolist()
+    heap.N = len(heap.pq) - 1
+    tri.heap = heap
+
+    last = int(data['last_triangle'])
+    tri.last_triangle = triangles[last] if last >= 0 else triangles[0]
+    tri.walk_anchors = [triangles[i] if i >= 0 else None
+                        for i in data['walk_anchors'].tolist()]
+
+    bits = np.unpackbits(data['available'], count=tri.available.size)
+    tri.available[...] = bits.reshape(tri.available.shape)
+    if 'void' in data:
+        bits = np.unpackbits(data['void'], count=tri.available.size)
+        tri.available[bits.reshape(tri.available.shape) == 1] = VOID
+        tri.voids = True
+    tri.squared_error = float(data['totals'][0])
+    tri.error_pixels, tri.pixels_scanned = data['counts'].tolist()
+    tri.record_faces = array('q', data['record_faces'].tolist())
+    tri.record_born = array('q', data['record_born'].tolist())
+    tri.record_died = array('q', data['record_died'].tolist())
+    return tri
+
+
+def integral_positions(positions):
+    """
+    Rows of (x, y, z) as tuples, with integer x and y where they are
+    integral, like the positions created by the triangulation
+    """
+    result = []
+    for x, y, z in positions.tolist():
+        result.append((int(x) if x == int(x) else x,
+                       int(y) if y == int(y) else y, z))
+    return result
+
+
+def rebuild_edges(tri, vertices, faces):
+    """
+    Create the quad-edges of a triangulation given by its faces. Every
+    directed edge a -> b with face (a, b, c) on its left is followed by a -> c
+    around a. Edges with the outer face on their left are followed by the
+    reversed boundary edge ending at a.
+    :return: dict of the directed edges by their pair of vertex ids
+    """
+    mesh = tri.mesh
+    half_edges = {}
+    following = {}
+    for face in faces.tolist():
+        for a, b, c in ((face[0], face[1], face[2]),
+                        (face[1], face[2], face[0]),
+                        (face[2], face[0], face[1])):
+            following[a, b] = (a, c)
+            if (a, b) not in half_edges:
+                e = mesh.make_edge(vertices[a], vertices[b])
+                tri.add_edge(e)
+                half_edges[a, b] = e
+                half_edges[b, a] = e.sym
+
+    # Boundary: the outer face is on the left of the edges without a face
+    incoming = {b: a for a, b in half_edges if (a, b) not in following}
+    for a, b in list(half_edges):
+        if (a, b) not in following:
+            following[a, b] = (a, incoming[a])
+
+    # Link the edges around every vertex into one ring
+    done = set()
+    for start in half_edges:
+        if start in done:
+            continue
+        key = start
+        while True:
+            done.add(key)
+            successor = following[key]
+            if successor == start:
+                break
+            mesh.splice(half_edges[key], half_edges[successor])
+            key = successor
+    return half_edges
@@ -0,0 +1,207 @@
+# Binary mesh writers. All of them take a (n, 3) array of vertex coordinates
+# and a (m, 3) array of vertex indices per face, counter-clockwise seen from
+# above, as returned by georeference or Triangulation.export_arrays.
+# write_progressive additionally takes the triangle history of a
+# progressive Triangulation.
+
+import json
+import struct
+
+import numpy as np
+from affine import Affine
+
+
+def georeference(vertices, faces, affine=None):
+    """
+    Apply an affine transformation to pixel coordinates
+    :param vertices: (n, 3) array of pixel coordinates and heights
+    :param faces: (m, 3) array of vertex indices, counter-clockwise in pixel
+    coordinates
+    :param affine: transformation, identity if None
+    :return: tuple (vertices, faces) with transformed x and y and the faces
+    counter-clockwise in world coordinates
+    """
+    affine = affine or Affine.identity()
+    world = np.array(vertices, dtype=float)
+    x = world[:, 0].copy()
+    y = world[:, 1]
+    world[:, 0] = affine.a * x + affine.b * y + affine.c
+    world[:, 1] = affine.d * x + affine.e * y + affine.f
+    if affine.determinant < 0:
+        faces = faces[:, ::-1]
+    return world, np.ascontiguousarray(faces)
+
+
+def write_ply(filename, vertices, faces):
+    """
+    Binary little-endian PLY with double precision coordinates
+    """
+    vertices = np.ascontiguousarray(vertices, dtype='<f8')
+    face_records = np.empty(len(faces), dtype=[('count', 'u1'),
+                                               ('indices', '<i4', 3)])
+    face_records['count'] = 3
+    face_records['indices'] = faces
+
+    header = "\n".join([
+        "ply",
+        "format binary_little_endian 1.0",
+        "comment grid2tin",
+        "element vertex {}".format(len(vertices)),
+        "property double x",
+        "property double y",
+        "property double z",
+        "element face {}".format(len(faces)),
+        "property list uchar int vertex_indices",
+        "end_header",
+        ""])
+
+    with open(filename, 'wb') as outfile:
+        outfile.write(header.encode('ascii'))
+        outfile.write(vertices.data)
+        outfile.write(face_records.data)
+
+
+def write_stl(filename, vertices, faces):
+    """
+    Binary STL. The format only knows single precision, so georeferenced
+    coordinates with large offsets lose sub-metre precision.
+    """
+    corners = vertices[faces]
+    normals = np.cross(corners[:, 1] - corners[:, 0],
+                       corners[:, 2] - corners[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    lengths[lengths == 0] = 1
+    normals /= lengths[:, np.newaxis]
+
+    records = np.zeros(len(faces), dtype=[('normal', '<f4', 3),
+                                          ('corners', '<f4', (3, 3)),
+                                          ('attributes', '<u2')])
+    records['normal'] = normals
+    records['corners'] = corners
+
+    with open(filename, 'wb') as outfile:
+        outfile.write(b'grid2tin'.ljust(80, b' '))
+        outfile.write(struct.pack('<I', len(faces)))
+        outfile.write(records.data)
+
+
+def write_glb(filename, vertices, faces):
+    """
+    Binary glTF 2.0 with positions quantized to unsigned 16 bit integers
+    (KHR_mesh_quantization). The node transformation maps them back to the
+    original coordinates. glTF is y-up, so x, y, z are stored as x, z, -y.
+    """
+    positions = np.column_stack([vertices[:, 0], vertices[:, 2],
+                                 -vertices[:, 1]])
+    lower = positions.min(axis=0)
+    extent = positions.max(axis=0) - lower
+    extent[extent == 0] = 1
+    scale = extent / 65535
+
+    # Vertex attributes have to be aligned to 4 bytes, so every position
+    # takes 8 bytes
+    quantized = np.zeros((len(positions), 4), dtype='<u2')
+    quantized[:, :3] = np.rint((positions - lower) / scale)
+
+    if len(vertices) < 2 ** 16:
+        index_type, component_type = '<u2', 5123
+    else:
+        index_type, component_type = '<u4', 5125
+    indices = np.ascontiguousarray(faces, dtype=index_type).ravel()
+
+    position_bytes = quantized.nbytes
+    index_bytes = indices.nbytes
+    index_padding = -index_bytes % 4
+
+    gltf = {
+        "asset": {"version": "2.0", "generator": "grid2tin"},
+        "extensionsUsed": ["KHR_mesh_quantization"],
+        "extensionsRequired": ["KHR_mesh_quantization"],
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0,
+                   "translation": lower.tolist(),
+                   "scale": scale.tolist()}],
+        "meshes": [{"primitives": [{"attributes": {"POSITION": 0},
+                                    "indices": 1,
+                                    "mode": 4}]}],
+        "buffers": [{"byteLength": position_bytes + index_bytes +
+                     index_padding}],
+        "bufferViews": [
+            {"buffer": 0, "byteOffset": 0, "byteLength": position_bytes,
+             "byteStride": 8, "target": 34962},
+            {"buffer": 0, "byteOffset": position_bytes,
+             "byteLength": index_bytes, "target": 34963}],
+        "accessors": [
+            {"bufferView": 0, "componentType": 5123, "count": len(quantized),
+             "type": "VEC3",
+             "min": quantized[:, :3].min(axis=0).tolist(),
+             "max": quantized[:, :3].max(axis=0).tolist()},
+            {"bufferView": 1, "componentType": component_type,
+             "count": len(indices), "type": "SCALAR"}],
+    }
+
+    json_chunk = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+    json_chunk += b' ' * (-len(json_chunk) % 4)
+    bin_length = position_bytes + index_bytes + index_padding
+    total_length = 12 + 8 + len(json_chunk) + 8 + bin_length
+
+    with open(filename, 'wb') as outfile:
+        outfile.write(struct.pack('<4sII', b'glTF', 2, total_length))
+        outfile.write(struct.pack('<I4s', len(json_chunk), b'JSON'))
+        outfile.write(json_chunk)
+        outfile.write(struct.pack('<I4s', bin_length, b'BIN\0'))
+        outfile.write(quantized.data)
+        outfile.write(indices.data)
+        outfile.write(b'\0' * index_padding)
+
+
+def write_npz(filename, vertices, faces, transform=None):
+    """
+    Uncompressed NumPy archive with the arrays vertices, faces and, if given,
+    the six coefficients of the affine transformation in transform
+    """
+    arrays = {'vertices': np.ascontiguousarray(vertices),
+              'faces': np.ascontiguousarray(faces)}
+    if transform is not None:
+        arrays['transform'] = np.asarray(transform, dtype=float)
+    with open(filename, 'wb') as outfile:
+        np.savez(outfile, **arrays)
+
+
+def lod_faces(faces, born, died, n):
+    """
+    Faces of a progressive mesh at level n
+    :param faces: (m, 3) array of vertex indices of all triangles that were
+    ever part of the mesh
+    :param born: vertex count at which each triangle was created
+    :param died: vertex count at which each triangle was replaced, -1 for
+    triangles of the final mesh
+    :param n: number of vertices, the first n vertices of the insertion
+    order form the mesh
+    :return: (k, 3) array of vertex indices below n
+    """
+    died = np.asarray(died)
+    alive = (np.asarray(born) <= n) & ((died > n) | (died < 0))
+    return faces[alive]
+
+
+def write_progressive(filename, vertices, faces, born, died, errors,
+                      transform=None):
+    """
+    Progressive mesh as uncompressed NumPy archive. vertices are in
+    insertion order, the triangle records faces, born and died are sorted
+    by born, so level n only needs the first n vertices and the records up
+    to the last one born at n. errors holds the vertical error of every
+    vertex when it was inserted. Levels are extracted with lod_faces.
+    """
+    order = np.argsort(born, kind='stable')
+    arrays = {'vertices': np.ascontiguousarray(vertices),
+              'faces': np.ascontiguousarray(faces[order]),
+              'born': np.asarray(born)[order],
+              'died': np.asarray(died)[order],
+              'errors': np.asarray(errors, dtype=float)}
+    if transform is not None:
+        arrays['transform'] = np.asarray(transform, dtype=float)
+    with open(filename, 'wb') as outfile:
+        np.savez(outfile, **arrays)
@@ -1,29 +1,68 @@
-# Binary heap implementation based on Sedgewick and Wayne's 
+# Binary heap implementation based on Sedgewick and Wayne's
 # IndexMaxPQ.java: http://algs4.cs.princeton.edu/24pq/IndexMaxPQ.java
 
 import array
 
 
 class Heap:
+    """
+    Indexed max heap. insert returns an id that stays valid until the element
+    leaves the heap through del_max, pop or delete. Ids of removed elements
+    are reused by later inserts.
+    """
     def __init__(self):
         self.pq = array.array('i', [-1])
         self.qp = array.array('i', [-1])
-        self.keys = array.array('f', [-1])
+        self.keys = array.array('d', [-1])
         self.elements = [None]
+        self.free = []
         self.N = 0
-        self.I = 0
 
-    def insert(self, key, element):
+    def __len__(self):
+        return self.N
+
+    def contains(self, i):
+        return 0 < i < len(self.qp) and self.qp[i] != -1
+
+    def new_id(self, key, element):
+        """
+        Append an element at the bottom of the heap without restoring the
+        heap order
+        :return: its id, a reused one if any is free
+        """
+        if self.free:
+            i = self.free.pop()
+            self.keys[i] = key
+            self.elements[i] = element
+        else:
+            i = len(self.qp)
+            self.qp.append(-1)
+            self.keys.append(key)
+            self.elements.append(element)
         self.N += 1
-        self.I += 1
-        self.pq.append(self.I)
-        self.qp.append(self.N)
-        self.keys.append(key)
-        self.elements.append(element)
+        self.pq.append(i)
+        self.qp[i] = self.N
+        return i
 
+    def insert(self, key, element):
+        i = self.new_id(key, element)
         self.swim(self.N)
-
-        return self.I
+        return i
+
+    def heapify(self, keys, elements):
+        """
+        Insert many elements at once in linear time
+        :param keys: sequence of keys, e.g. a NumPy array
+        :param elements: sequence of elements of the same length
+        :return: list of the ids of the inserted elements
+        """
+        if len(keys) != len(elements):
+            raise ValueError("keys and elements differ in length")
+        ids = [self.new_id(key, element)
+               for key, element in zip(keys, elements)]
+        for k in range(self.N // 2, 0, -1):
+            self.sink(k)
+        return ids
 
     def max(self):
         return self.keys[self.pq[1]], self.elements[self.pq[1]]
@@ -35,13 +74,26 @@ class Heap:
         self.N -= 1
 
         self.sink(1)
+        self.elements[maximum] = None
         self.qp[maximum] = -1
+        self.free.append(maximum)
 
     def pop(self):
         maximum = self.max()
         self.del_max()
         return maximum
 
+    def change_key(self, i, key):
+        """
+        Set the key of element i and restore the heap order
+        """
+        if not self.contains(i):
+            raise IndexError("no element with id {} in the heap".format(i))
+        self.keys[i] = key
+        index = self.qp[i]
+        self.swim(index)
+        self.sink(index)
+
     def less(self, i, j):
         return self.keys[self.pq[i]] < self.keys[self.pq[j]]
 
@@ -69,6 +121,8 @@ class Heap:
         self.qp[self.pq[j]] = j
 
     def delete(self, i):
+        if not self.contains(i):
+            raise IndexError("no element with id {} in the heap".format(i))
         index = self.qp[i]
         self.exchange(index, self.N)
         self.pq.pop()
@@ -78,3 +132,4 @@ class Heap:
             self.sink(index)
         self.elements[i] = None
         self.qp[i] = -1
+        self.free.append(i)
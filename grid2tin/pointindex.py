@@ -0,0 +1,151 @@
+# Point queries against a finished mesh. The faces are bucketed into a
+# uniform grid of cells by their bounding boxes, so a query only tests the
+# few faces of its cell. All queries of a chunk are tested at once with
+# NumPy.
+
+import numpy as np
+
+
+class PointIndex:
+    """
+    Uniform grid over the faces of a triangle mesh for locating points and
+    interpolating heights
+    """
+    # Cell area in multiples of the average face area. Faces overlap
+    # several cells with their bounding boxes, so cells smaller than a face
+    # still hold a few faces each.
+    faces_per_cell = 0.5
+    # Points located at once, bounds the size of the temporary arrays
+    chunk_size = 65536
+    # Distance in pixels by which a point may lie outside of a face and still
+    # be found in it, absorbs rounding on shared edges
+    tolerance = 1e-9
+
+    def __init__(self, vertices, faces):
+        """
+        :param vertices: (n, 3) array of pixel coordinates and heights
+        :param faces: (m, 3) array of vertex indices per face
+        """
+        vertices = np.asarray(vertices, dtype=float)
+        faces = np.asarray(faces, dtype=np.intp).reshape(-1, 3)
+        corners = vertices[faces]
+        x = corners[:, :, 0]
+        y = corners[:, :, 1]
+        z = corners[:, :, 2]
+
+        # Plane a * x + b * y + c of every face
+        ux, uy, uz = x[:, 1] - x[:, 0], y[:, 1] - y[:, 0], z[:, 1] - z[:, 0]
+        vx, vy, vz = x[:, 2] - x[:, 0], y[:, 2] - y[:, 0], z[:, 2] - z[:, 0]
+        den = ux * vy - uy * vx
+        self.a = (uz * vy - uy * vz) / den
+        self.b = (ux * vz - uz * vx) / den
+        self.c = z[:, 0] - self.a * x[:, 0] - self.b * y[:, 0]
+
+        # Edge equations p * x + q * y + r, the signed distance from the
+        # edge, positive on the interior side, as (m, 3, 3) array of the
+        # coefficients p, q, r of the three edges
+        orientation = np.sign(den)[:, np.newaxis]
+        dx = (np.roll(x, -1, axis=1) - x) * orientation
+        dy = (np.roll(y, -1, axis=1) - y) * orientation
+        length = np.hypot(dx, dy)
+        length[length == 0] = 1
+        self.edges = np.stack([-dy, dx, dy * x - dx * y], axis=2) / \
+            length[:, :, np.newaxis]
+
+        self.x_min = x.min() if len(faces) else 0.0
+        self.y_min = y.min() if len(faces) else 0.0
+        width = x.max() - self.x_min if len(faces) else 0.0
+        height = y.max() - self.y_min if len(faces) else 0.0
+        self.cell_size = max(
+            np.sqrt(width * height * self.faces_per_cell / max(len(faces), 1)),
+            1.0)
+        self.columns = int(width // self.cell_size) + 1
+        self.rows = int(height // self.cell_size) + 1
+
+        # Cells covered by the bounding box of every face, in CSR layout
+        x0 = ((x.min(axis=1) - self.x_min) // self.cell_size).astype(np.intp)
+        x1 = ((x.max(axis=1) - self.x_min) // self.cell_size).astype(np.intp)
+        y0 = ((y.min(axis=1) - self.y_min) // self.cell_size).astype(np.intp)
+        y1 = ((y.max(axis=1) - self.y_min) // self.cell_size).astype(np.intp)
+        spans = x1 - x0 + 1
+        counts = spans * (y1 - y0 + 1)
+        face_ids = np.repeat(np.arange(len(faces)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+                                                    counts)
+        spans = np.repeat(spans, counts)
+        cells = (np.repeat(y0, counts) + local // spans) * self.columns + \
+            np.repeat(x0, counts) + local % spans
+        order = np.argsort(cells, kind='stable')
+        self.cell_faces = face_ids[order]
+        self.cell_start = np.zeros(self.rows * self.columns + 1, dtype=np.intp)
+        np.cumsum(np.bincount(cells, minlength=self.rows * self.columns),
+                  out=self.cell_start[1:])
+
+    def locate(self, xs, ys):
+        """
+        :param xs: x pixel coordinates, array of any shape
+        :param ys: y pixel coordinates, same shape as xs
+        :return: array of face indices of the same shape, -1 for points
+        outside of the mesh. A point on a shared edge gets the face first
+        in the mesh order.
+        """
+        xs, ys = np.broadcast_arrays(np.asarray(xs, dtype=float),
+                                     np.asarray(ys, dtype=float))
+        flat_x = xs.ravel()
+        flat_y = ys.ravel()
+        ids = np.full(flat_x.shape, -1, dtype=np.intp)
+        for start in range(0, len(flat_x), self.chunk_size):
+            stop = start + self.chunk_size
+            ids[start:stop] = self.locate_chunk(flat_x[start:stop],
+                                                flat_y[start:stop])
+        return ids.reshape(xs.shape)
+
+    def locate_chunk(self, x, y):
+        ids = np.full(x.shape, -1, dtype=np.intp)
+        column = np.floor((x - self.x_min) / self.cell_size)
+        row = np.floor((y - self.y_min) / self.cell_size)
+        inside = (column >= 0) & (column < self.columns) & \
+                 (row >= 0) & (row < self.rows)
+        points = np.flatnonzero(inside)
+        cells = row[points].astype(np.intp) * self.columns + \
+            column[points].astype(np.intp)
+
+        # One pair per point and face of its cell
+        first = self.cell_start[cells]
+        counts = self.cell_start[cells + 1] - first
+        pair_points = np.repeat(points, counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+                                                    counts)
+        pair_faces = self.cell_faces[np.repeat(first, counts) + local]
+
+        edges = self.edges[pair_faces]
+        distance = edges[:, :, 0] * x[pair_points, np.newaxis] + \
+            edges[:, :, 1] * y[pair_points, np.newaxis] + edges[:, :, 2]
+        hit = np.all(distance >= -self.tolerance, axis=1)
+
+        # Pairs are grouped by point in ascending face order, keep the first
+        # hit of every point
+        pair_points = pair_points[hit]
+        pair_faces = pair_faces[hit]
+        first = np.ones(len(pair_points), dtype=bool)
+        first[1:] = pair_points[1:] != pair_points[:-1]
+        ids[pair_points[first]] = pair_faces[first]
+        return ids
+
+    def interpolate(self, xs, ys, ids=None):
+        """
+        Heights of the mesh at the given points
+        :param ids: face indices from locate, computed if None
+        :return: tuple (z, ids), z is NaN outside of the mesh
+        """
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        if ids is None:
+            ids = self.locate(xs, ys)
+        found = ids >= 0
+        z = np.full(ids.shape, np.nan)
+        faces = ids[found]
+        z[found] = self.a[faces] * np.broadcast_to(xs, ids.shape)[found] + \
+            self.b[faces] * np.broadcast_to(ys, ids.shape)[found] + \
+            self.c[faces]
+        return z, ids
@@ -0,0 +1,152 @@
+# Opt-in instrumentation of a Triangulation. The profiler replaces the hot
+# methods of one triangulation, its heap and its mesh by timed wrappers set
+# as instance attributes, so triangulations without a profiler run the plain
+# methods and pay nothing.
+
+import logging
+from time import perf_counter
+
+
+class Profiler:
+    """
+    Call counts and wall time per phase of a Triangulation, plus counters
+    of the mesh work. Timers are inclusive: insert_site contains the search
+    and mark_availability of the inserted vertex.
+    """
+    phases = ('search', 'insert_site', 'scan_triangle', 'mark_availability',
+              'heap')
+    # Methods wrapped per phase
+    methods = {'search': ('walk', 'search_history'),
+               'insert_site': ('insert_site',),
+               'scan_triangle': ('scan_triangle',),
+               'mark_availability': ('mark_availability',)}
+    heap_methods = ('insert', 'delete', 'del_max', 'max', 'change_key')
+
+    def __init__(self, log_every=None):
+        """
+        :param log_every: log a line of statistics at level INFO after every
+        log_every insertions, never if None
+        """
+        self.log_every = log_every
+        self.calls = dict.fromkeys(self.phases, 0)
+        self.seconds = dict.fromkeys(self.phases, 0.0)
+        self.insertions = 0
+        self.swaps = 0
+        self.searches = 0
+        self.depth_total = 0
+        self.depth_max = 0
+        self.pixels_start = 0
+        self.started = perf_counter()
+        self.triangulation = None
+
+    def attach(self, tri):
+        """
+        Install the wrappers on tri, see Triangulation.enable_profiling
+        """
+        self.triangulation = tri
+        self.pixels_start = tri.pixels_scanned
+        self.started = perf_counter()
+        for phase, names in self.methods.items():
+            for name in names:
+                setattr(tri, name, self.timed(phase, getattr(tri, name)))
+        tri.insert_site = self.counted_insertion(tri.insert_site)
+        tri.search_history = self.measured_search(tri.search_history)
+        self.attach_heap(tri.heap)
+        tri.mesh.swap = self.counted_swap(tri.mesh.swap)
+
+    def attach_heap(self, heap):
+        for name in self.heap_methods:
+            setattr(heap, name, self.timed('heap', getattr(heap, name)))
+
+    def detach(self, tri):
+        """
+        Remove the wrappers again
+        """
+        for names in self.methods.values():
+            for name in names:
+                tri.__dict__.pop(name, None)
+        for name in self.heap_methods:
+            tri.heap.__dict__.pop(name, None)
+        tri.mesh.__dict__.pop('swap', None)
+        self.triangulation = None
+
+    def timed(self, phase, method):
+        calls = self.calls
+        seconds = self.seconds
+
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                seconds[phase] += perf_counter() - start
+                calls[phase] += 1
+        return wrapper
+
+    def counted_insertion(self, method):
+        def wrapper(*args, **kwargs):
+            result = method(*args, **kwargs)
+            self.insertions += 1
+            if self.log_every and self.insertions % self.log_every == 0:
+                logging.info(self.log_line())
+            return result
+        return wrapper
+
+    def measured_search(self, method):
+        tri = self.triangulation
+
+        def wrapper(v):
+            result = method(v)
+            self.searches += 1
+            self.depth_total += tri.search_depth
+            self.depth_max = max(self.depth_max, tri.search_depth)
+            return result
+        return wrapper
+
+    def counted_swap(self, method):
+        def wrapper(e):
+            self.swaps += 1
+            return method(e)
+        return wrapper
+
+    def snapshot(self):
+        """
+        :return: dict of plain numbers, suitable for JSON. phases maps every
+        phase to its calls and seconds.
+        """
+        tri = self.triangulation
+        elapsed = perf_counter() - self.started
+        pixels = tri.pixels_scanned - self.pixels_start if tri else 0
+        insertions = self.insertions
+        return {
+            'elapsed': elapsed,
+            'vertices': len(tri.vertex_dict) if tri else 0,
+            'triangles': len(tri.live_triangles) if tri else 0,
+            'insertions': insertions,
+            'insertions_per_second': insertions / elapsed if elapsed else 0.0,
+            'pixels_scanned': pixels,
+            'pixels_per_insertion': pixels / insertions if insertions else 0.0,
+            'swaps': self.swaps,
+            'swaps_per_insertion':
+                self.swaps / insertions if insertions else 0.0,
+            'history_depth_mean':
+                self.depth_total / self.searches if self.searches else 0.0,
+            'history_depth_max': self.depth_max,
+            'phases': {phase: {'calls': self.calls[phase],
+                               'seconds': self.seconds[phase]}
+                       for phase in self.phases},
+        }
+
+    def log_line(self):
+        """
+        One line summary of snapshot
+        """
+        stats = self.snapshot()
+        phases = ' '.join(
+            '{}={:.3f}s'.format(phase, stats['phases'][phase]['seconds'])
+            for phase in self.phases)
+        return ('{vertices} vertices, {insertions_per_second:.0f} ins/s, '
+                '{pixels_per_insertion:.0f} px/ins, '
+                '{swaps_per_insertion:.2f} swaps/ins, '
+                'depth {history_depth_mean:.1f}/{history_depth_max}, '
+                .format(**stats) + phases)
@@ -0,0 +1,241 @@
+# Pure-Python fallback for the compiled calculation extension. It is used
+# when grid2tin.calculation has not been built, see setup.py.
+
+import logging
+from math import ceil, floor
+
+import numpy as np
+
+# Whether warn_fallback has logged its warning
+warned = False
+
+
+def warn_fallback():
+    """
+    Log once that the pure-Python implementation is used, called by the
+    modules falling back to it
+    """
+    global warned
+    if not warned:
+        warned = True
+        logging.warning("Compiled extension grid2tin.calculation not found, "
+                        "falling back to the pure-Python implementation")
+
+
+# Value of the availability mask for pixels without data
+VOID = 2
+
+
+def calc_interpolation(a, b, c, x, y):
+    return a * x + b * y + c
+
+
+def scan_triangle_line(available, dem, t, y, x_a, x_b, interpolation_map=None,
+                       only_return_points=False):
+    x_start = int(ceil(min(x_a, x_b)))
+    x_end = int(floor(max(x_a, x_b)))
+
+    a = t.a
+    b = t.b
+    c = t.c
+
+    points = []
+    for x in range(x_start, x_end + 1):
+        if only_return_points:
+            points.append((x, y))
+        else:
+            z_map = float(dem[y, x])
+            error = abs(z_map - calc_interpolation(a, b, c, x, y))
+            if interpolation_map is not None:
+                interpolation_map[y, x] = calc_interpolation(a, b, c, x, y)
+            if error > t.candidate_error and available[y, x] == 1:
+                t.candidate_error = error
+                t.candidate.pos = (x, y, z_map)
+    return points
+
+
+def scan_triangle_candidate(available, dem, x0, y0, x1, y1, x2, y2,
+                            a, b, c, threshold, x_off=0, y_off=0, step=1,
+                            voids=False):
+    """
+    Same contract as the compiled version, every row is evaluated as a NumPy
+    slice.
+    """
+    best = None
+    best_error = threshold
+    pixels = 0
+    squared_error = 0.0
+
+    def scan_line(y, x_a, x_b):
+        nonlocal best, best_error, pixels, squared_error
+        if y < y_off or (y - y_off) % step or \
+                (y - y_off) // step >= dem.shape[0]:
+            return
+        # Columns of the level arrays covered by the row
+        first = -(-(int(ceil(min(x_a, x_b))) - x_off) // step)
+        last = (int(floor(max(x_a, x_b))) - x_off) // step
+        if last < first:
+            return
+        x = x_off + step * np.arange(first, last + 1, dtype=float)
+        row = (y - y_off) // step
+        flags = available[row, first:last + 1]
+        difference = dem[row, first:last + 1] - (a * x + b * y + c)
+        if voids:
+            valid = flags != VOID
+            pixels += int(np.count_nonzero(valid))
+            squared_error += float(np.dot(difference[valid],
+                                          difference[valid]))
+        else:
+            pixels += last - first + 1
+            squared_error += float(np.dot(difference, difference))
+        error = np.abs(difference)
+        # NaN never wins a comparison in the compiled scan either
+        error[(flags != 1) | np.isnan(error)] = -np.inf
+        i = int(np.argmax(error))
+        if error[i] > best_error:
+            best_error = float(error[i])
+            best = (x_off + (first + i) * step, y)
+
+    # Sort vertices in ascending order
+    if y0 > y1:
+        x0, y0, x1, y1 = x1, y1, x0, y0
+    if y0 > y2:
+        x0, y0, x2, y2 = x2, y2, x0, y0
+    if y1 > y2:
+        x1, y1, x2, y2 = x2, y2, x1, y1
+
+    if y1 == y0:
+        dx0 = 0.0
+    else:
+        dx0 = (x1 - x0) / (y1 - y0)
+    dx1 = (x2 - x0) / (y2 - y0)
+
+    x_a = x0
+    x_b = x0
+    for y in range(y0, y1):
+        scan_line(y, x_a, x_b)
+        x_a += dx0
+        x_b += dx1
+
+    if y2 == y1:
+        dx0 = 0.0
+    else:
+        dx0 = (x2 - x1) / (y2 - y1)
+
+    x_a = x1
+    for y in range(y1, y2 + 1):
+        scan_line(y, x_a, x_b)
+        x_a += dx0
+        x_b += dx1
+
+    if best is None:
+        return pixels, best_error, -1, -1, 0.0, squared_error
+    return (pixels, best_error, best[0], best[1],
+            float(dem[(best[1] - y_off) // step, (best[0] - x_off) // step]),
+            squared_error)
+
+
+def rasterize_faces(out, vertices, faces, x_off=0, y_off=0):
+    """
+    Same contract as the compiled version, every row is written as a NumPy
+    slice.
+    """
+    for i0, i1, i2 in faces.tolist():
+        x0, y0, z0 = vertices[i0].tolist()
+        x1, y1, z1 = vertices[i1].tolist()
+        x2, y2, z2 = vertices[i2].tolist()
+        y0, y1, y2 = int(y0), int(y1), int(y2)
+
+        den = float((x1 - x0) * (y2 - y0) - (y1 - y0) * (x2 - x0))
+        a = ((z1 - z0) * (y2 - y0) - (y1 - y0) * (z2 - z0)) / den
+        b = ((x1 - x0) * (z2 - z0) - (z1 - z0) * (x2 - x0)) / den
+        c = z0 - a * x0 - b * y0
+
+        if max(y0, y1, y2) < y_off or min(y0, y1, y2) >= y_off + out.shape[0]:
+            continue
+
+        def fill_line(y, x_a, x_b):
+            if y < y_off or y >= y_off + out.shape[0]:
+                return
+            x_start = int(ceil(min(x_a, x_b)))
+            x_end = int(floor(max(x_a, x_b)))
+            if x_end < x_start:
+                return
+            x = np.arange(x_start, x_end + 1, dtype=float)
+            out[y - y_off, x_start - x_off:x_end + 1 - x_off] = a * x + b * y + c
+
+        if y0 > y1:
+            x0, y0, x1, y1 = x1, y1, x0, y0
+        if y0 > y2:
+            x0, y0, x2, y2 = x2, y2, x0, y0
+        if y1 > y2:
+            x1, y1, x2, y2 = x2, y2, x1, y1
+
+        dx0 = 0.0 if y1 == y0 else (x1 - x0) / (y1 - y0)
+        dx1 = (x2 - x0) / (y2 - y0)
+        x_a = x_b = x0
+        for y in range(y0, y1):
+            fill_line(y, x_a, x_b)
+            x_a += dx0
+            x_b += dx1
+
+        dx0 = 0.0 if y2 == y1 else (x2 - x1) / (y2 - y1)
+        x_a = x1
+        for y in range(y1, y2 + 1):
+            fill_line(y, x_a, x_b)
+            x_a += dx0
+            x_b += dx1
+
+
+# Geometric predicates, same contract as the compiled versions. Python ints
+# are exact anyway, only on_segment needs a separate integer branch.
+
+eps = 1e-6
+exact_limit = 1 << 30
+
+
+def integral(*vertices):
+    return all(type(v.x) is int and type(v.y) is int and
+               -exact_limit < v.x < exact_limit and
+               -exact_limit < v.y < exact_limit for v in vertices)
+
+
+def triangle_area(v0, v1, v2):
+    return (v1.x - v0.x) * (v2.y - v0.y) - (v1.y - v0.y) * (v2.x - v0.x)
+
+
+def ccw(v0, v1, v2):
+    return triangle_area(v0, v1, v2) > 0
+
+
+def in_triangle(v, v0, v1, v2):
+    return triangle_area(v0, v1, v) >= 0 and \
+           triangle_area(v1, v2, v) >= 0 and \
+           triangle_area(v2, v0, v) >= 0
+
+
+def in_circle(v, v0, v1, v2):
+    det = (v0.x ** 2 + v0.y ** 2) * triangle_area(v1, v2, v) - \
+          (v1.x ** 2 + v1.y ** 2) * triangle_area(v0, v2, v) + \
+          (v2.x ** 2 + v2.y ** 2) * triangle_area(v0, v1, v) - \
+          (v.x ** 2 + v.y ** 2) * triangle_area(v0, v1, v2)
+    return det > 0 if integral(v, v0, v1, v2) else det > eps
+
+
+def on_segment(v, v0, v1):
+    if integral(v, v0, v1):
+        return triangle_area(v0, v1, v) == 0 and \
+               min(v0.x, v1.x) <= v.x <= max(v0.x, v1.x) and \
+               min(v0.y, v1.y) <= v.y <= max(v0.y, v1.y)
+    t1 = ((v.x - v0.x) ** 2 + (v.y - v0.y) ** 2) ** 0.5
+    t2 = ((v.x - v1.x) ** 2 + (v.y - v1.y) ** 2) ** 0.5
+    if t1 < eps or t2 < eps:
+        return True
+    dx = v1.x - v0.x
+    dy = v1.y - v0.y
+    t3 = (dx ** 2 + dy ** 2) ** 0.5
+    if t1 > t3 or t2 > t3:
+        return False
+    # Distance from the line through v0 and v1
+    return abs(dy / t3 * v.x - dx / t3 * v.y -
+               (dy / t3 * v0.x - dx / t3 * v0.y)) < eps
@@ -6,11 +6,13 @@ import math
 import sys
 from numbers import Number
 
-import pyximport
-
-pyximport.install()
-# noinspection PyPep8
-from .calculation import calc_interpolation
+try:
+    from .calculation import calc_interpolation, triangle_area, ccw, \
+        in_triangle, in_circle, on_segment
+except ImportError:
+    from .pycalculation import calc_interpolation, triangle_area, ccw, \
+        in_triangle, in_circle, on_segment, warn_fallback
+    warn_fallback()
 
 logging.basicConfig(level=logging.WARN)
 
@@ -139,6 +141,23 @@ def swap(e):
     e.destination = b.destination
 
 
+def delete_edge(e):
+    splice(e, e.o_prev)
+    splice(e.sym, e.sym.o_prev)
+
+
+class QuadEdgeMesh:
+    """
+    Mesh backend built from QuadEdge objects, the default for Triangulation.
+    See arraymesh.ArrayMesh for the array-backed alternative.
+    """
+    make_edge = staticmethod(make_edge)
+    splice = staticmethod(splice)
+    connect = staticmethod(connect)
+    swap = staticmethod(swap)
+    delete_edge = staticmethod(delete_edge)
+
+
 class Vertex:
     def __init__(self, x, y, z=0.0):
         self.x = x
@@ -160,15 +179,10 @@ class Vertex:
         return "({},{},{})".format(*self.pos)
 
     def in_triangle(self, v0, v1, v2):
-        return triangle_area(v0, v1, self) >= 0 and \
-               triangle_area(v1, v2, self) >= 0 and \
-               triangle_area(v2, v0, self) >= 0
+        return in_triangle(self, v0, v1, v2)
 
     def in_circle(self, v0, v1, v2):
-        return (v0.x ** 2 + v0.y ** 2) * triangle_area(v1, v2, self) - \
-               (v1.x ** 2 + v1.y ** 2) * triangle_area(v0, v2, self) + \
-               (v2.x ** 2 + v2.y ** 2) * triangle_area(v0, v1, self) - \
-               (self.x ** 2 + self.y ** 2) * triangle_area(v0, v1, v2) > eps
+        return in_circle(self, v0, v1, v2)
 
     def left_of(self, e):
         return ccw(self, e.origin, e.destination)
@@ -177,15 +191,7 @@ class Vertex:
         return ccw(self, e.destination, e.origin)
 
     def on_edge(self, e):
-        t1 = (self - e.origin).norm
-        t2 = (self - e.destination).norm
-        if t1 < eps or t2 < eps:
-            return True
-        t3 = (e.origin - e.destination).norm
-        if t1 > t3 or t2 > t3:
-            return False
-        l = Line(e.origin, e.destination)
-        return math.fabs(l.evaluate(self)) < eps
+        return on_segment(self, e.origin, e.destination)
 
     @property
     def norm(self):
@@ -248,6 +254,14 @@ class Triangle:
         self.id = id_
         self.candidate = Vertex(-1, -1, 0)
         self.candidate_error = float_min
+        self.scanned = False
+        # Sum of squared errors and number of pixels of the last scan
+        self.squared_error = 0.0
+        self.pixels = 0
+        # Index of the triangle record of a progressive Triangulation
+        self.record = -1
+        # Pixel spacing of the last scan, greater than 1 for coarse scans
+        self.step = 1
         self.a = self.b = self.c = None
 
         if anchor:
@@ -284,14 +298,6 @@ class Triangle:
                                        self.vertices[2])
 
 
-def triangle_area(v0, v1, v2):
-    return (v1.x - v0.x) * (v2.y - v0.y) - (v1.y - v0.y) * (v2.x - v0.x)
-
-
-def ccw(v0, v1, v2):
-    return triangle_area(v0, v1, v2) > 0
-
-
 class Line:
     def __init__(self, v0, v1):
         t = v1 - v0
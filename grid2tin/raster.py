@@ -0,0 +1,234 @@
+# DEM input. Height maps are kept in their native data type whenever the
+# scan kernel supports it, and large rasters can stay on disk, either as a
+# memory-mapped .npy file or behind a cache of rasterio windows.
+
+import logging
+from collections import OrderedDict
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+# Data types the scan kernel is compiled for
+kernel_dtypes = tuple(np.dtype(t) for t in (np.int16, np.uint16, np.int32,
+                                            np.int64, np.float32, np.float64))
+
+
+def kernel_dtype(dtype):
+    """
+    :return: the smallest data type supported by the scan kernel that holds
+    all values of dtype
+    """
+    dtype = np.dtype(dtype)
+    if dtype in kernel_dtypes:
+        return dtype
+    for candidate in kernel_dtypes:
+        if np.can_cast(dtype, candidate, casting='safe'):
+            return candidate
+    return np.dtype(np.float64)
+
+
+def as_kernel_array(dem):
+    """
+    Use a 2D array as it is if the scan kernel supports its data type,
+    otherwise convert it. Read-only arrays and memory maps are not copied.
+    """
+    dem = np.asarray(dem)
+    if dem.ndim > 2:
+        dem = dem.squeeze()
+    dtype = kernel_dtype(dem.dtype)
+    if dem.dtype != dtype:
+        logging.warning("Converting DEM from %s to %s", dem.dtype, dtype)
+        dem = dem.astype(dtype)
+    return dem
+
+
+def load_npy(path):
+    """
+    Memory-map a .npy file read-only
+    """
+    return as_kernel_array(np.load(path, mmap_mode='r'))
+
+
+def pyramid_levels(dem, count):
+    """
+    Decimated copies of a DEM, level k holds every 2**k-th pixel of every
+    2**k-th row
+    :param count: number of levels, including the DEM itself as level 0
+    :return: list of arrays, level 0 is dem itself
+    """
+    levels = [dem]
+    for _ in range(1, count):
+        if min(levels[-1].shape) < 2:
+            break
+        levels.append(np.ascontiguousarray(levels[-1][::2, ::2]))
+    return levels
+
+
+def raster_nodata(path, band=1):
+    """
+    :return: the nodata value of a band of a raster file, None if it has
+    none
+    """
+    with rasterio.Env():
+        with rasterio.open(path) as src:
+            return src.nodatavals[band - 1]
+
+
+def read_raster(path, band=1):
+    """
+    Read one band of a raster file into memory in its native data type
+    :return: tuple (dem, transform)
+    """
+    with rasterio.Env():
+        with rasterio.open(path) as src:
+            return as_kernel_array(src.read(band)), src.transform
+
+
+def raster_to_npy(path, npy_path, band=1, rows=1024):
+    """
+    Copy one band of a raster file into a .npy file, rows lines at a time,
+    so it can be memory-mapped later without reading it into memory
+    :return: transform of the raster
+    """
+    with rasterio.Env():
+        with rasterio.open(path) as src:
+            dtype = kernel_dtype(src.dtypes[band - 1])
+            out = np.lib.format.open_memmap(npy_path, mode='w+', dtype=dtype,
+                                            shape=(src.height, src.width))
+            for row in range(0, src.height, rows):
+                height = min(rows, src.height - row)
+                out[row:row + height] = src.read(
+                    band, window=Window(0, row, src.width, height))
+            out.flush()
+            del out
+            return src.transform
+
+
+def write_raster(path, windows, shape, dtype, transform=None, crs=None,
+                 block_size=256, compress='deflate'):
+    """
+    Write a single band tiled GeoTIFF window by window, so the raster never
+    has to be in memory as a whole
+    :param windows: iterable of (row, data) pairs, data holds the full-width
+    rows starting at row
+    :param shape: (height, width) of the raster
+    :param block_size: edge length of the GeoTIFF tiles, a multiple of 16
+    """
+    profile = {'driver': 'GTiff', 'count': 1,
+               'height': shape[0], 'width': shape[1], 'dtype': dtype,
+               'tiled': True, 'blockxsize': block_size,
+               'blockysize': block_size, 'compress': compress,
+               'transform': transform, 'crs': crs}
+    with rasterio.Env():
+        with rasterio.open(path, 'w', **profile) as dst:
+            for row, data in windows:
+                dst.write(data.astype(dtype, copy=False), 1,
+                          window=Window(0, row, shape[1], data.shape[0]))
+
+
+class BlockCachedRaster:
+    """
+    Read-only 2D view of a raster band that reads square blocks on demand
+    and keeps the most recently used ones in memory. Supports indexing with
+    two integers or two slices with step 1, like a 2D array.
+    """
+    ndim = 2
+    gdal_cache_bytes = 8 * 2 ** 20
+
+    def __init__(self, path, band=1, block_size=512, cache_blocks=64):
+        """
+        :param block_size: edge length of the cached blocks in pixels
+        :param cache_blocks: number of blocks kept in memory
+        """
+        self.path = path
+        self.band = band
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self.src = rasterio.open(path)
+        self.shape = (self.src.height, self.src.width)
+        self.dtype = kernel_dtype(self.src.dtypes[band - 1])
+        self.transform = self.src.transform
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self.src.close()
+        self.cache.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def block(self, row, column):
+        key = (row, column)
+        data = self.cache.get(key)
+        if data is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return data
+        self.misses += 1
+        size = self.block_size
+        window = Window(column * size, row * size,
+                        min(size, self.shape[1] - column * size),
+                        min(size, self.shape[0] - row * size))
+        # The blocks are cached here, keep GDAL from caching them again
+        with rasterio.Env(GDAL_CACHEMAX=self.gdal_cache_bytes):
+            data = self.src.read(self.band, window=window)
+        data = data.astype(self.dtype, copy=False)
+        data.flags.writeable = False
+        self.cache[key] = data
+        if len(self.cache) > self.cache_blocks:
+            self.cache.popitem(last=False)
+        return data
+
+    def read(self, y_start, y_stop, x_start, x_stop):
+        """
+        Copy the window [y_start, y_stop) x [x_start, x_stop) out of the
+        cached blocks
+        """
+        size = self.block_size
+        out = np.empty((max(y_stop - y_start, 0), max(x_stop - x_start, 0)),
+                       dtype=self.dtype)
+        if out.size == 0:
+            return out
+        for row in range(y_start // size, (y_stop - 1) // size + 1):
+            top = max(y_start, row * size)
+            bottom = min(y_stop, row * size + size)
+            for column in range(x_start // size, (x_stop - 1) // size + 1):
+                left = max(x_start, column * size)
+                right = min(x_stop, column * size + size)
+                data = self.block(row, column)
+                out[top - y_start:bottom - y_start,
+                    left - x_start:right - x_start] = \
+                    data[top - row * size:bottom - row * size,
+                         left - column * size:right - column * size]
+        return out
+
+    def __getitem__(self, key):
+        y, x = key
+        if isinstance(y, slice) and isinstance(x, slice):
+            y_start, y_stop, y_step = y.indices(self.shape[0])
+            x_start, x_stop, x_step = x.indices(self.shape[1])
+            if y_step != 1 or x_step != 1:
+                raise IndexError("only slices with step 1 are supported")
+            return self.read(y_start, y_stop, x_start, x_stop)
+        if isinstance(y, slice) or isinstance(x, slice):
+            raise IndexError("mixed integer and slice indices are not "
+                             "supported")
+        y = int(y) + self.shape[0] if y < 0 else int(y)
+        x = int(x) + self.shape[1] if x < 0 else int(x)
+        if not (0 <= y < self.shape[0] and 0 <= x < self.shape[1]):
+            raise IndexError("index ({}, {}) out of bounds".format(*key))
+        size = self.block_size
+        return self.block(y // size, x // size)[y % size, x % size]
+
+    def __array__(self, dtype=None, copy=None):
+        """
+        Read the whole raster into memory
+        """
+        data = self.read(0, self.shape[0], 0, self.shape[1])
+        return data if dtype is None else data.astype(dtype)
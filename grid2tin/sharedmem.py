@@ -0,0 +1,119 @@
+# DEM in shared memory, so that worker processes triangulating parts or
+# variants of the same raster use one physical copy of it.
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedDEM:
+    """
+    2D array in a multiprocessing.shared_memory block.
+
+    Pickling a SharedDEM only transfers the name, shape and data type of the
+    block, unpickling attaches to it without copying. Arrays returned by the
+    array property keep the SharedDEM alive and hold an export of the
+    buffer of the block, so it cannot be unmapped while they are in use.
+    The creating process owns the block and removes it in close() or when
+    the SharedDEM is garbage collected, it has to outlive the workers using
+    it.
+    """
+    def __init__(self, array=None, name=None, shape=None, dtype=None):
+        """
+        Create a new block holding a copy of array. Use attach() to open an
+        existing block.
+        """
+        if array is not None:
+            array = np.asarray(array)
+            self.shm = shared_memory.SharedMemory(create=True,
+                                                  size=max(array.nbytes, 1))
+            self.shape = array.shape
+            self.dtype = array.dtype
+            self.owner = True
+        else:
+            self.shm = self.open(name)
+            self.shape = tuple(shape)
+            self.dtype = np.dtype(dtype)
+            self.owner = False
+        self.closed = False
+        if array is not None:
+            self.array[...] = array
+
+    @staticmethod
+    def open(name):
+        try:
+            # Python 3.13+: only the owner registers with the resource
+            # tracker. Before, processes of a multiprocessing pool share the
+            # tracker of their parent, so the registration is a no-op.
+            return shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            return shared_memory.SharedMemory(name=name)
+
+    @classmethod
+    def attach(cls, name, shape, dtype):
+        """
+        Open an existing block created by another SharedDEM
+        """
+        return cls(name=name, shape=shape, dtype=dtype)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def array(self):
+        """
+        The DEM as array, read-only unless this process created the block
+        """
+        if self.closed:
+            raise ValueError("shared memory block is closed")
+        return np.asarray(BufferExport(self))
+
+    def __reduce__(self):
+        return self.attach, (self.name, self.shape, self.dtype.str)
+
+    def close(self):
+        """
+        Unmap the block and remove it if this process created it. Raises
+        BufferError and leaves the block open while arrays returned by array
+        are still in use.
+        """
+        if not self.closed:
+            try:
+                self.shm.close()
+            except BufferError:
+                raise BufferError("arrays of the shared memory block {} are "
+                                  "still in use".format(self.name)) from None
+            self.closed = True
+            if self.owner:
+                self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        if hasattr(self, 'closed'):
+            self.close()
+
+
+class BufferExport:
+    """
+    Base of the arrays of a SharedDEM. It keeps the SharedDEM alive and an
+    export of the buffer of its block, which makes SharedMemory.close
+    refuse to unmap the block.
+    """
+    def __init__(self, dem):
+        self.dem = dem
+        self.buffer = np.frombuffer(dem.shm.buf, np.uint8)
+        self.__array_interface__ = {
+            'shape': dem.shape,
+            'typestr': dem.dtype.str,
+            'data': (self.buffer.ctypes.data, not dem.owner),
+            'version': 3}
+
+    def __del__(self):
+        # Release the export before the SharedDEM, which may close the block
+        self.buffer = None
@@ -0,0 +1,265 @@
+# Tiled triangulation. The raster is split into tiles that share their
+# boundary rows and columns. Vertices on these seams are chosen beforehand
+# from the seam profile alone, so both neighbouring tiles insert exactly the
+# same seam vertices and no other vertex lands on a seam. The tile meshes
+# then fit together without cracks.
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from math import ceil
+
+import numpy as np
+from affine import Affine
+
+from . import export
+from .pointindex import PointIndex
+from .quadedge import Vertex
+from .raster import as_kernel_array, load_npy, read_raster
+from .sharedmem import SharedDEM
+from .triangulation import Triangulation
+
+
+def simplify_profile(z, max_error):
+    """
+    Greedy 1D simplification of a height profile. Segments are split at the
+    sample with the greatest vertical error until no error exceeds
+    max_error.
+    :param z: heights of the profile
+    :return: sorted indices of the kept samples, including both ends
+    """
+    z = np.asarray(z, dtype=float)
+    keep = [0, len(z) - 1]
+    stack = [(0, len(z) - 1)]
+    while stack:
+        start, stop = stack.pop()
+        if stop - start < 2:
+            continue
+        t = np.arange(1, stop - start) / (stop - start)
+        line = z[start] + t * (z[stop] - z[start])
+        error = np.abs(z[start + 1:stop] - line)
+        i = int(np.argmax(error))
+        if error[i] > max_error:
+            split = start + 1 + i
+            keep.append(split)
+            stack.append((start, split))
+            stack.append((split, stop))
+    return np.unique(keep)
+
+
+def tile_bounds(size, tile_size):
+    """
+    :return: pixel positions of the tile boundaries along one axis. Tile i
+    spans bounds[i] ... bounds[i + 1], both inclusive.
+    """
+    tiles = max(ceil((size - 1) / tile_size), 1)
+    return np.rint(np.linspace(0, size - 1, tiles + 1)).astype(int)
+
+
+def triangulate_tile(task):
+    """
+    Greedy insertion on a single tile, run in a worker process
+    :param task: dict as built by TiledTriangulation.tasks
+    :return: tuple (vertices, faces) in pixel coordinates of the whole
+    raster
+    """
+    source = task['source']
+    if isinstance(source, str):
+        source = load_npy(source)
+    elif isinstance(source, SharedDEM):
+        source = source.array
+    y0, y1, x0, x1 = task['window']
+    tri = Triangulation(source[y0:y1, x0:x1], minimum_gap=task['minimum_gap'],
+                        keep_history=False)
+    # No vertices on the seams apart from the shared ones
+    for side in task['seams']:
+        if side == 'top':
+            tri.available[0, :] = 0
+        elif side == 'bottom':
+            tri.available[-1, :] = 0
+        elif side == 'left':
+            tri.available[:, 0] = 0
+        elif side == 'right':
+            tri.available[:, -1] = 0
+    tri.rescan()
+    for x, y in task['seam_vertices']:
+        tri.insert_point(Vertex(int(x), int(y)))
+
+    tri.refine(max_vertices=task['max_vertices'], max_error=task['max_error'])
+
+    vertices, faces = tri.mesh_arrays()
+    vertices[:, 0] += x0
+    vertices[:, 1] += y0
+    return vertices, faces
+
+
+class TiledTriangulation:
+    """
+    Triangulate a raster tile by tile in a process pool and stitch the tile
+    meshes into one conforming TIN.
+    """
+    def __init__(self, dem, tile_size=512, max_error=1.0, minimum_gap=0,
+                 max_vertices=None, workers=None):
+        """
+        :param dem: height map as numpy array, sharedmem.SharedDEM, path to
+        a raster file or path to a .npy file. Workers memory-map .npy files
+        and attach to shared DEMs, other arrays are copied into a SharedDEM
+        once for the whole run, so the grid is never pickled.
+        :param tile_size: approximate edge length of the tiles in pixels
+        :param max_error: insertion stops in every tile once no error is
+        greater, seams are simplified to the same tolerance
+        :param minimum_gap: minimum distance in pixels between vertices
+        inside a tile
+        :param max_vertices: optional vertex budget per tile
+        :param workers: number of worker processes, None for one per CPU,
+        1 to run in this process
+        """
+        self.npy_path = None
+        self.shared = None
+        if isinstance(dem, np.ndarray):
+            self.dem = as_kernel_array(dem)
+            self.affine = None
+        elif isinstance(dem, SharedDEM):
+            self.shared = dem
+            self.dem = as_kernel_array(dem.array)
+            self.affine = None
+        elif dem.endswith('.npy'):
+            self.npy_path = dem
+            self.dem = load_npy(dem)
+            self.affine = None
+        else:
+            self.dem, self.affine = read_raster(dem)
+        self.tile_size = tile_size
+        self.max_error = max_error
+        self.minimum_gap = minimum_gap
+        self.max_vertices = max_vertices
+        self.workers = workers
+
+        self.x_bounds = tile_bounds(self.dem.shape[1], tile_size)
+        self.y_bounds = tile_bounds(self.dem.shape[0], tile_size)
+        self.vertices = None
+        self.faces = None
+        self.point_index = None
+
+    def seam_vertices(self):
+        """
+        Simplify every seam segment between two tile corners
+        :return: dicts of the kept positions along the vertical seams, keyed
+        by (tile column boundary, tile row), and along the horizontal seams,
+        keyed by (tile row boundary, tile column)
+        """
+        vertical = {}
+        for i in range(1, len(self.x_bounds) - 1):
+            x = self.x_bounds[i]
+            for j in range(len(self.y_bounds) - 1):
+                y0, y1 = self.y_bounds[j], self.y_bounds[j + 1]
+                vertical[i, j] = y0 + simplify_profile(
+                    self.dem[y0:y1 + 1, x], self.max_error)
+        horizontal = {}
+        for j in range(1, len(self.y_bounds) - 1):
+            y = self.y_bounds[j]
+            for i in range(len(self.x_bounds) - 1):
+                x0, x1 = self.x_bounds[i], self.x_bounds[i + 1]
+                horizontal[j, i] = x0 + simplify_profile(
+                    self.dem[y, x0:x1 + 1], self.max_error)
+        return vertical, horizontal
+
+    def tasks(self, source):
+        """
+        :param source: DEM as seen by the workers, an array, a SharedDEM or
+        the path of a .npy file
+        """
+        vertical, horizontal = self.seam_vertices()
+        columns = len(self.x_bounds) - 1
+        rows = len(self.y_bounds) - 1
+        for j in range(rows):
+            for i in range(columns):
+                x0, x1 = self.x_bounds[i], self.x_bounds[i + 1]
+                y0, y1 = self.y_bounds[j], self.y_bounds[j + 1]
+                seams = []
+                points = []
+                if i > 0:
+                    seams.append('left')
+                    points.extend((x0, y) for y in vertical[i, j][1:-1])
+                if i < columns - 1:
+                    seams.append('right')
+                    points.extend((x1, y) for y in vertical[i + 1, j][1:-1])
+                if j > 0:
+                    seams.append('top')
+                    points.extend((x, y0) for x in horizontal[j, i][1:-1])
+                if j < rows - 1:
+                    seams.append('bottom')
+                    points.extend((x, y1) for x in horizontal[j + 1, i][1:-1])
+                yield {
+                    'source': source,
+                    'window': (y0, y1 + 1, x0, x1 + 1),
+                    'seams': seams,
+                    'seam_vertices': [(x - x0, y - y0) for x, y in points],
+                    'minimum_gap': self.minimum_gap,
+                    'max_error': self.max_error,
+                    'max_vertices': self.max_vertices,
+                }
+
+    def run(self):
+        """
+        Triangulate all tiles and merge them
+        :return: tuple (vertices, faces) as from Triangulation.mesh_arrays
+        """
+        if self.workers == 1:
+            results = [triangulate_tile(task) for task in self.tasks(self.dem)]
+        elif self.npy_path is not None or self.shared is not None:
+            results = self.map(self.npy_path or self.shared)
+        else:
+            with SharedDEM(self.dem) as shared:
+                results = self.map(shared)
+        logging.info("Triangulated %d tiles", len(results))
+        self.vertices, self.faces = self.merge(results)
+        self.point_index = None
+        return self.vertices, self.faces
+
+    def map(self, source):
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(triangulate_tile, self.tasks(source)))
+
+    def merge(self, results):
+        """
+        Concatenate the tile meshes and join the vertices they share
+        """
+        vertices = np.concatenate([v for v, f in results])
+        offsets = np.cumsum([0] + [len(v) for v, f in results[:-1]])
+        faces = np.concatenate([f + offset
+                                for (v, f), offset in zip(results, offsets)])
+
+        keys = vertices[:, 1].astype(np.int64) * self.dem.shape[1] + \
+            vertices[:, 0].astype(np.int64)
+        keys, first, inverse = np.unique(keys, return_index=True,
+                                         return_inverse=True)
+        return vertices[first], inverse.reshape(-1)[faces]
+
+    def sample(self, xs, ys):
+        """
+        Interpolate the merged mesh at pixel coordinates, see
+        Triangulation.sample
+        """
+        if self.vertices is None:
+            self.run()
+        if self.point_index is None:
+            self.point_index = PointIndex(self.vertices, self.faces)
+        return self.point_index.interpolate(xs, ys)
+
+    def export_arrays(self):
+        if self.vertices is None:
+            self.run()
+        return export.georeference(self.vertices, self.faces, self.affine)
+
+    def write_ply(self, filename):
+        export.write_ply(filename, *self.export_arrays())
+
+    def write_stl(self, filename):
+        export.write_stl(filename, *self.export_arrays())
+
+    def write_glb(self, filename):
+        export.write_glb(filename, *self.export_arrays())
+
+    def write_npz(self, filename):
+        affine = self.affine or Affine.identity()
+        export.write_npz(filename, *self.export_arrays(), transform=affine[:6])
@@ -3,36 +3,228 @@
 
 
 import logging
-from math import ceil
+from array import array
+from functools import lru_cache
+from math import ceil, isnan, sqrt
 
 import numpy as np
-import pyximport
-import rasterio
 from affine import Affine
+from rasterio.features import geometry_mask
 
+from . import bootstrap, checkpoint, export
 from .heap import Heap
-from .quadedge import Vertex, splice, connect, swap, make_edge, Triangle
-
-pyximport.install()
-# noinspection PyPep8
-from .calculation import scan_triangle_line
+from .raster import BlockCachedRaster, as_kernel_array, load_npy, \
+    pyramid_levels, raster_nodata, read_raster, write_raster
+from .sharedmem import SharedDEM
+from .arraymesh import ArrayMesh
+from .pointindex import PointIndex
+from .profiling import Profiler
+from .quadedge import Vertex, Triangle, QuadEdgeMesh, float_min
+
+try:
+    from .calculation import scan_triangle_line, scan_triangle_candidate, \
+        rasterize_faces, VOID
+except ImportError:
+    from .pycalculation import scan_triangle_line, scan_triangle_candidate, \
+        rasterize_faces, VOID, warn_fallback
+    warn_fallback()
 
 logging.basicConfig(level=logging.WARN)
 
 
+@lru_cache()
+def disk_stencil(radius):
+    """
+    Disk of circle_points around an integer center
+    :param radius: integer radius
+    :return: tuple (dy, half) of the row offsets and the half widths of the
+    rows. Row dy covers the columns -half ... half + 1 around the center.
+    """
+    dy = np.arange(-radius, radius + 1)
+    half = np.rint(np.sqrt(np.maximum(radius ** 2 - dy ** 2, 0)))
+    half = half.astype(np.intp)
+    dy.flags.writeable = half.flags.writeable = False
+    return dy, half
+
+
+def morton_order(xs, ys):
+    """
+    Order of points along a Z-order curve, so that consecutive points are
+    mostly close to each other
+    :param xs: non-negative x coordinates, truncated to integers
+    :param ys: non-negative y coordinates, same length as xs
+    :return: array of indices
+    """
+    codes = np.zeros(len(xs), dtype=np.uint64)
+    for values, shift in ((xs, 0), (ys, 1)):
+        spread = np.asarray(values).astype(np.uint64) & np.uint64(0xffffffff)
+        for bits, mask in ((16, 0x0000ffff0000ffff), (8, 0x00ff00ff00ff00ff),
+                           (4, 0x0f0f0f0f0f0f0f0f), (2, 0x3333333333333333),
+                           (1, 0x5555555555555555)):
+            spread = (spread | (spread << np.uint64(bits))) & np.uint64(mask)
+        codes |= spread << np.uint64(shift)
+    return np.argsort(codes, kind='stable')
+
+
 class Triangulation:
-    def __init__(self, dem, minimum_gap=5):
+    backends = {'quadedge': QuadEdgeMesh,
+                'array': ArrayMesh}
+    # Cell size in pixels of the coarse grid of starting triangles for the
+    # walking point location
+    walk_cell_size = 32
+    # Block size in pixels of the min/max tables for the lazy error bounds
+    bound_block_size = 16
+    # In lazy mode, triangles with a smaller bounding box are still scanned
+    # right away, bounding them would cost more than scanning them
+    lazy_min_pixels = 4096
+    # Block size in pixels and number of cached blocks for windowed reads
+    window_block_size = 512
+    window_cache_blocks = 64
+    # Rows formatted at once when writing text exports
+    export_chunk_size = 65536
+    # insert_batch(k) ends a round after skipping this many times k
+    # conflicting candidates
+    batch_lookahead = 1
+    # Insertions between two calls of the progress callback of refine
+    progress_interval = 1000
+    # Rows per window when writing error maps
+    error_map_rows = 512
+    # Pyramid mode: number of levels, including full resolution, and the
+    # number of pixels a coarse scan aims for. A triangle is scanned at the
+    # coarsest level that still gives it this many pixels.
+    pyramid_level_count = 5
+    pyramid_samples = 16384
+
+    def __init__(self, dem, minimum_gap=5, backend='quadedge',
+                 keep_history=True, lazy=False, windowed=False,
+                 progressive=False, pyramid=False, nodata=None, mask=None):
+        """
+        :param dem: height map as numpy array, sharedmem.SharedDEM, path to
+        a raster file or path to a .npy file. Arrays and rasters keep their
+        data type if the scan kernel supports it (int16, uint16, int32,
+        int64, float32, float64). Arrays, shared DEMs and .npy files are used
+        without a copy, .npy files are memory-mapped read-only.
+        :param minimum_gap: minimum distance in pixels between vertices
+        :param backend: mesh storage, 'quadedge' for the object based
+        structures in quadedge.py or 'array' for the compact buffers in
+        arraymesh.py
+        :param keep_history: keep the history DAG of all triangles for point
+        location. If False, points are located by walking from the last
+        inserted triangle and deleted triangles are released immediately, so
+        memory scales with the size of the output mesh.
+        :param lazy: defer scanning new triangles. They enter the heap with an
+        upper bound of their error and are only scanned when they reach the
+        top, so triangles that are replaced before that are never scanned.
+        For minimum_gap=0 the result equals the eager mode, apart from the
+        order of equal errors. With a gap, the deferred scan already sees
+        later availability changes.
+        :param windowed: do not read a raster file into memory, fetch blocks
+        of window_block_size pixels on demand and keep the last
+        window_cache_blocks of them. The availability mask, one byte per
+        pixel, is still held in memory as a whole. The raster file stays
+        open until close is called.
+        :param progressive: record every triangle with the vertex counts at
+        which it was created and replaced, so that the mesh of any prefix of
+        the insertion order can be extracted with lod_mesh
+        :param pyramid: scan large triangles only at every 2nd, 4th, ...
+        pixel of decimated copies of the DEM, see scan_level. Their
+        candidates are then only approximately the greatest errors. refine
+        rescans them at full resolution before stopping on max_error or
+        target_rmse, so its result meets the same criteria, see
+        finish_pyramid. Needs the DEM in memory.
+        :param nodata: height of pixels without data. Defaults to the nodata
+        value of a raster file. NaN pixels of float DEMs never have data.
+        :param mask: area with data, either a boolean array of the shape of
+        the DEM or GeoJSON-like polygons in the coordinates of the raster,
+        pixel coordinates for arrays. Pixels without data are never
+        candidates, do not count in the errors and the rmse and are NaN in
+        error_map. Triangles without any pixel with data are not put on the
+        heap. Vertices on such pixels, like the corners, take the height of
+        the closest pixel with data, see valid_height.
+        """
+        self.setup(dem, minimum_gap, backend, lazy, windowed, progressive,
+                   pyramid, nodata, mask)
+        min_x, min_y, max_x, max_y = \
+            self.min_x, self.min_y, self.max_x, self.max_y
+
+        v0 = Vertex(min_x, min_y, self.valid_height(min_x, min_y))
+        v1 = Vertex(max_x, min_y, self.valid_height(max_x, min_y))
+        v2 = Vertex(max_x, max_y, self.valid_height(max_x, max_y))
+        v3 = Vertex(min_x, max_y, self.valid_height(min_x, max_y))
+
+        for v in (v0, v1, v2, v3):
+            self.add_vertex(v)
+
+        # Boundary rectangle
+        mesh = self.mesh
+        q0 = mesh.make_edge(v0, v1)
+        q1 = mesh.make_edge(v2, v3)
+        q2 = mesh.make_edge(v3, v0)
+        q3 = mesh.make_edge(v1, v2)
+        # Diagonal
+        q4 = mesh.make_edge(v1, v3)
+
+        mesh.splice(q0.sym, q4)
+        mesh.splice(q4.sym, q2)
+        mesh.splice(q2.sym, q0)
+        mesh.splice(q0.sym, q3)
+        mesh.splice(q3.sym, q1)
+        mesh.splice(q1.sym, q4.sym)
+
+        self.add_edge(q0)
+        self.add_edge(q1)
+        self.add_edge(q2)
+        self.add_edge(q3)
+
+        self.mark_border([v0, v1, v2, v3])
+        self.add_edge(q4)
+
+        self.base = q0
+
+        initial_triangles = [Triangle(q4), Triangle(q4.sym)]
+        if keep_history:
+            self.history = Triangle(self.base, anchor=False, id_=-1)
+            self.history.children = initial_triangles
+        else:
+            self.history = None
+        self.last_triangle = initial_triangles[0]
+
+        for triangle in initial_triangles:
+            self.live_triangles[triangle] = None
+            self.push_triangle(triangle)
+        self.record_triangles(initial_triangles, [])
+
+    def setup(self, dem, minimum_gap, backend, lazy, windowed, progressive,
+              pyramid=False, nodata=None, mask=None):
+        """
+        Load the DEM and initialize the state of an empty triangulation,
+        see __init__ for the parameters
+        """
         if isinstance(dem, np.ndarray):
-            self.dem = dem
+            self.dem = as_kernel_array(dem)
+            self.affine = None
+        elif isinstance(dem, SharedDEM):
+            self.dem = as_kernel_array(dem.array)
             self.affine = None
+        elif isinstance(dem, str) and dem.endswith('.npy'):
+            self.dem = load_npy(dem)
+            self.affine = None
+        elif isinstance(dem, str) and windowed:
+            self.dem = BlockCachedRaster(dem,
+                                         block_size=self.window_block_size,
+                                         cache_blocks=self.window_cache_blocks)
+            self.affine = self.dem.transform
         elif isinstance(dem, str):
-            with rasterio.Env():
-                with rasterio.open(dem) as src:
-                    rawdata = src.read()
-                    self.affine = src.affine
-                    self.dem = np.array(rawdata.squeeze(), dtype=float)
+            self.dem, self.affine = read_raster(dem)
+        self.windowed = isinstance(self.dem, BlockCachedRaster)
+        if nodata is None and isinstance(dem, str) and \
+                not dem.endswith('.npy'):
+            nodata = raster_nodata(dem)
+        self.nodata = nodata
 
         self.minimum_gap = minimum_gap
+        self.backend = backend
+        self.mesh = self.backends[backend]()
 
         min_x = 0
         min_y = 0
@@ -40,79 +232,135 @@ class Triangulation:
         max_y = self.dem.shape[0] - 1
 
         self.heap = Heap()
-        self.triangle_list = []
+        self.lazy = lazy
+        self.pixels_scanned = 0
+        # Running sums over the scanned live triangles, see rmse
+        self.squared_error = 0.0
+        self.error_pixels = 0
+        # Live triangles, used as an insertion ordered set
+        self.live_triangles = dict()
 
         self.min_x = min_x
         self.min_y = min_y
         self.max_x = max_x
         self.max_y = max_y
 
-        self.available = np.ones_like(self.dem)
+        # 1 where a new vertex may be placed, VOID where there is no data
+        self.available = np.ones(self.dem.shape, dtype=np.uint8)
+        self.voids = self.mark_voids(mask)
+        # Levels of the pyramid mode, with views of the availability at the
+        # same pixels
+        self.pyramid = pyramid
+        if pyramid and self.windowed:
+            self.close()
+            raise ValueError("pyramid mode needs the DEM in memory")
+        self.dem_levels = pyramid_levels(
+            self.dem, self.pyramid_level_count if pyramid else 1)
+        self.available_levels = [self.available[::1 << k, ::1 << k]
+                                 for k in range(len(self.dem_levels))]
+        if lazy:
+            self.block_min, self.block_max = self.block_tables()
 
         self.vertex_dict = dict()
         self.edge_dict = dict()
-
-        v0 = Vertex(min_x, min_y, self.dem[0, 0])
-        v1 = Vertex(max_x, min_y, self.dem[0, -1])
-        v2 = Vertex(max_x, max_y, self.dem[-1, -1])
-        v3 = Vertex(min_x, max_y, self.dem[-1, 0])
-
-        self.vertex_dict[0] = v0
-        self.vertex_dict[1] = v1
-        self.vertex_dict[2] = v2
-        self.vertex_dict[3] = v3
-        self.next_vertex_id = 4
-
+        # Vertices of the mesh before the first greedy insertion
+        self.initial_vertices = 4
+        # Vertical error of every vertex at its insertion, by vertex id
+        self.insertion_errors = array('d')
+        # Triangle records of the progressive mesh: vertex ids and the vertex
+        # counts at creation and replacement, -1 while alive
+        self.progressive = progressive
+        self.record_faces = array('q')
+        self.record_born = array('q')
+        self.record_died = array('q')
+        # PointIndex of the mesh for sample, with the vertex count it was
+        # built at
+        self.point_index = None
+        self.point_index_vertices = 0
+
+        # Levels of the history DAG descended by the last search_history
+        self.search_depth = 0
+        self.profiler = None
+
+        self.next_vertex_id = 0
         self.next_edge_id = 0
-        # Boundary rectangle
-        q0 = make_edge(v0, v1)
-        q1 = make_edge(v2, v3)
-        q2 = make_edge(v3, v0)
-        q3 = make_edge(v1, v2)
-        # Diagonal
-        q4 = make_edge(v1, v3)
-
-        splice(q0.sym, q4)
-        splice(q4.sym, q2)
-        splice(q2.sym, q0)
-        splice(q0.sym, q3)
-        splice(q3.sym, q1)
-        splice(q1.sym, q4.sym)
-
-        self.add_edge(q0)
-        self.add_edge(q1)
-        self.add_edge(q2)
-        self.add_edge(q3)
+        self.walk_columns = max_x // self.walk_cell_size + 1
+        self.walk_anchors = [None] * (self.walk_columns *
+                                      (max_y // self.walk_cell_size + 1))
 
+    def mark_voids(self, mask=None):
+        """
+        Set the availability of the pixels without data to VOID, see
+        __init__. The DEM is read in strips of error_map_rows rows.
+        :return: True if there are any
+        """
+        if mask is not None and not isinstance(mask, np.ndarray):
+            mask = geometry_mask(mask, out_shape=self.dem.shape,
+                                 transform=self.affine or Affine.identity(),
+                                 invert=True)
+        floating = np.dtype(self.dem.dtype).kind == 'f'
+        nodata = self.nodata
+        if nodata is not None and isnan(nodata):
+            nodata = None
+        if not floating and nodata is None and mask is None:
+            return False
+
+        found = False
+        height, width = self.dem.shape
+        for y_off in range(0, height, self.error_map_rows):
+            y_end = min(y_off + self.error_map_rows, height)
+            strip = np.asarray(self.dem[y_off:y_end, 0:width])
+            void = np.isnan(strip) if floating else \
+                np.zeros(strip.shape, dtype=bool)
+            if nodata is not None:
+                void |= strip == nodata
+            if mask is not None:
+                void |= ~np.asarray(mask[y_off:y_end], dtype=bool)
+            if void.any():
+                self.available[y_off:y_end][void] = VOID
+                found = True
+        return found
+
+    def valid_height(self, x, y):
+        """
+        Height of a pixel, for pixels without data the height of the closest
+        pixel with data within the smallest square around it that has any.
+        0.0 if the DEM has no data at all.
+        """
+        if not self.voids or self.available[y, x] != VOID:
+            return float(self.dem[y, x])
+        height, width = self.dem.shape
+        radius = 1
+        while True:
+            y0, y1 = max(y - radius, 0), min(y + radius + 1, height)
+            x0, x1 = max(x - radius, 0), min(x + radius + 1, width)
+            rows, columns = np.nonzero(self.available[y0:y1, x0:x1] != VOID)
+            if len(rows):
+                rows += y0
+                columns += x0
+                i = int(np.argmin((rows - y) ** 2 + (columns - x) ** 2))
+                return float(self.dem[rows[i], columns[i]])
+            if (y0, x0, y1, x1) == (0, 0, height, width):
+                return 0.0
+            radius *= 2
+
+    def mark_border(self, corners):
+        """
+        Mark the availability along the boundary rectangle
+        :param corners: the corner vertices, counterclockwise from min_x,
+        min_y
+        """
+        v0, v1, v2, v3 = corners
+        sides = [(v0, v1), (v2, v3), (v3, v0), (v1, v2)]
         # Mark area around border edges as unavailable
-        for e in self.edges:
-            self.mark_availability(e.origin,
-                                   e.destination,
-                                   radius=self.minimum_gap,
-                                   value=0)
+        for s0, s1 in sides:
+            self.mark_availability(s0, s1, radius=self.minimum_gap, value=0)
         # Mark area on border edges themselves as available
-        for e in self.edges:
-            self.mark_availability(e.origin,
-                                   e.destination,
-                                   radius=0,
-                                   value=1)
+        for s0, s1 in sides:
+            self.mark_availability(s0, s1, radius=0, value=1)
         # Mark area around border vertices as unavailable
-        for v in self.vertices:
-            self.mark_availability(v, radius=minimum_gap, value=0)
-
-        self.add_edge(q4)
-
-        self.base = q0
-
-        self.history = Triangle(self.base, anchor=False, id_=-1)
-        self.history.children = [Triangle(q4),
-                                 Triangle(q4.sym)]
-
-        for triangle in self.history.children:
-            self.triangle_list.append(triangle)
-            self.scan_triangle(triangle)
-            triangle.id = self.heap.insert(triangle.candidate_error,
-                                           (triangle.candidate, triangle))
+        for v in corners:
+            self.mark_availability(v, radius=self.minimum_gap, value=0)
 
     @property
     def vertices(self):
@@ -126,15 +374,63 @@ class Triangulation:
 
     @property
     def triangles(self):
-        return list(filter(lambda x: x.id != -1, self.triangle_list))
+        return list(self.live_triangles)
 
-    # Point location using the history graph. Much faster than the walking
-    # method
     def search(self, v):
+        """
+        Find the triangle containing v
+        :param v: Vertex
+        :return: anchor edge of the triangle containing v, None if v is
+        outside of the triangulation
+        """
+        if self.history is None:
+            return self.walk(v)
+        return self.search_history(v)
+
+    def walk(self, v, t=None):
+        """
+        Point location by a visibility walk over the live triangles. The walk
+        starts from t, or from the triangle last created in the same cell of
+        a coarse grid, or from the last created triangle. Terminates on
+        Delaunay triangulations.
+        """
+        if not (self.min_x <= v.x <= self.max_x and
+                self.min_y <= v.y <= self.max_y):
+            logging.debug("Point {} not in triangulation, no edge fount.".format(v))
+            return None
+
+        if t is None:
+            t = self.walk_anchors[self.walk_cell(v)]
+            if t is None or t.anchor is None:
+                t = self.last_triangle
+            if t.anchor is None:
+                # The last triangle has been deleted since
+                t = next(iter(self.live_triangles))
+
+        e = t.anchor
+        i = 0
+        while i < 3:
+            if v.right_of(e):
+                # Cross the edge into the neighbouring triangle
+                e = e.sym.triangle.anchor
+                i = 0
+            else:
+                e = e.l_next
+                i += 1
+        return e
+
+    def walk_cell(self, v):
+        return int(v.y // self.walk_cell_size) * self.walk_columns + \
+            int(v.x // self.walk_cell_size)
+
+    # Point location using the history graph
+    def search_history(self, v):
         triangle = None
         current_triangle = self.history
+        depth = 0
 
         while len(current_triangle.children) > 0:
+            depth += 1
             for triangle in current_triangle.children:
                 if v.in_triangle(triangle.vertices[0],
                                  triangle.vertices[1],
@@ -145,27 +441,34 @@ class Triangulation:
                 # None of the children contained the point, point is not in
                 # triangulation
                 logging.debug("Point {} not in triangulation, no edge fount.".format(v))
+                self.search_depth = depth
                 return None
+        self.search_depth = depth
         return current_triangle.anchor
 
+    def add_vertex(self, v, error=float('nan')):
+        self.vertex_dict[self.next_vertex_id] = v
+        self.insertion_errors.append(error)
+        v.id = self.next_vertex_id
+        self.next_vertex_id += 1
+
     def add_edge(self, e):
         self.edge_dict[self.next_edge_id] = e
         e.id = e.sym.id = self.next_edge_id
         self.next_edge_id += 1
 
     def delete_edge(self, e):
-        splice(e, e.o_prev)
-        splice(e.sym, e.sym.o_prev)
         del self.edge_dict[e.id]
-        del e
+        self.mesh.delete_edge(e)
 
-    def insert_site(self, v, e=None):
+    def insert_site(self, v, e=None, keep_height=False):
         """
         Insert a new site in the 2D triangulation, maintaining the Delaunay
         criterion
         :param v: Vertex to be inserted into the triangulation
         :param e: Optional: edge of the triangle that contains v, to speed up
         the process
+        :param keep_height: use v.z as given, also if it is 0
         :return:
         """
         deleted_triangles = []
@@ -173,8 +476,8 @@ class Triangulation:
         boundary_edge = None
 
         # Get elevation from map if none was provided in vertex
-        if v.z == 0:
-            v.z = self.dem[v.y, v.x]
+        if v.z == 0 and not keep_height:
+            v.z = self.valid_height(v.x, v.y)
 
         if e is None:
             e = self.search(v)
@@ -184,9 +487,19 @@ class Triangulation:
                     not v.right_of(e.l_prev)), \
                 'Edge %s is not an edge of the ' \
                 'triangle containing edge %s' % (e, v)
+        # The site may lie on any edge of the triangle, not only on e. Fanning
+        # out from a site on another edge would leave a zero-area face behind
+        on_edge = v.on_edge(e)
+        if not on_edge:
+            for f in (e.l_next, e.l_prev):
+                if v.on_edge(f):
+                    e = f
+                    on_edge = True
+                    break
+
         if v == e.origin or v == e.destination:
             return deleted_triangles, created_triangles
-        elif v.on_edge(e):
+        elif on_edge:
             if not e.o_prev.destination.right_of(e):
                 parents = [e.triangle]
                 boundary_edge = e
@@ -198,23 +511,23 @@ class Triangulation:
             parents = [e.triangle]
 
         # Add point to triangulation
-        self.vertex_dict[self.next_vertex_id] = v
-        self.next_vertex_id += 1
+        t = parents[0]
+        self.add_vertex(v, abs(v.z - (t.a * v.x + t.b * v.y + t.c)))
 
         # Create first spoke from origin of base to new site
-        spoke = make_edge(e.origin, v)
+        spoke = self.mesh.make_edge(e.origin, v)
         self.add_edge(spoke)
 
-        splice(spoke, e)
+        self.mesh.splice(spoke, e)
         starting_spoke = spoke
 
         # Create second spoke from destination of base to new site
-        spoke = connect(e, spoke.sym)
+        spoke = self.mesh.connect(e, spoke.sym)
         self.add_edge(spoke)
 
         e = spoke.o_prev
         while e.l_next != starting_spoke:
-            spoke = connect(e, spoke.sym)
+            spoke = self.mesh.connect(e, spoke.sym)
             self.add_edge(spoke)
             e = spoke.o_prev
 
@@ -232,8 +545,9 @@ class Triangulation:
             if current_spoke.o_next.destination.left_of(current_spoke):
                 child = Triangle(current_spoke)
                 created_triangles.append(child)
-                for parent in parents:
-                    parent.children.append(child)
+                if self.history is not None:
+                    for parent in parents:
+                        parent.children.append(child)
 
             if current_spoke == starting_spoke:
                 break
@@ -250,14 +564,15 @@ class Triangulation:
                 # Delaunay criterion is violated, swap an edge to fix it
                 # This deletes two triangles and creates two new ones
                 parents = [e.triangle, e.sym.triangle]
-                swap(e)
+                self.mesh.swap(e)
                 deleted_triangles.extend(parents)
 
                 children = [Triangle(e),
                             Triangle(e.sym)]
                 created_triangles.extend(children)
                 for parent in parents:
-                    parent.children.extend(children)
+                    if self.history is not None:
+                        parent.children.extend(children)
                     parent.anchor = None
 
                 e = e.o_prev
@@ -266,8 +581,11 @@ class Triangulation:
             else:
                 e = e.o_next.l_prev
 
-        created_triangles = list(set(created_triangles) -
-                                 set(deleted_triangles))
+        # Keep the creation order, so the result does not depend on hashing
+        deleted = set(deleted_triangles)
+        created_triangles = [t for t in created_triangles if t not in deleted]
+        self.last_triangle = created_triangles[0]
+        self.walk_anchors[self.walk_cell(v)] = self.last_triangle
 
         self.mark_availability(v, radius=self.minimum_gap, value=0)
         return created_triangles, deleted_triangles
@@ -275,6 +593,30 @@ class Triangulation:
     def scan_triangle(self, t, interpolation_map=None, only_return_points=False):
         v0, v1, v2 = t.vertices
 
+        if interpolation_map is None and not only_return_points:
+            # Candidate search: rasterize the whole triangle in one call
+            if self.windowed:
+                self.scan_triangle_windowed(t)
+            else:
+                level = self.scan_level(t) if self.pyramid else 0
+                step = 1 << level
+                pixels, error, x, y, z, squared_error = \
+                    scan_triangle_candidate(
+                        self.available_levels[level], self.dem_levels[level],
+                        v0.x, v0.y, v1.x, v1.y, v2.x, v2.y,
+                        t.a, t.b, t.c, t.candidate_error, step=step,
+                        voids=self.voids)
+                self.pixels_scanned += pixels
+                # Coarse scans estimate the sums of all pixels
+                t.squared_error = squared_error * step * step
+                t.pixels = pixels * step * step
+                t.step = step
+                if x >= 0:
+                    t.candidate_error = error
+                    t.candidate.pos = (x, y, z)
+            t.scanned = True
+            return
+
         # Sort vertices in ascending order
         if v0.y > v1.y:
             v0, v1 = v1, v0
@@ -329,6 +671,285 @@ class Triangulation:
         if only_return_points:
             return points
 
+    def scan_level(self, t):
+        """
+        Pyramid level at which a triangle is scanned: the coarsest one at
+        which its bounding box still covers pyramid_samples pixels
+        """
+        pixels = self.bounding_box_pixels(t)
+        level = 0
+        while level + 1 < len(self.dem_levels) and \
+                pixels >> (2 * level + 2) >= self.pyramid_samples:
+            level += 1
+        return level
+
+    def finish_pyramid(self):
+        """
+        Leave pyramid mode: rescan the triangles that were scanned at a
+        coarse level at full resolution and release the levels. Afterwards
+        every candidate is again the pixel with the greatest error.
+        :return: number of triangles rescanned
+        """
+        if not self.pyramid:
+            return 0
+        self.pyramid = False
+        self.dem_levels = self.dem_levels[:1]
+        self.available_levels = self.available_levels[:1]
+        coarse = [t for t in self.live_triangles if t.step > 1]
+        self.rescan(coarse)
+        return len(coarse)
+
+    def scan_triangle_windowed(self, t):
+        """
+        Candidate search on a BlockCachedRaster. The bounding box of the
+        triangle is fetched in bands of one block row, each band is
+        scanned with the best error so far as threshold, which gives the same
+        candidate as a single scan.
+        """
+        v0, v1, v2 = t.vertices
+        x_start = int(min(v0.x, v1.x, v2.x))
+        x_stop = int(max(v0.x, v1.x, v2.x)) + 1
+        y_start = int(min(v0.y, v1.y, v2.y))
+        y_stop = int(max(v0.y, v1.y, v2.y)) + 1
+        size = self.dem.block_size
+        y_off = y_start
+        t.squared_error = 0.0
+        t.pixels = 0
+        while y_off < y_stop:
+            y_end = min((y_off // size + 1) * size, y_stop)
+            window = (slice(y_off, y_end), slice(x_start, x_stop))
+            pixels, error, x, y, z, squared_error = scan_triangle_candidate(
+                self.available[window], self.dem[window],
+                v0.x, v0.y, v1.x, v1.y, v2.x, v2.y,
+                t.a, t.b, t.c, t.candidate_error, x_start, y_off,
+                voids=self.voids)
+            self.pixels_scanned += pixels
+            t.squared_error += squared_error
+            t.pixels += pixels
+            if x >= 0:
+                t.candidate_error = error
+                t.candidate.pos = (x, y, z)
+            y_off = y_end
+
+    def block_tables(self):
+        """
+        Minimum and maximum height of every bound_block_size square block of
+        the DEM, computed one row of blocks at a time. Pixels without data
+        are left out, blocks without any have an empty range.
+        """
+        size = self.bound_block_size
+        rows = -(-self.dem.shape[0] // size)
+        columns = -(-self.dem.shape[1] // size)
+        block_min = np.empty((rows, columns))
+        block_max = np.empty((rows, columns))
+        for row in range(rows):
+            strip = np.asarray(self.dem[row * size:(row + 1) * size, :],
+                               dtype=float)
+            if self.voids:
+                strip[self.available[row * size:(row + 1) * size] == VOID] = \
+                    np.nan
+            pad = columns * size - strip.shape[1]
+            strip = np.pad(strip, ((0, 0), (0, pad)), mode='edge')
+            strip = strip.reshape(strip.shape[0], columns, size)
+            block_min[row] = np.fmin.reduce(strip, axis=(0, 2))
+            block_max[row] = np.fmax.reduce(strip, axis=(0, 2))
+        block_min[np.isnan(block_min)] = np.inf
+        block_max[np.isnan(block_max)] = -np.inf
+        return block_min, block_max
+
+    def error_bound(self, t):
+        """
+        Cheap upper bound of the error of a triangle. For every block touching
+        the bounding box of the triangle the plane is bounded by its values at
+        the clipped block corners and by the range of the vertex heights, the
+        DEM by the block minimum and maximum.
+        """
+        size = self.bound_block_size
+        v0, v1, v2 = t.vertices
+        x_min = min(v0.x, v1.x, v2.x)
+        x_max = max(v0.x, v1.x, v2.x)
+        y_min = min(v0.y, v1.y, v2.y)
+        y_max = max(v0.y, v1.y, v2.y)
+        z_min = min(v0.z, v1.z, v2.z)
+        z_max = max(v0.z, v1.z, v2.z)
+
+        columns = np.arange(int(x_min) // size, int(x_max) // size + 1)
+        rows = np.arange(int(y_min) // size, int(y_max) // size + 1)
+        x_lo = np.maximum(columns * size, x_min) * t.a
+        x_hi = np.minimum(columns * size + size - 1, x_max) * t.a
+        y_lo = np.maximum(rows * size, y_min) * t.b
+        y_hi = np.minimum(rows * size + size - 1, y_max) * t.b
+        plane_min = (np.minimum(y_lo, y_hi)[:, None] +
+                     np.minimum(x_lo, x_hi)[None, :] + t.c).clip(z_min, z_max)
+        plane_max = (np.maximum(y_lo, y_hi)[:, None] +
+                     np.maximum(x_lo, x_hi)[None, :] + t.c).clip(z_min, z_max)
+
+        window = (slice(rows[0], rows[-1] + 1),
+                  slice(columns[0], columns[-1] + 1))
+        bound = max((self.block_max[window] - plane_min).max(),
+                    (plane_max - self.block_min[window]).max(), 0.0)
+        # Leave room for rounding in the plane equation
+        return bound + 1e-9 * (abs(bound) + 1.0)
+
+    @staticmethod
+    def bounding_box_pixels(t):
+        v0, v1, v2 = t.vertices
+        return (max(v0.x, v1.x, v2.x) - min(v0.x, v1.x, v2.x) + 1) * \
+               (max(v0.y, v1.y, v2.y) - min(v0.y, v1.y, v2.y) + 1)
+
+    def track_error(self, t, sign=1):
+        """
+        Add the squared error and pixels of a scanned triangle to the running
+        sums, or remove them with sign=-1
+        """
+        if t.scanned:
+            self.squared_error += sign * t.squared_error
+            self.error_pixels += sign * t.pixels
+
+    def rmse(self):
+        """
+        Root mean square error of the mesh, from the running sums over the
+        live triangles, so it costs no pass over the raster. Pixels on an
+        edge are counted once for each triangle rasterizing them, which
+        slightly overweights them. In pyramid mode the sums of coarsely
+        scanned triangles are estimated from their pixels.
+        """
+        if self.lazy:
+            raise ValueError("the RMSE is not tracked in lazy mode, "
+                             "unscanned triangles are missing")
+        if not self.error_pixels:
+            return 0.0
+        return sqrt(max(self.squared_error, 0.0) / self.error_pixels)
+
+    def push_triangle(self, t):
+        """
+        Put a new triangle on the heap, scanned or in lazy mode with its error
+        bound
+        """
+        key = self.heap_key(t)
+        if self.is_void(t):
+            t.id = -1
+            return
+        t.id = self.heap.insert(key, (t.candidate, t))
+
+    def is_void(self, t):
+        """
+        Whether a triangle has been scanned at full resolution and covers no
+        pixel with data. Such triangles are kept off the heap.
+        """
+        return self.voids and t.scanned and t.pixels == 0 and t.step == 1
+
+    def drop_void(self, t):
+        """
+        Take a triangle off the heap if its deferred scan, in lazy or pyramid
+        mode, found it void, like push_triangle does for new triangles
+        :return: whether it was removed
+        """
+        if t.id == -1 or not self.is_void(t):
+            return False
+        self.heap.delete(t.id)
+        t.id = -1
+        return True
+
+    def heap_key(self, t):
+        """
+        Scan a new triangle, or in lazy mode bound its error if it is large
+        :return: its key in the heap
+        """
+        if self.lazy and self.bounding_box_pixels(t) >= self.lazy_min_pixels:
+            return self.error_bound(t)
+        self.scan_triangle(t)
+        self.track_error(t)
+        return t.candidate_error
+
+    def top_candidate(self):
+        """
+        The triangle with the greatest error. Triangles on top of the heap
+        that have not been scanned yet are scanned and their key is lowered
+        to the actual error first, void ones are removed.
+        :return: error, (candidate, triangle), the error is float_min and
+        the triangle off the heap if only void triangles were left
+        """
+        while True:
+            error, (candidate, triangle) = self.heap.max()
+            if triangle.scanned:
+                return error, (candidate, triangle)
+            self.scan_triangle(triangle)
+            self.track_error(triangle)
+            if not self.drop_void(triangle):
+                self.heap.change_key(triangle.id, triangle.candidate_error)
+            elif not len(self.heap):
+                return float_min, (triangle.candidate, triangle)
+
+    def pop_candidate(self):
+        """
+        Remove the triangle with the greatest error from the heap, see
+        top_candidate
+        :return: error, (candidate, triangle)
+        """
+        error, (candidate, triangle) = self.top_candidate()
+        if triangle.id == -1:
+            raise IndexError("no candidate left")
+        self.heap.del_max()
+        triangle.id = -1  # Mark it as removed from the heap
+        return error, (candidate, triangle)
+
+    def rescan(self, triangles=None):
+        """
+        Search the candidates of triangles again, e.g. after available was
+        changed directly, and update their keys in the heap
+        :param triangles: triangles to scan, all live triangles if None
+        """
+        for t in self.triangles if triangles is None else triangles:
+            self.track_error(t, -1)
+            t.candidate_error = float_min
+            t.candidate.pos = (-1, -1, 0)
+            self.scan_triangle(t)
+            self.track_error(t)
+            if t.id != -1 and not self.drop_void(t):
+                self.heap.change_key(t.id, t.candidate_error)
+
+    def update_triangles(self, new, deleted):
+        """
+        Replace the deleted triangles by the new ones in the live set and the
+        heap
+        """
+        self.replace_triangles(new, deleted)
+        for triangle in new:
+            self.push_triangle(triangle)
+
+    def replace_triangles(self, new, deleted):
+        """
+        Replace the deleted triangles by the new ones in the live set and
+        remove the deleted ones from the heap. The new triangles are not
+        scanned and not put on the heap.
+        """
+        for triangle in deleted:
+            self.live_triangles.pop(triangle, None)
+            self.track_error(triangle, -1)
+            if not triangle.id == -1:
+                self.heap.delete(triangle.id)
+                triangle.id = -1
+        self.live_triangles.update(dict.fromkeys(new))
+        self.record_triangles(new, deleted)
+
+    def record_triangles(self, new, deleted):
+        """
+        Close the records of the deleted triangles and open records for the
+        new ones at the current vertex count, if progressive
+        """
+        if not self.progressive:
+            return
+        count = len(self.vertex_dict)
+        for t in deleted:
+            if t.record >= 0:
+                self.record_died[t.record] = count
+        for t in new:
+            t.record = len(self.record_born)
+            self.record_born.append(count)
+            self.record_died.append(-1)
+            self.record_faces.extend(v.id for v in t.vertices)
+
     def circle_points(self, center, radius):
         circle_points = []
         y_start = (max(round(center.y - radius), self.min_y))
@@ -366,7 +987,76 @@ class Triangulation:
             segment_points.append((x, y))
         return segment_points
 
+    @staticmethod
+    def segment_samples(s0, s1):
+        """
+        Same points as segment_points, as two integer arrays
+        """
+        a = s1 - s0
+        d = ceil(a.norm)
+        t = np.arange(d) * (1 / d) if d else np.empty(0)
+        xs = np.rint(s0.x + a.x * t).astype(np.intp)
+        ys = np.rint(s0.y + a.y * t).astype(np.intp)
+        return xs, ys
+
+    def stamp(self, xs, ys, radius, value):
+        """
+        Set the disks of circle_points around the integer centers xs, ys to
+        value. The rows of all disks are merged into disjoint runs of the
+        flattened mask first, so every pixel is written once.
+        """
+        dy, half = disk_stencil(radius)
+        width = self.max_x + 1
+        rows = (ys[:, np.newaxis] + dy).ravel()
+        starts = np.maximum(xs[:, np.newaxis] - half, self.min_x).ravel()
+        stops = np.minimum(xs[:, np.newaxis] + half + 2, width).ravel()
+        keep = (rows >= self.min_y) & (rows <= self.max_y) & (stops > starts)
+        starts = rows[keep] * width + starts[keep]
+        stops = rows[keep] * width + stops[keep]
+        if not len(starts):
+            return
+
+        order = np.argsort(starts, kind='stable')
+        starts = starts[order]
+        stops = np.maximum.accumulate(stops[order])
+        first = np.flatnonzero(np.r_[True, starts[1:] > stops[:-1]])
+        last = np.r_[first[1:] - 1, len(starts) - 1]
+        starts = starts[first]
+        lengths = stops[last] - starts
+
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        indices = offsets + np.arange(lengths.sum())
+        flat = self.available.reshape(-1)
+        if self.voids:
+            indices = indices[flat[indices] != VOID]
+        flat[indices] = value
+
+    def stamp_disk(self, x, y, radius, value):
+        """
+        Single disk of stamp, one slice assignment per row
+        """
+        dy, half = disk_stencil(radius)
+        y_start = max(y - radius, self.min_y)
+        y_stop = min(y + radius + 1, self.max_y + 1)
+        for row, h in zip(range(y_start, y_stop),
+                          half[y_start - y + radius:].tolist()):
+            pixels = self.available[row, max(x - h, self.min_x):max(x + h + 2, 0)]
+            if self.voids:
+                pixels[pixels != VOID] = value
+            else:
+                pixels[:] = value
+
     def mark_availability(self, v0, v1=None, radius=0, value=0):
+        if radius == int(radius):
+            if v1 is not None:
+                xs, ys = self.segment_samples(v0, v1)
+                self.stamp(xs, ys, int(radius), value)
+                return
+            if v0.x == int(v0.x) and v0.y == int(v0.y):
+                self.stamp_disk(int(v0.x), int(v0.y), int(radius), value)
+                return
+
+        # Non-integer disks, pixel by pixel
         if v1 is not None:
             segment_points = self.segment_points(v0, v1)
         else:
@@ -375,32 +1065,91 @@ class Triangulation:
         for s in segment_points:
             cp = self.circle_points(Vertex(s[0], s[1]), radius)
             for p in cp:
-                self.available[p[1], p[0]] = value
+                if self.available[p[1], p[0]] != VOID:
+                    self.available[p[1], p[0]] = value
 
-    def insert_point(self, v, e=None):
+    def insert_point(self, v, e=None, keep_height=False):
         """
         Insert a new vertex into the triangulation and scan the newly created
         triangles for the error
         :param v: Vertex to be inserted
         :param e: Optional edge for starting the triangle search
+        :param keep_height: use v.z as given, also if it is 0
         :return:
         """
-        new, deleted = self.insert_site(v, e)
-
-        for triangle in deleted:
-            if not triangle.id == -1:
-                self.heap.delete(triangle.id)
-                triangle.id = -1
-
-        for triangle in new:
-            triangle.id = -2
+        new, deleted = self.insert_site(v, e, keep_height)
+        self.update_triangles(new, deleted)
 
-        for triangle in new:
-            self.scan_triangle(triangle)
-            triangle.id = self.heap.insert(triangle.candidate_error,
-                                           (triangle.candidate, triangle))
-        self.mark_availability(v, radius=self.minimum_gap, value=0)
-        self.triangle_list.extend(new)
+    def insert_points(self, xs, ys, zs=None):
+        """
+        Insert many given vertices, e.g. surveyed points or densified
+        breaklines. The points are inserted in Z-order, every point is
+        located by walking from the triangle created by the previous one,
+        and only the triangles left at the end are scanned and put on the
+        heap. The resulting mesh is the same as with insert_point for every
+        point, apart from the choice of diagonals between cocircular
+        vertices.
+        :param xs: x pixel coordinates
+        :param ys: y pixel coordinates
+        :param zs: heights, taken from the DEM if None
+        :return: number of vertices added, points on existing vertices are
+        skipped
+        """
+        xs, ys, zs = self.pixel_points(xs, ys, zs)
+        keep_height = zs is not None
+        if zs is None:
+            zs = [0] * len(xs)
+
+        count = len(self.vertex_dict)
+        created = []
+        destroyed = set()
+        try:
+            for i in morton_order(xs, ys).tolist():
+                v = Vertex(xs[i], ys[i], zs[i])
+                hint = self.last_triangle
+                e = self.walk(v, hint if hint.anchor is not None else None)
+                new, deleted = self.insert_site(v, e, keep_height)
+                self.replace_triangles(new, deleted)
+                destroyed.update(deleted)
+                created.extend(new)
+        finally:
+            # Also after a failure, no live triangle may be missing on the
+            # heap
+            for t in created:
+                if t not in destroyed:
+                    self.push_triangle(t)
+        return len(self.vertex_dict) - count
+
+    def pixel_points(self, xs, ys, zs=None):
+        """
+        Check points given by pixel coordinates, before any of them is
+        inserted
+        :param xs: x pixel coordinates, whole numbers of any type
+        :param ys: y pixel coordinates, same length as xs
+        :param zs: heights, same length as xs, or None
+        :return: tuple (xs, ys, zs) of lists, the coordinates as Python
+        ints for the exact predicates, zs None if not given
+        """
+        xs = np.asarray(xs, dtype=float).ravel()
+        ys = np.asarray(ys, dtype=float).ravel()
+        if len(xs) != len(ys) or (zs is not None and len(zs) != len(xs)):
+            raise ValueError("xs, ys and zs have to have the same length")
+        fractional = ~np.isfinite(xs) | ~np.isfinite(ys) | \
+            (xs != np.round(xs)) | (ys != np.round(ys))
+        if fractional.any():
+            i = int(np.flatnonzero(fractional)[0])
+            raise ValueError("point ({}, {}) is not on a pixel".format(
+                xs[i], ys[i]))
+        outside = (xs < self.min_x) | (xs > self.max_x) | \
+                  (ys < self.min_y) | (ys > self.max_y)
+        if outside.any():
+            i = int(np.flatnonzero(outside)[0])
+            raise IndexError("point ({}, {}) is outside of the DEM".format(
+                xs[i], ys[i]))
+        if zs is not None:
+            zs = np.asarray(zs, dtype=float).ravel().tolist()
+        return (xs.astype(np.int64).tolist(), ys.astype(np.int64).tolist(),
+                zs)
 
     def insert_next(self):
         """
@@ -408,22 +1157,261 @@ class Triangulation:
         triangulation
         :return:
         """
-        error, (candidate, triangle) = self.heap.pop()
-        triangle.id = -1  # Mark it as removed from the heap
+        error, (candidate, triangle) = self.pop_candidate()
 
         new, deleted = self.insert_site(candidate)
+        self.update_triangles(new, deleted)
+        return error, len(self.vertex_dict)
 
-        for triangle in deleted:
-            if not triangle.id == -1:
-                self.heap.delete(triangle.id)
-                triangle.id = -1
+    def insert_batch(self, k):
+        """
+        Insert up to k candidates with the greatest errors in one round. The
+        round takes candidates from the top of the heap as long as their
+        cavities, the triangles whose circumcircles contain them, are
+        disjoint from the cavities of the candidates already taken and from
+        the triangles next to those. Such insertions do not affect each
+        other: each replaces exactly its cavity, in any order. The new
+        triangles are scanned once at the end of the round.
+
+        Conflicting candidates are skipped and go back to the heap, the round
+        ends after batch_lookahead * k of them. For minimum_gap=0 the mesh
+        equals inserting the same vertices one by one. The order differs
+        from greedy insertion in two ways: the candidates of triangles
+        created during the round wait for the next round, even if their
+        errors are greater, and a skipped candidate waits for the next round
+        while smaller ones of the round are inserted. The inserted errors
+        are therefore not monotone within a round. For k=1 the result equals
+        insert_next.
+        :param k: maximum number of vertices to insert
+        :return: tuple (errors, vertex count) with the errors of the inserted
+        candidates in insertion order
+        """
+        selected = []
+        skipped = []
+        claimed = set()
+        while len(selected) < k and len(skipped) < self.batch_lookahead * k \
+                and len(self.heap):
+            error, (candidate, triangle) = self.top_candidate()
+            if error <= float_min:
+                break
+            self.pop_candidate()
+            cavity, neighbours = self.cavity(candidate, triangle)
+            if claimed.isdisjoint(cavity):
+                selected.append((error, candidate, triangle))
+                claimed.update(cavity)
+                claimed.update(neighbours)
+            else:
+                skipped.append((error, candidate, triangle))
+
+        errors = []
+        created = []
+        for error, candidate, triangle in selected:
+            e = self.walk(candidate, triangle) if self.history is None \
+                else None
+            new, deleted = self.insert_site(candidate, e)
+            errors.append(error)
+            self.replace_triangles(new, deleted)
+            created.extend(new)
+
+        # Skipped candidates go back, unless their triangle was replaced
+        for error, candidate, triangle in skipped:
+            if triangle in self.live_triangles:
+                triangle.id = self.heap.insert(error, (candidate, triangle))
+        for t in created:
+            self.push_triangle(t)
+        return errors, len(self.vertex_dict)
+
+    def cavity(self, v, t):
+        """
+        Triangles replaced by inserting v into the triangle t containing it
+        :return: tuple (cavity, neighbours) of the set of triangles whose
+        circumcircles contain v and the set of the other triangles sharing an
+        edge with them
+        """
+        cavity = {t}
+        neighbours = set()
+        stack = [t]
+        while stack:
+            e = stack.pop().anchor
+            for f in (e, e.l_next, e.l_prev):
+                if self.on_border(f):
+                    continue
+                n = f.sym.triangle
+                if n in cavity or n in neighbours:
+                    continue
+                if v.in_circle(*n.vertices):
+                    cavity.add(n)
+                    stack.append(n)
+                else:
+                    neighbours.add(n)
+        return cavity, neighbours
+
+    def on_border(self, e):
+        """
+        Whether edge e lies on the boundary rectangle
+        """
+        v0, v1 = e.origin, e.destination
+        return (v0.x == v1.x and v0.x in (self.min_x, self.max_x)) or \
+            (v0.y == v1.y and v0.y in (self.min_y, self.max_y))
 
-        for triangle in new:
-            self.scan_triangle(triangle)
-            triangle.id = self.heap.insert(triangle.candidate_error,
-                                           (triangle.candidate, triangle))
-        self.triangle_list.extend(new)
-        return error, len(self.vertex_dict)
+    def refine(self, max_vertices=None, max_error=None, target_rmse=None,
+               progress=None, checkpoint_every=None, checkpoint_path=None):
+        """
+        Insert candidates in greedy order until a stop criterion is met or
+        no candidate is left. Without any criterion the mesh is refined
+        until every available pixel is interpolated exactly.
+        :param max_vertices: stop once the mesh has this many vertices
+        :param max_error: stop once no candidate has a greater error
+        :param target_rmse: stop once rmse() is not greater, not supported in
+        lazy mode
+        :param progress: optional callable progress(vertices, error, rmse),
+        called every progress_interval insertions and on return. rmse is
+        None in lazy mode.
+        :param checkpoint_every: write a checkpoint to checkpoint_path after
+        every checkpoint_every insertions, see save_checkpoint
+        :return: tuple (error, vertex count) with the error of the next
+        candidate, 0.0 if no candidate is left. In pyramid mode the mode is
+        finished before stopping on any criterion but max_vertices, see
+        finish_pyramid. Stopped at max_vertices, the error may be an
+        estimate.
+        """
+        if target_rmse is not None and self.lazy:
+            raise ValueError("target_rmse is not supported in lazy mode")
+        if (checkpoint_every is None) != (checkpoint_path is None):
+            raise ValueError("checkpoint_every and checkpoint_path have to be "
+                             "given together")
+        heap = self.heap
+        vertex_dict = self.vertex_dict
+        interval = self.progress_interval
+        inserted = 0
+        error = 0.0
+        while len(heap):
+            error, (candidate, triangle) = self.top_candidate()
+            done = error <= float_min or \
+                (max_error is not None and error <= max_error) or \
+                (target_rmse is not None and self.rmse() <= target_rmse)
+            if done and self.finish_pyramid():
+                # The coarse errors were estimates, decide again
+                continue
+            if error <= float_min:
+                error = 0.0
+                break
+            if max_error is not None and error <= max_error:
+                break
+            if max_vertices is not None and len(vertex_dict) >= max_vertices:
+                break
+            if target_rmse is not None and self.rmse() <= target_rmse:
+                break
+
+            self.pop_candidate()
+            e = self.walk(candidate, triangle) if self.history is None \
+                else None
+            new, deleted = self.insert_site(candidate, e)
+            self.update_triangles(new, deleted)
+
+            inserted += 1
+            if progress is not None and inserted % interval == 0:
+                progress(len(vertex_dict), error,
+                         None if self.lazy else self.rmse())
+            if checkpoint_every and inserted % checkpoint_every == 0:
+                self.save_checkpoint(checkpoint_path)
+        else:
+            error = 0.0
+
+        if progress is not None:
+            progress(len(vertex_dict), error,
+                     None if self.lazy else self.rmse())
+        return error, len(vertex_dict)
+
+    def enable_profiling(self, log_every=None):
+        """
+        Time the phases of the insertion and count the mesh work from now on,
+        see profiling.Profiler. Without profiling the methods run
+        uninstrumented.
+        :param log_every: log a line of statistics after every log_every
+        insertions
+        :return: the Profiler
+        """
+        self.disable_profiling()
+        self.profiler = Profiler(log_every)
+        self.profiler.attach(self)
+        return self.profiler
+
+    def disable_profiling(self):
+        if self.profiler is not None:
+            self.profiler.detach(self)
+            self.profiler = None
+
+    def stats(self):
+        """
+        Snapshot of the statistics of the profiler, see Profiler.snapshot
+        :return: dict, None if profiling is not enabled
+        """
+        if self.profiler is None:
+            return None
+        return self.profiler.snapshot()
+
+    def save_checkpoint(self, filename):
+        """
+        Save the state of the triangulation, apart from the DEM and the
+        history DAG, see checkpoint.save
+        """
+        checkpoint.save(self, filename)
+
+    @classmethod
+    def from_points(cls, dem, xs, ys, zs=None, minimum_gap=5,
+                    backend='quadedge', lazy=False, windowed=False,
+                    progressive=False, pyramid=False, nodata=None, mask=None):
+        """
+        Start from the Delaunay triangulation of the given points and the
+        corners of the DEM instead of the two triangles of the boundary
+        rectangle. The mesh is built in bulk by divide and conquer and the
+        heap with one heapify. Points are located by walking, there is no
+        history DAG.
+        :param xs: x pixel coordinates
+        :param ys: y pixel coordinates
+        :param zs: heights, taken from the DEM if None
+        :return: Triangulation, the other parameters are those of __init__.
+        Levels of detail start at the initial vertex count.
+        """
+        return bootstrap.build(cls, dem, xs, ys, zs, minimum_gap=minimum_gap,
+                               backend=backend, lazy=lazy, windowed=windowed,
+                               progressive=progressive, pyramid=pyramid,
+                               nodata=nodata, mask=mask)
+
+    @classmethod
+    def from_lattice(cls, dem, spacing, **kwargs):
+        """
+        Start from a regular lattice of vertices spacing pixels apart, see
+        from_points for the other parameters
+        """
+        return bootstrap.build(cls, dem, spacing=spacing, **kwargs)
+
+    @classmethod
+    def load_checkpoint(cls, filename, dem, windowed=False):
+        """
+        Continue a triangulation saved with save_checkpoint. Without
+        keep_history the insertions continue exactly as they would have
+        without the interruption. A restored triangulation locates points by
+        walking, so with keep_history candidates on edges may be inserted
+        from the other side, which can change the order of equal errors.
+        :param dem: the DEM of the saved triangulation
+        """
+        return checkpoint.load(cls, filename, dem, windowed=windowed)
+
+    def close(self):
+        """
+        Close the raster file of a windowed triangulation. The DEM cannot be
+        read afterwards.
+        """
+        if self.windowed:
+            self.dem.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
     def interpolated_map(self):
         """
@@ -431,9 +1419,9 @@ class Triangulation:
         mesh
         :return:
         """
-        interpolated_map = self.dem.copy()
-        for triangle in self.triangles:
-            self.scan_triangle(triangle, interpolated_map)
+        vertices, faces = self.mesh_arrays()
+        interpolated_map = np.array(self.dem, dtype=float)
+        rasterize_faces(interpolated_map, vertices, faces.astype(np.intp))
         return interpolated_map
 
     def error_map(self):
@@ -442,23 +1430,201 @@ class Triangulation:
         height map
         :return:
         """
-        error_map = self.dem.copy() - self.interpolated_map()
+        error_map = np.asarray(self.dem, dtype=float) - self.interpolated_map()
+        if self.voids:
+            error_map[self.available == VOID] = np.nan
         return error_map
 
+    def error_map_windows(self, rows=None):
+        """
+        error_map in windows of full rows, only the faces overlapping a
+        window are rasterized for it
+        :param rows: rows per window, error_map_rows if None
+        :return: generator of (row, error map of the window) pairs
+        """
+        rows = rows or self.error_map_rows
+        vertices, faces = self.mesh_arrays()
+        faces = faces.astype(np.intp)
+        face_rows = vertices[:, 1][faces]
+        y_min = face_rows.min(axis=1)
+        y_max = face_rows.max(axis=1)
+        del face_rows
+        height, width = self.dem.shape
+        for y_off in range(0, height, rows):
+            y_end = min(y_off + rows, height)
+            dem = np.asarray(self.dem[y_off:y_end, 0:width], dtype=float)
+            window = dem.copy()
+            overlap = (y_max >= y_off) & (y_min < y_end)
+            rasterize_faces(window, vertices, faces[overlap], 0, y_off)
+            dem -= window
+            if self.voids:
+                dem[self.available[y_off:y_end] == VOID] = np.nan
+            yield y_off, dem
+
+    def write_error_map(self, filename, dtype='float32', crs=None):
+        """
+        Write error_map to a tiled GeoTIFF window by window, so neither the
+        height map nor the error map is held in memory as a whole
+        """
+        write_raster(filename, self.error_map_windows(), self.dem.shape,
+                     dtype, transform=self.affine or Affine.identity(),
+                     crs=crs)
+
+    def mesh_arrays(self):
+        """
+        Vertices and faces of the current mesh as arrays. Row i of vertices
+        is the vertex with id i.
+        :return: tuple (vertices, faces) of a (n, 3) float array of pixel
+        coordinates and heights and a (m, 3) int array of vertex ids per
+        triangle, counter-clockwise in pixel coordinates
+        """
+        vertices = np.array([v.pos for v in self.vertex_dict.values()],
+                            dtype=float).reshape(-1, 3)
+        triangles = self.live_triangles
+        faces = np.fromiter((v.id for t in triangles for v in t.vertices),
+                            dtype=np.int64, count=3 * len(triangles))
+        return vertices, faces.reshape(-1, 3)
+
+    def progressive_arrays(self):
+        """
+        Insertion history of a progressive Triangulation
+        :return: tuple (vertices, faces, born, died, errors). vertices as
+        from mesh_arrays, in insertion order. faces holds the vertex ids of
+        every triangle that was ever part of the mesh, born and died the
+        vertex counts at which it was created and replaced, -1 for
+        triangles of the current mesh. errors holds the vertical error of
+        every vertex at its insertion, NaN for the four corners.
+        """
+        if not self.progressive:
+            raise ValueError("the triangle history is only recorded with "
+                             "progressive=True")
+        vertices = np.array([v.pos for v in self.vertex_dict.values()],
+                            dtype=float).reshape(-1, 3)
+        return (vertices, np.array(self.record_faces).reshape(-1, 3),
+                np.array(self.record_born), np.array(self.record_died),
+                np.array(self.insertion_errors))
+
+    def lod_mesh(self, n):
+        """
+        Mesh of the first n vertices of the insertion order, as it was right
+        after the n-th insertion
+        :param n: vertex count, from initial_vertices up to the current count
+        :return: tuple (vertices, faces) as from mesh_arrays
+        """
+        if not self.initial_vertices <= n <= len(self.vertex_dict):
+            raise ValueError("level {} outside of {} ... {}".format(
+                n, self.initial_vertices, len(self.vertex_dict)))
+        vertices, faces, born, died, errors = self.progressive_arrays()
+        return vertices[:n], export.lod_faces(faces, born, died, n)
+
+    def lod_vertex_count(self, max_error):
+        """
+        Smallest level at which no vertex inserted later had an error
+        greater than max_error. With greedy insertion this is the coarsest
+        mesh of the run whose maximum error does not exceed max_error.
+        """
+        first = self.initial_vertices
+        errors = np.array(self.insertion_errors)[first:]
+        later = np.maximum.accumulate(errors[::-1])[::-1]
+        above = np.flatnonzero(later > max_error)
+        return first + (int(above[-1]) + 1 if len(above) else 0)
+
+    def sample(self, xs, ys, world=False):
+        """
+        Interpolate the mesh at many points at once. The points are located
+        with a PointIndex of the current mesh, which is rebuilt after the
+        mesh has changed.
+        :param xs: x coordinates, array of any shape
+        :param ys: y coordinates, same shape as xs
+        :param world: the coordinates are in the coordinate system of the
+        affine transformation instead of pixels
+        :return: tuple (z, ids) of arrays of the same shape, with the heights
+        and the indices of the faces of mesh_arrays containing the points.
+        Outside of the mesh z is NaN and the index -1.
+        """
+        if world:
+            inverse = ~(self.affine or Affine.identity())
+            xs = np.asarray(xs, dtype=float)
+            ys = np.asarray(ys, dtype=float)
+            xs, ys = (inverse.a * xs + inverse.b * ys + inverse.c,
+                      inverse.d * xs + inverse.e * ys + inverse.f)
+        if self.point_index is None or \
+                self.point_index_vertices != len(self.vertex_dict):
+            self.point_index = PointIndex(*self.mesh_arrays())
+            self.point_index_vertices = len(self.vertex_dict)
+        return self.point_index.interpolate(xs, ys)
+
+    def world_coordinates(self, vertices):
+        """
+        Apply the affine transformation of the DEM to pixel coordinates
+        :param vertices: (n, 3) array as returned by mesh_arrays
+        :return: new (n, 3) array with transformed x and y
+        """
+        return export.georeference(vertices, np.empty((0, 3), int),
+                                   self.affine)[0]
+
+    def export_arrays(self):
+        """
+        Georeferenced vertices and faces for the binary writers. The faces
+        are counter-clockwise in world coordinates.
+        :return: tuple (vertices, faces) of a (n, 3) float array and a (m, 3)
+        int array
+        """
+        return export.georeference(*self.mesh_arrays(), self.affine)
+
+    def write_ply(self, filename):
+        export.write_ply(filename, *self.export_arrays())
+
+    def write_stl(self, filename):
+        export.write_stl(filename, *self.export_arrays())
+
+    def write_glb(self, filename):
+        export.write_glb(filename, *self.export_arrays())
+
+    def write_npz(self, filename):
+        affine = self.affine or Affine.identity()
+        export.write_npz(filename, *self.export_arrays(), transform=affine[:6])
+
+    def write_progressive(self, filename):
+        """
+        Write the insertion history as progressive mesh, see
+        export.write_progressive
+        """
+        affine = self.affine or Affine.identity()
+        vertices, faces, born, died, errors = self.progressive_arrays()
+        vertices, faces = export.georeference(vertices, faces, affine)
+        export.write_progressive(filename, vertices, faces, born, died, errors,
+                                 transform=affine[:6])
+
     def write_obj(self, filename):
-        if not self.affine:
-            self.affine = Affine.identity()
-        coordinates = np.array([self.affine * v.pos[:2] + tuple([v.pos[2]]) for v in self.vertices])
-        v_fmt = "v %.3f %.3f %.3f"
-        triangles = [[self.vertices.index(vertex) for vertex in triangle.vertices][::-1] for triangle in self.triangles]
+        vertices, faces = self.mesh_arrays()
+        coordinates = self.world_coordinates(vertices)
+        del vertices
+
+        texture_coordinates = coordinates[:, :2] - coordinates[:, :2].min(axis=0)
+        texture_coordinates /= np.ptp(texture_coordinates, axis=0)
 
-        texture_coordinates = coordinates[:, :2].copy()
-        texture_coordinates -= texture_coordinates.min(axis=0)
-        texture_coordinates /= texture_coordinates.ptp(axis=0)
+        # Same winding as before: reversed vertex order, indices start at 1
+        faces = faces[:, ::-1] + 1
 
         with open(filename, 'wb') as outfile:
-            np.savetxt(outfile, coordinates, fmt=v_fmt)
-            np.savetxt(outfile, texture_coordinates, fmt="vt %.3f %.3f")
-            np.savetxt(outfile,
-                       np.dstack([triangles, triangles]).reshape(-1, 6) + 1,
-                       fmt="f %i/%i/ %i/%i/ %i/%i/")
+            write_rows(outfile, "v %.3f %.3f %.3f\n", coordinates,
+                       self.export_chunk_size)
+            write_rows(outfile, "vt %.3f %.3f\n", texture_coordinates,
+                       self.export_chunk_size)
+            write_rows(outfile, "f %i/%i/ %i/%i/ %i/%i/\n",
+                       faces, self.export_chunk_size, repeat=2)
+
+
+def write_rows(outfile, fmt, rows, chunk_size, repeat=1):
+    """
+    Write a 2D array as text, formatting chunk_size rows at a time
+    :param fmt: printf style format of one row including the newline
+    :param repeat: number of times each column is repeated in fmt
+    """
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        if repeat > 1:
+            chunk = np.repeat(chunk, repeat, axis=1)
+        values = tuple(chunk.ravel().tolist())
+        outfile.write((fmt * len(chunk) % values).encode('ascii'))
@@ -0,0 +1,21 @@
+from setuptools import setup, Extension
+from Cython.Build import cythonize
+
+extensions = [
+    Extension('grid2tin.calculation', ['grid2tin/calculation.pyx'],
+              extra_compile_args=['-O3']),
+]
+
+setup(
+    name='grid2tin',
+    version='0.1.0',
+    description="Python implementation of Garland and Heckbert's terrain "
+                "approximation algorithm",
+    url='https://github.com/umeier/GridToTIN',
+    license='MIT',
+    packages=['grid2tin'],
+    python_requires='>=3.8',
+    ext_modules=cythonize(extensions),
+    install_requires=['numpy', 'rasterio', 'affine'],
+    zip_safe=False,
+)
@@ -0,0 +1,40 @@
+class MeshAssertions:
+    """
+    Checks of the mesh and heap of a Triangulation, mixed into
+    unittest.TestCase classes
+    """
+    def assert_valid_mesh(self, tri):
+        # Euler's formula for a triangulated rectangle without degenerate faces
+        boundary = [v for v in tri.vertices
+                    if v.x in (tri.min_x, tri.max_x) or
+                    v.y in (tri.min_y, tri.max_y)]
+        triangles = tri.triangles
+        self.assertEqual(len(triangles),
+                         2 * len(tri.vertices) - len(boundary) - 2)
+        self.assertEqual(sum(t.area for t in triangles),
+                         2 * tri.max_x * tri.max_y)
+        for t in triangles:
+            self.assertGreater(t.area, 0)
+            self.assertIs(t.anchor.triangle, t)
+
+    def assert_delaunay(self, tri):
+        """
+        Valid mesh in which no vertex opposite to an edge lies inside of the
+        circumcircle of the triangle on the other side. Locally Delaunay
+        edges make the whole triangulation Delaunay, the mesh can only differ
+        from others in cocircular diagonals.
+        """
+        self.assert_valid_mesh(tri)
+        for t in tri.triangles:
+            e = t.anchor
+            for f in (e, e.l_next, e.l_prev):
+                if not tri.on_border(f):
+                    opposite = f.sym.l_prev.origin
+                    self.assertFalse(opposite.in_circle(*t.vertices))
+
+    def assert_heap(self, tri):
+        # Every live triangle is scanned and on the heap exactly once
+        self.assertEqual(len(tri.heap), len(tri.triangles))
+        for t in tri.triangles:
+            self.assertTrue(t.scanned)
+            self.assertIs(tri.heap.elements[t.id][1], t)
@@ -0,0 +1,73 @@
+import unittest
+
+from grid2tin.arraymesh import ArrayMesh
+from grid2tin.quadedge import Vertex
+
+
+class TestArrayMesh(unittest.TestCase):
+    def setUp(self):
+        self.mesh = ArrayMesh()
+
+    def test_quadedge(self):
+        e = self.mesh.make_edge(Vertex(0, 0), Vertex(1, 0))
+
+        self.assertNotEqual(e, e.rot)
+        self.assertEqual(e, e.rot.rot.rot.rot)
+        self.assertEqual(e.rot.rot.rot, e.inv_rot)
+
+        self.assertNotEqual(e, e.sym)
+        self.assertEqual(e, e.sym.sym)
+
+        self.assertEqual(e.o_next, e)
+        self.assertEqual(e.o_prev, e)
+        self.assertEqual(e.d_next, e)
+        self.assertEqual(e.d_prev, e)
+
+        self.assertEqual(e.l_next, e.sym)
+        self.assertEqual(e.l_prev, e.sym)
+        self.assertEqual(e.r_next, e.sym)
+        self.assertEqual(e.r_prev, e.sym)
+
+    def test_splice(self):
+        e0 = self.mesh.make_edge(Vertex(0, 0), Vertex(1, 0))
+        e1 = self.mesh.make_edge(Vertex(0, 0), Vertex(0, 1))
+
+        self.assertNotEqual(e0, e1)
+        self.assertEqual(e0.o_next, e0)
+
+        self.mesh.splice(e0, e1)
+
+        self.assertEqual(e0.o_next, e1)
+        self.assertEqual(e1.o_next, e0)
+
+        self.assertEqual(e0.l_next, e0.sym)
+        self.assertEqual(e0.l_prev, e1.sym)
+
+    def test_connect_swap(self):
+        v0, v1, v2, v3 = Vertex(0, 0), Vertex(2, 0), Vertex(2, 2), Vertex(0, 2)
+        a = self.mesh.make_edge(v0, v1)
+        b = self.mesh.make_edge(v1, v2)
+        self.mesh.splice(a.sym, b)
+        c = self.mesh.connect(b, a)
+        self.assertIs(c.origin, v2)
+        self.assertIs(c.destination, v0)
+        self.assertEqual(a.l_next, b)
+        self.assertEqual(b.l_next, c)
+        self.assertEqual(c.l_next, a)
+
+        d = self.mesh.make_edge(v2, v3)
+        self.mesh.splice(d, c)
+        self.mesh.connect(d, a)
+        self.mesh.swap(c)
+        self.assertIs(c.origin, v1)
+        self.assertIs(c.destination, v3)
+
+    def test_delete_edge_reuses_slots(self):
+        e0 = self.mesh.make_edge(Vertex(0, 0), Vertex(1, 0))
+        self.mesh.make_edge(Vertex(0, 0), Vertex(0, 1))
+        self.assertEqual(len(self.mesh), 2)
+        self.mesh.delete_edge(e0)
+        self.assertEqual(len(self.mesh), 1)
+        e2 = self.mesh.make_edge(Vertex(1, 1), Vertex(2, 2))
+        self.assertEqual(e2.index, e0.index)
+        self.assertEqual(len(self.mesh.next), 8)
@@ -0,0 +1,61 @@
+import os
+import unittest
+
+import numpy as np
+
+from grid2tin.triangulation import Triangulation
+from mesh_assertions import MeshAssertions
+
+
+class TestBootstrap(MeshAssertions, unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data/dgm5.tif')
+
+    def test_from_points(self):
+        rng = np.random.RandomState(5)
+        xs = rng.randint(0, 201, 300)
+        ys = rng.randint(0, 401, 300)
+        for backend in ('quadedge', 'array'):
+            reference = Triangulation(self.path, minimum_gap=2)
+            reference.insert_points(xs, ys)
+            tri = Triangulation.from_points(self.path, xs, ys, minimum_gap=2,
+                                            backend=backend)
+            self.assertEqual(sorted(v.pos for v in tri.vertices),
+                             sorted(v.pos for v in reference.vertices))
+            np.testing.assert_array_equal(tri.available, reference.available)
+            self.assert_delaunay(tri)
+            self.assert_heap(tri)
+            self.assertAlmostEqual(tri.heap.max()[0], reference.heap.max()[0])
+            tri.refine(max_vertices=600)
+            self.assert_delaunay(tri)
+
+    def test_collinear_points(self):
+        ys = np.arange(0, 401, 7)
+        tri = Triangulation.from_points(self.path, np.full(len(ys), 100), ys,
+                                        minimum_gap=0)
+        self.assert_delaunay(tri)
+        tri = Triangulation.from_points(self.path, [], [], minimum_gap=0)
+        self.assertEqual(len(tri.triangles), 2)
+
+    def test_from_lattice(self):
+        tri = Triangulation.from_lattice(self.path, 25, minimum_gap=0,
+                                         progressive=True)
+        # Columns 0, 25, ..., 200 and rows 0, 25, ..., 400
+        self.assertEqual(len(tri.vertices), 9 * 17)
+        self.assertEqual(len(tri.triangles), 2 * 8 * 16)
+        self.assert_delaunay(tri)
+        self.assert_heap(tri)
+        self.assertEqual(tri.heap.max()[0],
+                         max(t.candidate_error for t in tri.triangles))
+
+        n = tri.initial_vertices
+        tri.refine(max_vertices=n + 50)
+        vertices, faces = tri.lod_mesh(n)
+        self.assertEqual(len(vertices), n)
+        self.assertEqual(len(faces), 2 * 8 * 16)
+        with self.assertRaises(ValueError):
+            tri.lod_mesh(4)
+        with self.assertRaises(IndexError):
+            Triangulation.from_points(self.path, [0, 201], [0, 0])
+        with self.assertRaises(ValueError):
+            Triangulation.from_points(self.path, [10, 40.5], [11, 30.5])
@@ -0,0 +1,156 @@
+import unittest
+
+import numpy as np
+
+from grid2tin import pycalculation
+from grid2tin.quadedge import Vertex
+
+try:
+    from grid2tin import calculation
+except ImportError:
+    calculation = None
+
+
+@unittest.skipIf(calculation is None, 'compiled extension not built')
+class TestCalculationFallback(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(42)
+        self.dem = rng.uniform(0, 100, (60, 80))
+        self.available = np.ones(self.dem.shape, dtype=np.uint8)
+        self.available[rng.uniform(size=self.dem.shape) < 0.3] = 0
+        self.triangles = [rng.randint(0, 60, 6) for _ in range(200)]
+
+    def test_scan_triangle_candidate(self):
+        for x0, y0, x1, y1, x2, y2 in self.triangles:
+            if (x1 - x0) * (y2 - y0) == (y1 - y0) * (x2 - x0):
+                continue
+            args = (self.available, self.dem,
+                    float(x0), int(y0), float(x1), int(y1), float(x2), int(y2),
+                    0.5, -0.25, 10.0, -1.0)
+            compiled = calculation.scan_triangle_candidate(*args)
+            fallback = pycalculation.scan_triangle_candidate(*args)
+            self.assertEqual(compiled[:5], fallback[:5])
+            # Summation order differs
+            self.assertAlmostEqual(compiled[5], fallback[5],
+                                   delta=1e-9 * compiled[5])
+
+    def test_scan_triangle_decimated(self):
+        for step in (2, 3, 4):
+            available = self.available[::step, ::step]
+            dem = np.ascontiguousarray(self.dem[::step, ::step])
+            # Full resolution scan restricted to the pixels of the level
+            sampled = np.zeros_like(self.available)
+            sampled[::step, ::step] = available
+            for x0, y0, x1, y1, x2, y2 in self.triangles:
+                if (x1 - x0) * (y2 - y0) == (y1 - y0) * (x2 - x0):
+                    continue
+                args = (float(x0), int(y0), float(x1), int(y1), float(x2),
+                        int(y2), 0.5, -0.25, 10.0, -1.0)
+                compiled = calculation.scan_triangle_candidate(
+                    available, dem, *args, step=step)
+                fallback = pycalculation.scan_triangle_candidate(
+                    available, dem, *args, step=step)
+                full = calculation.scan_triangle_candidate(
+                    sampled, self.dem, *args)
+                self.assertEqual(compiled[:5], fallback[:5])
+                self.assertAlmostEqual(compiled[5], fallback[5],
+                                       delta=1e-9 * compiled[5])
+                self.assertEqual(compiled[1:5], full[1:5])
+
+    def test_scan_triangle_voids(self):
+        available = self.available.copy()
+        available[10:40, 5:50] = pycalculation.VOID
+        dem = self.dem.copy()
+        dem[10:40, 5:50] = np.nan
+        # Without data the pixels neither count nor become candidates
+        unavailable = available.copy()
+        unavailable[10:40, 5:50] = 0
+        for x0, y0, x1, y1, x2, y2 in self.triangles:
+            if (x1 - x0) * (y2 - y0) == (y1 - y0) * (x2 - x0):
+                continue
+            args = (float(x0), int(y0), float(x1), int(y1), float(x2),
+                    int(y2), 0.5, -0.25, 10.0, -1.0)
+            compiled = calculation.scan_triangle_candidate(
+                available, dem, *args, voids=True)
+            fallback = pycalculation.scan_triangle_candidate(
+                available, dem, *args, voids=True)
+            full = calculation.scan_triangle_candidate(
+                unavailable, self.dem, *args)
+            self.assertEqual(compiled[:5], fallback[:5])
+            self.assertEqual(compiled[1:5], full[1:5])
+            self.assertFalse(np.isnan(compiled[5]))
+            self.assertAlmostEqual(compiled[5], fallback[5],
+                                   delta=1e-9 * compiled[5])
+
+    def test_rasterize_faces(self):
+        vertices = np.array([(0, 0, 1.0), (79, 0, 2.0), (79, 59, 4.0),
+                             (0, 59, 3.0), (40, 20, -5.0)])
+        faces = np.array([(0, 1, 4), (1, 2, 4), (2, 3, 4), (3, 0, 4)],
+                         dtype=np.intp)
+        for y_off, rows in ((0, 60), (13, 20)):
+            compiled = np.full((rows, 80), np.nan)
+            fallback = compiled.copy()
+            calculation.rasterize_faces(compiled, vertices, faces, 0, y_off)
+            pycalculation.rasterize_faces(fallback, vertices, faces, 0, y_off)
+            np.testing.assert_array_equal(compiled, fallback)
+            self.assertFalse(np.isnan(compiled).any())
+
+    def test_predicates(self):
+        rng = np.random.RandomState(7)
+        for scale, cast in ((60, int), (2 ** 29, int), (60, float)):
+            for _ in range(500):
+                v, v0, v1, v2 = (Vertex(cast(rng.randint(0, scale)),
+                                        cast(rng.randint(0, scale)))
+                                 for _ in range(4))
+                for module in (calculation, pycalculation):
+                    self.assertEqual(module.triangle_area(v0, v1, v2),
+                                     pycalculation.triangle_area(v0, v1, v2))
+                    self.assertEqual(module.ccw(v0, v1, v2),
+                                     pycalculation.ccw(v0, v1, v2))
+                    self.assertEqual(module.in_triangle(v, v0, v1, v2),
+                                     pycalculation.in_triangle(v, v0, v1, v2))
+                    self.assertEqual(module.in_circle(v, v0, v1, v2),
+                                     pycalculation.in_circle(v, v0, v1, v2))
+                    # Points on the segment and next to it
+                    step = rng.randint(0, 5)
+                    on = Vertex(v0.x + step * (v1.x - v0.x) // 4,
+                                v0.y + step * (v1.y - v0.y) // 4)
+                    for point in (v, on):
+                        self.assertEqual(
+                            module.on_segment(point, v0, v1),
+                            pycalculation.on_segment(point, v0, v1))
+
+    def test_fallback_warning(self):
+        # Importing the fallback does not warn, falling back does once
+        self.addCleanup(setattr, pycalculation, 'warned', pycalculation.warned)
+        pycalculation.warned = False
+        with self.assertLogs(level='WARNING') as logs:
+            pycalculation.warn_fallback()
+            pycalculation.warn_fallback()
+        self.assertEqual(len(logs.output), 1)
+
+    def test_predicates_large_ints(self):
+        # The lifted coordinates of the incircle test overflow 64 bits, the
+        # predicates fall back to double precision
+        for scale in (2 ** 30, 2 ** 33, 2 ** 70):
+            v0, v1, v2 = Vertex(0, 0), Vertex(scale, 0), Vertex(0, scale)
+            inside = Vertex(scale - scale // 8 - 1, scale - scale // 8)
+            outside = Vertex(scale + scale // 2, scale + scale // 2)
+            for module in (calculation, pycalculation):
+                self.assertTrue(module.ccw(v0, v1, v2))
+                self.assertTrue(module.in_circle(inside, v0, v1, v2))
+                self.assertFalse(module.in_circle(outside, v0, v1, v2))
+                self.assertTrue(module.in_triangle(Vertex(1, 1), v0, v1, v2))
+
+    def test_on_segment_exact(self):
+        # Collinear points far from the origin, off by one pixel
+        v0 = Vertex(1000000, 3000000)
+        v1 = Vertex(1000003, 3000007)
+        for module in (calculation, pycalculation):
+            self.assertTrue(module.on_segment(v1, v0, v1))
+            self.assertTrue(module.on_segment(Vertex(999997, 2999993),
+                                              Vertex(999994, 2999986), v1))
+            self.assertFalse(module.on_segment(Vertex(1000002, 3000004),
+                                               v0, v1))
+            self.assertFalse(module.on_segment(Vertex(1000006, 3000014),
+                                               v0, v1))
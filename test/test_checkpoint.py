@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from grid2tin.triangulation import Triangulation
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data/dgm5.tif')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.filename = os.path.join(self.directory.name, 'checkpoint.npz')
+
+    def assert_resumes(self, **options):
+        tri = Triangulation(self.path, keep_history=False, **options)
+        tri.refine(max_vertices=500)
+        tri.save_checkpoint(self.filename)
+        resumed = Triangulation.load_checkpoint(self.filename, self.path)
+
+        self.assertEqual([resumed.insert_next() for _ in range(500)],
+                         [tri.insert_next() for _ in range(500)])
+        for expected, actual in zip(tri.mesh_arrays(), resumed.mesh_arrays()):
+            np.testing.assert_array_equal(actual, expected)
+        np.testing.assert_array_equal(resumed.available, tri.available)
+        self.assertEqual(resumed.rmse() if not tri.lazy else None,
+                         tri.rmse() if not tri.lazy else None)
+        self.assertEqual(len(resumed.edge_dict), len(tri.edge_dict))
+        return tri, resumed
+
+    def test_resume(self):
+        self.assert_resumes(minimum_gap=2)
+
+    def test_resume_variants(self):
+        self.assert_resumes(minimum_gap=0, lazy=True)
+        self.assert_resumes(minimum_gap=1, backend='array')
+        tri, resumed = self.assert_resumes(minimum_gap=0, progressive=True)
+        for expected, actual in zip(tri.progressive_arrays(),
+                                    resumed.progressive_arrays()):
+            np.testing.assert_array_equal(actual, expected)
+
+    def test_refine_checkpoint_every(self):
+        tri = Triangulation(self.path, minimum_gap=0, keep_history=False)
+        tri.refine(max_vertices=354, checkpoint_every=100,
+                   checkpoint_path=self.filename)
+        resumed = Triangulation.load_checkpoint(self.filename, self.path)
+        self.assertEqual(len(resumed.vertex_dict), 304)
+        resumed.refine(max_vertices=354)
+        np.testing.assert_array_equal(resumed.mesh_arrays()[1],
+                                      tri.mesh_arrays()[1])
+
+        with self.assertRaises(ValueError):
+            tri.refine(checkpoint_every=10)
+        with self.assertRaises(ValueError):
+            Triangulation.load_checkpoint(self.filename, np.zeros((10, 10)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import json
+import os
+import struct
+import tempfile
+import unittest
+
+import numpy as np
+
+from grid2tin import export
+from grid2tin.triangulation import Triangulation
+
+
+class TestExport(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data/dgm5.tif')
+        cls.tri = Triangulation(path, minimum_gap=0)
+        for _ in range(300):
+            cls.tri.insert_next()
+        cls.vertices, cls.faces = cls.tri.export_arrays()
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def filename(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def assert_counter_clockwise(self, vertices, faces):
+        a, b, c = vertices[faces[:, 0]], vertices[faces[:, 1]], vertices[faces[:, 2]]
+        area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - \
+               (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+        self.assertTrue(np.all(area > 0))
+
+    def test_export_arrays(self):
+        self.assertEqual(self.vertices.shape, (len(self.tri.vertices), 3))
+        self.assertEqual(self.faces.shape, (len(self.tri.triangles), 3))
+        x, y = self.tri.affine * self.tri.vertices[5].pos[:2]
+        np.testing.assert_allclose(self.vertices[5, :2], (x, y))
+        self.assert_counter_clockwise(self.vertices, self.faces)
+
+    def test_write_ply(self):
+        filename = self.filename('mesh.ply')
+        self.tri.write_ply(filename)
+        with open(filename, 'rb') as f:
+            data = f.read()
+        header, body = data.split(b'end_header\n', 1)
+        self.assertIn(b'format binary_little_endian 1.0', header)
+        n = len(self.vertices)
+        vertices = np.frombuffer(body, '<f8', 3 * n).reshape(-1, 3)
+        faces = np.frombuffer(body[24 * n:], [('count', 'u1'),
+                                              ('indices', '<i4', 3)])
+        np.testing.assert_array_equal(vertices, self.vertices)
+        np.testing.assert_array_equal(faces['count'], 3)
+        np.testing.assert_array_equal(faces['indices'], self.faces)
+
+    def test_write_stl(self):
+        filename = self.filename('mesh.stl')
+        self.tri.write_stl(filename)
+        with open(filename, 'rb') as f:
+            f.seek(80)
+            count, = struct.unpack('<I', f.read(4))
+            records = np.frombuffer(f.read(), [('normal', '<f4', 3),
+                                               ('corners', '<f4', (3, 3)),
+                                               ('attributes', '<u2')])
+        self.assertEqual(count, len(self.faces))
+        self.assertEqual(len(records), count)
+        np.testing.assert_allclose(records['corners'],
+                                   self.vertices[self.faces], rtol=1e-6)
+        self.assertTrue(np.all(records['normal'][:, 2] > 0))
+
+    def test_write_glb(self):
+        filename = self.filename('mesh.glb')
+        self.tri.write_glb(filename)
+        with open(filename, 'rb') as f:
+            data = f.read()
+        magic, version, length = struct.unpack_from('<4sII', data)
+        self.assertEqual((magic, version, length), (b'glTF', 2, len(data)))
+        json_length, = struct.unpack_from('<I', data, 12)
+        gltf = json.loads(data[20:20 + json_length])
+        binary = data[28 + json_length:]
+        self.assertEqual(gltf['extensionsRequired'], ['KHR_mesh_quantization'])
+
+        node = gltf['nodes'][0]
+        positions = np.frombuffer(binary, '<u2', 4 * len(self.vertices))
+        positions = positions.reshape(-1, 4)[:, :3] * node['scale'] + \
+                    node['translation']
+        expected = np.column_stack([self.vertices[:, 0], self.vertices[:, 2],
+                                    -self.vertices[:, 1]])
+        np.testing.assert_allclose(positions, expected,
+                                   atol=max(node['scale']))
+
+        view = gltf['bufferViews'][1]
+        indices = np.frombuffer(binary, '<u2', view['byteLength'] // 2,
+                                view['byteOffset'])
+        np.testing.assert_array_equal(indices.reshape(-1, 3), self.faces)
+
+    def test_write_npz(self):
+        filename = self.filename('mesh.npz')
+        self.tri.write_npz(filename)
+        with np.load(filename) as data:
+            np.testing.assert_array_equal(data['vertices'], self.vertices)
+            np.testing.assert_array_equal(data['faces'], self.faces)
+            np.testing.assert_array_equal(data['transform'],
+                                          self.tri.affine[:6])
+
+    def test_write_progressive(self):
+        tri = Triangulation(self.tri.dem, minimum_gap=0, progressive=True)
+        tri.affine = self.tri.affine
+        tri.refine(max_vertices=len(self.vertices))
+        filename = self.filename('progressive.npz')
+        tri.write_progressive(filename)
+        with np.load(filename) as data:
+            self.assertTrue(np.all(np.diff(data['born']) >= 0))
+            np.testing.assert_array_equal(data['vertices'], self.vertices)
+            for n in (4, 100, len(self.vertices)):
+                faces = export.lod_faces(data['faces'], data['born'],
+                                         data['died'], n)
+                expected = export.georeference(*tri.lod_mesh(n),
+                                               tri.affine)[1]
+                self.assertEqual(sorted(map(tuple, faces)),
+                                 sorted(map(tuple, expected)))
+            self.assertEqual(sorted(map(tuple, faces)),
+                             sorted(map(tuple, self.faces)))
+
+
+if __name__ == '__main__':
+    unittest.main()
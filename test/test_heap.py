@@ -0,0 +1,74 @@
+import random
+import unittest
+
+from grid2tin.heap import Heap
+
+
+class TestHeap(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(0)
+        self.heap = Heap()
+
+    def pop_all(self):
+        keys = []
+        while len(self.heap):
+            keys.append(self.heap.pop()[0])
+        return keys
+
+    def test_pop_order(self):
+        keys = [self.rng.random() for _ in range(200)]
+        for key in keys:
+            self.heap.insert(key, key)
+        self.assertEqual(self.pop_all(), sorted(keys, reverse=True))
+
+    def test_float64_keys(self):
+        # These are equal in float32
+        self.heap.insert(1000000.01, 'a')
+        self.heap.insert(1000000.02, 'b')
+        self.assertEqual(self.heap.pop(), (1000000.02, 'b'))
+
+    def test_delete_recycles_ids(self):
+        ids = [self.heap.insert(i, i) for i in range(10)]
+        for i in ids[::2]:
+            self.heap.delete(i)
+        self.heap.del_max()
+        self.assertFalse(self.heap.contains(ids[9]))
+        new = [self.heap.insert(i, i) for i in range(10, 16)]
+        self.assertEqual(set(new), set(ids[::2]) | {ids[9]})
+        self.assertEqual(len(self.heap.keys), 11)
+        self.assertEqual(self.pop_all(), [15, 14, 13, 12, 11, 10, 7, 5, 3, 1])
+
+    def test_change_key(self):
+        ids = [self.heap.insert(i, i) for i in range(20)]
+        self.heap.change_key(ids[3], 100)
+        self.heap.change_key(ids[19], -1)
+        self.heap.change_key(ids[10], 10.5)
+        self.assertEqual(self.heap.max(), (100, 3))
+        keys = self.pop_all()
+        self.assertEqual(keys, sorted(keys, reverse=True))
+        self.assertEqual(keys[-1], -1)
+
+    def test_stale_ids(self):
+        ids = [self.heap.insert(i, i) for i in range(5)]
+        self.heap.delete(ids[2])
+        for i in (ids[2], -1, 0, 99):
+            with self.assertRaises(IndexError):
+                self.heap.change_key(i, 10)
+            with self.assertRaises(IndexError):
+                self.heap.delete(i)
+        self.assertEqual(self.pop_all(), [4, 3, 1, 0])
+
+    def test_heapify(self):
+        self.heap.insert(0.5, 'x')
+        keys = [self.rng.random() for _ in range(100)]
+        ids = self.heap.heapify(keys, list(range(100)))
+        self.assertEqual(len(self.heap), 101)
+        for i, key in zip(ids, keys):
+            self.assertEqual(self.heap.keys[i], key)
+        self.assertEqual(self.pop_all(), sorted(keys + [0.5], reverse=True))
+        with self.assertRaises(ValueError):
+            self.heap.heapify([1.0], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
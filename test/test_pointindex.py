@@ -0,0 +1,69 @@
+import os
+import unittest
+
+import numpy as np
+
+from grid2tin.pointindex import PointIndex
+from grid2tin.quadedge import Vertex
+from grid2tin.triangulation import Triangulation
+
+
+class TestPointIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data/dgm5.tif')
+        cls.tri = Triangulation(path, minimum_gap=0)
+        cls.tri.refine(max_vertices=1000)
+
+    def test_sample_pixels(self):
+        tri = self.tri
+        ys, xs = np.mgrid[0:tri.max_y + 1, 0:tri.max_x + 1]
+        z, ids = tri.sample(xs, ys)
+        self.assertEqual(z.shape, xs.shape)
+        self.assertTrue(np.all(ids >= 0))
+        np.testing.assert_allclose(z, tri.interpolated_map(), atol=1e-9)
+
+    def test_sample_points(self):
+        tri = self.tri
+        rng = np.random.RandomState(3)
+        xs = rng.uniform(-5, tri.max_x + 5, 500)
+        ys = rng.uniform(-5, tri.max_y + 5, 500)
+        z, ids = tri.sample(xs, ys)
+        faces = tri.mesh_arrays()[1]
+        for x, y, z_point, i in zip(xs, ys, z, ids):
+            e = tri.search(Vertex(x, y))
+            if e is None:
+                self.assertEqual(i, -1)
+                self.assertTrue(np.isnan(z_point))
+                continue
+            expected = {v.id for v in e.triangle.vertices}
+            # Points on shared edges may be assigned to either face
+            if set(faces[i]) != expected:
+                self.assertTrue(Vertex(x, y).on_edge(e) or
+                                Vertex(x, y).on_edge(e.l_next) or
+                                Vertex(x, y).on_edge(e.l_prev))
+            t = e.triangle
+            self.assertAlmostEqual(z_point, t.a * x + t.b * y + t.c)
+
+        world_x, world_y = tri.affine * (xs, ys)
+        np.testing.assert_allclose(tri.sample(world_x, world_y, world=True)[0],
+                                   z, atol=1e-6)
+
+    def test_index_rebuilt(self):
+        tri = Triangulation(np.zeros((20, 30)), minimum_gap=0)
+        tri.sample([1.0], [1.0])
+        index = tri.point_index
+        tri.insert_point(Vertex(10, 10, 5.0))
+        self.assertEqual(tri.sample([10], [10])[0][0], 5.0)
+        self.assertIsNot(tri.point_index, index)
+
+    def test_empty_cells(self):
+        vertices = np.array([(0, 0, 0.0), (100, 0, 1.0), (0, 100, 2.0)])
+        index = PointIndex(vertices, [(0, 1, 2)])
+        z, ids = index.interpolate([10, 90, 50, 200], [10, 90, 50, 0])
+        np.testing.assert_array_equal(ids, [0, -1, 0, -1])
+        np.testing.assert_allclose(z[[0, 2]], [0.3, 1.5])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import rasterio
+
+from grid2tin.raster import BlockCachedRaster, kernel_dtype, raster_to_npy
+from grid2tin.triangulation import Triangulation
+
+
+class TestRaster(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data/dgm5.tif')
+        with rasterio.open(self.path) as src:
+            self.data = src.read(1)
+
+    def insert_sequence(self, tri, n=300):
+        return [tri.insert_next() for _ in range(n)]
+
+    def test_kernel_dtype(self):
+        self.assertEqual(kernel_dtype(np.int16), np.int16)
+        self.assertEqual(kernel_dtype(np.float32), np.float32)
+        self.assertEqual(kernel_dtype(np.uint8), np.int16)
+        self.assertEqual(kernel_dtype(np.uint32), np.int64)
+        self.assertEqual(kernel_dtype(np.float16), np.float32)
+
+    def test_block_cached_raster(self):
+        with BlockCachedRaster(self.path, block_size=64,
+                               cache_blocks=4) as raster:
+            self.assertEqual(raster.shape, self.data.shape)
+            self.assertEqual(raster.dtype, self.data.dtype)
+            np.testing.assert_array_equal(raster[:, :], self.data)
+            np.testing.assert_array_equal(raster[100:230, 7:190],
+                                          self.data[100:230, 7:190])
+            self.assertEqual(raster[300, 150], self.data[300, 150])
+            self.assertEqual(raster[-1, -1], self.data[-1, -1])
+            self.assertLessEqual(len(raster.cache), 4)
+            misses = raster.misses
+            raster[-2, -2]
+            self.assertEqual(raster.misses, misses)
+            with self.assertRaises(IndexError):
+                raster[401, 0]
+
+    def test_windowed_triangulation(self):
+        reference = Triangulation(self.path, minimum_gap=2)
+        with Triangulation(self.path, minimum_gap=2, windowed=True) as tri:
+            tri.dem.block_size = 64
+            tri.dem.cache_blocks = 4
+            tri.dem.cache.clear()
+            self.assertEqual(self.insert_sequence(tri),
+                             self.insert_sequence(reference))
+            self.assertEqual(tri.affine, reference.affine)
+        self.assertTrue(tri.dem.src.closed)
+        reference.close()
+
+    def test_npy_memmap(self):
+        with tempfile.TemporaryDirectory() as directory:
+            npy_path = os.path.join(directory, 'dgm5.npy')
+            raster_to_npy(self.path, npy_path, rows=50)
+            tri = Triangulation(npy_path, minimum_gap=2)
+            self.assertFalse(tri.dem.flags.owndata)
+            self.assertFalse(tri.dem.flags.writeable)
+            self.assertEqual(tri.dem.dtype, np.float32)
+            reference = Triangulation(self.path, minimum_gap=2)
+            self.assertEqual(self.insert_sequence(tri),
+                             self.insert_sequence(reference))
+            del tri
+
+    def test_native_integer_dtype(self):
+        dem = np.round(self.data).astype(np.int16)
+        tri = Triangulation(dem, minimum_gap=0)
+        self.assertIs(tri.dem, dem)
+        reference = Triangulation(dem.astype(float), minimum_gap=0)
+        self.assertEqual(self.insert_sequence(tri),
+                         self.insert_sequence(reference))
+        self.assertEqual(tri.interpolated_map().dtype, float)
+
+    def test_write_error_map(self):
+        tri = Triangulation(self.path, minimum_gap=0, windowed=True)
+        self.addCleanup(tri.close)
+        tri.refine(max_vertices=300)
+        tri.error_map_rows = 128
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'error.tif')
+            tri.write_error_map(filename)
+            with rasterio.open(filename) as src:
+                self.assertTrue(src.profile['tiled'])
+                self.assertEqual(src.transform, tri.affine)
+                np.testing.assert_array_equal(
+                    src.read(1), tri.error_map().astype(np.float32))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import pickle
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from grid2tin.sharedmem import SharedDEM
+from grid2tin.tiling import TiledTriangulation
+from grid2tin.triangulation import Triangulation
+
+
+def insert_sequence(dem, n=200):
+    tri = Triangulation(dem, minimum_gap=1)
+    return [tri.insert_next() for _ in range(n)]
+
+
+class TestSharedDEM(unittest.TestCase):
+    def setUp(self):
+        self.dem = np.random.RandomState(0).normal(0, 10, (80, 120)).astype(
+            np.float32)
+        self.shared = SharedDEM(self.dem)
+        self.addCleanup(self.shared.close)
+
+    def test_attach(self):
+        data = pickle.dumps(self.shared)
+        self.assertLess(len(data), 200)
+        attached = pickle.loads(data)
+        array = attached.array
+        np.testing.assert_array_equal(array, self.dem)
+        self.assertFalse(array.flags.writeable)
+        self.assertTrue(self.shared.array.flags.writeable)
+        # Same memory, not a copy
+        self.shared.array[3, 4] = 1000
+        self.assertEqual(array[3, 4], 1000)
+        del array
+        attached.close()
+
+    def test_triangulation(self):
+        tri = Triangulation(self.shared)
+        self.assertEqual(tri.dem.dtype, np.float32)
+        self.assertTrue(np.shares_memory(tri.dem, self.shared.array))
+        self.assertEqual(insert_sequence(self.shared),
+                         insert_sequence(self.dem))
+
+    def test_close_in_use(self):
+        shared = SharedDEM(self.dem)
+        tri = Triangulation(shared)
+        with self.assertRaises(BufferError):
+            shared.close()
+        self.assertFalse(shared.closed)
+        self.assertEqual(tri.dem.sum(), self.dem.sum())
+        del tri
+        shared.close()
+        self.assertTrue(shared.closed)
+        with self.assertRaises(ValueError):
+            shared.array
+
+        # Arrays keep the block alive after the SharedDEM is gone
+        array = SharedDEM(self.dem).array[10:]
+        np.testing.assert_array_equal(array, self.dem[10:])
+
+    def test_workers(self):
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(insert_sequence, [self.shared] * 2))
+        expected = insert_sequence(self.dem)
+        self.assertEqual(results, [expected, expected])
+
+    def test_tiling_sources(self):
+        serial = TiledTriangulation(self.dem, tile_size=40, max_error=15.0,
+                                    workers=1).run()
+        shared = TiledTriangulation(self.shared, tile_size=40,
+                                    max_error=15.0, workers=2).run()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'dem.npy')
+            np.save(path, self.dem)
+            mapped = TiledTriangulation(path, tile_size=40, max_error=15.0,
+                                        workers=2).run()
+        for result in (shared, mapped):
+            np.testing.assert_array_equal(result[0], serial[0])
+            np.testing.assert_array_equal(result[1], serial[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from collections import Counter
+
+import numpy as np
+
+from grid2tin.tiling import TiledTriangulation, simplify_profile
+
+
+class TestTiling(unittest.TestCase):
+    def setUp(self):
+        x = np.linspace(0, 6 * np.pi, 181)
+        y = np.linspace(0, 4 * np.pi, 131)
+        mx, my = np.meshgrid(x, y)
+        self.dem = 20 * np.sin(mx) * np.cos(my) + \
+            np.random.RandomState(0).normal(0, 0.3, mx.shape)
+
+    def test_simplify_profile(self):
+        z = np.array([0, 1, 2, 3, 10, 5, 0, 0, 0])
+        keep = simplify_profile(z, 0.5)
+        self.assertEqual(keep.tolist(), [0, 3, 4, 6, 8])
+        interpolated = np.interp(np.arange(len(z)), keep, z[keep])
+        self.assertLessEqual(np.abs(interpolated - z).max(), 0.5)
+        self.assertEqual(simplify_profile(z, 100).tolist(), [0, 8])
+
+    def test_conforming_mesh(self):
+        tiled = TiledTriangulation(self.dem, tile_size=50, max_error=2.0,
+                                   workers=2)
+        vertices, faces = tiled.run()
+        self.assertEqual((len(tiled.x_bounds), len(tiled.y_bounds)), (5, 4))
+
+        # Positive area and full coverage of the raster
+        a, b, c = (vertices[faces[:, i], :2] for i in range(3))
+        area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - \
+               (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+        self.assertTrue(np.all(area > 0))
+        self.assertEqual(area.sum(), 2 * 180 * 130)
+
+        # Every edge that is used by only one face lies on the raster border,
+        # so there are no cracks or T-junctions along the seams
+        edges = Counter(tuple(sorted(e)) for f in faces.tolist()
+                        for e in ((f[0], f[1]), (f[1], f[2]), (f[2], f[0])))
+        self.assertLessEqual(max(edges.values()), 2)
+        for (i, j), count in edges.items():
+            if count == 1:
+                (x0, y0), (x1, y1) = vertices[i, :2], vertices[j, :2]
+                self.assertTrue((x0 == x1 and x0 in (0, 180)) or
+                                (y0 == y1 and y0 in (0, 130)))
+
+        # Euler characteristic of a disk
+        self.assertEqual(len(vertices) - len(edges) + len(faces), 1)
+        self.assertEqual(len(np.unique(vertices[:, :2], axis=0)),
+                         len(vertices))
+
+    def test_single_process(self):
+        parallel = TiledTriangulation(self.dem, tile_size=60, max_error=3.0,
+                                      workers=2).run()
+        serial = TiledTriangulation(self.dem, tile_size=60, max_error=3.0,
+                                    workers=1).run()
+        np.testing.assert_array_equal(parallel[0], serial[0])
+        np.testing.assert_array_equal(parallel[1], serial[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
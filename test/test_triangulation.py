@@ -1,13 +1,15 @@
 import os
+import tempfile
 import unittest
 
 import numpy as np
 
-from grid2tin.quadedge import Vertex
+from grid2tin.quadedge import Vertex, Triangle
 from grid2tin.triangulation import Triangulation
+from mesh_assertions import MeshAssertions
 
 
-class TestTriangulationRaster(unittest.TestCase):
+class TestTriangulationRaster(MeshAssertions, unittest.TestCase):
     def setUp(self):
         self.path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data/dgm5.tif')
         self.grid = np.array([[0, 0, 1], [0, 0, 0], [1, 0, 0]], np.int32)
@@ -45,6 +47,337 @@ class TestTriangulationRaster(unittest.TestCase):
             tri.insert_point(Vertex(tri.max_x, int(y)))
         self.do_triangulation(tri)
 
+    def test_scan_triangle_matches_row_scan(self):
+        tri = Triangulation(self.path)
+        self.do_triangulation(tri, limit=300)
+        for triangle in tri.triangles:
+            fast = Triangle(triangle.anchor, anchor=False)
+            rows = Triangle(triangle.anchor, anchor=False)
+            tri.scan_triangle(fast)
+            tri.scan_triangle(rows, interpolation_map=np.zeros(tri.dem.shape))
+            self.assertEqual(fast.candidate_error, rows.candidate_error)
+            self.assertEqual(fast.candidate.pos, rows.candidate.pos)
+
+    def test_array_backend(self):
+        reference = Triangulation(self.path, minimum_gap=0)
+        tri = Triangulation(self.path, minimum_gap=0, backend='array')
+        for _ in range(300):
+            self.assertEqual(tri.insert_next(), reference.insert_next())
+        self.assertEqual(len(tri.mesh), len(tri.edge_dict))
+
+    def test_lazy_rescan(self):
+        # Random heights, so there are no ties in the heap order
+        dem = np.random.RandomState(0).normal(0, 10, (150, 150))
+        reference = Triangulation(dem, minimum_gap=0)
+        tri = Triangulation(dem, minimum_gap=0, lazy=True)
+        tri.lazy_min_pixels = 0
+        for _ in range(500):
+            reference.insert_next()
+            tri.insert_next()
+        self.assertEqual(
+            sorted(tuple(v.pos for v in t.vertices) for t in tri.triangles),
+            sorted(tuple(v.pos for v in t.vertices)
+                   for t in reference.triangles))
+        self.assertLessEqual(tri.pixels_scanned, reference.pixels_scanned)
+
+    def test_insert_batch(self):
+        reference = Triangulation(self.path, minimum_gap=0)
+        single = Triangulation(self.path, minimum_gap=0)
+        for _ in range(200):
+            error, count = reference.insert_next()
+            self.assertEqual(single.insert_batch(1), ([error], count))
+
+        tri = Triangulation(self.path, minimum_gap=0, keep_history=False)
+        while len(tri.vertex_dict) < 2000:
+            errors, count = tri.insert_batch(32)
+            self.assertLessEqual(len(errors), 32)
+        self.assertEqual(count, len(tri.vertices))
+        self.assert_delaunay(tri)
+        self.assert_heap(tri)
+
+        # The insertions of a round are independent, the mesh is the one of
+        # inserting the same vertices one by one
+        tri = Triangulation(self.path, minimum_gap=0)
+        rounds = [tri.insert_batch(16)[0] for _ in range(20)]
+        self.assertGreater(sum(map(len, rounds)), 2 * 20)
+        reference = Triangulation(self.path, minimum_gap=0)
+        for v in tri.vertices[4:]:
+            reference.insert_point(Vertex(v.x, v.y))
+        self.assertEqual(sorted(map(tuple, tri.mesh_arrays()[1])),
+                         sorted(map(tuple, reference.mesh_arrays()[1])))
+
+    def test_insert_points(self):
+        rng = np.random.RandomState(3)
+        xs = rng.randint(0, 201, 500)
+        ys = rng.randint(0, 401, 500)
+        reference = Triangulation(self.path, minimum_gap=0)
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            reference.insert_point(Vertex(x, y))
+        tri = Triangulation(self.path, minimum_gap=0)
+        count = tri.insert_points(xs, ys)
+        self.assertEqual(count, len(reference.vertices) - 4)
+        self.assertEqual(sorted(v.pos for v in tri.vertices),
+                         sorted(v.pos for v in reference.vertices))
+        self.assert_delaunay(tri)
+        self.assert_heap(tri)
+        np.testing.assert_array_equal(tri.available, reference.available)
+
+        tri.insert_points([10.0], [20], zs=[123.5])
+        self.assertEqual(tri.vertices[-1].pos, (10, 20, 123.5))
+        # An explicit height of 0 is kept, not replaced by the DEM
+        tri.insert_points([12], [20], zs=[0.0])
+        self.assertEqual(tri.vertices[-1].pos, (12, 20, 0.0))
+        self.assertNotEqual(tri.dem[20, 12], 0)
+        with self.assertRaises(IndexError):
+            tri.insert_points([5, 201], [5, 5])
+        # Points off the pixels are rejected before anything is inserted
+        with self.assertRaises(ValueError):
+            tri.insert_points([10, 40.5], [11, 30.5])
+        self.assertEqual(len(tri.vertices), count + 6)
+        self.assert_heap(tri)
+
+    def test_refine(self):
+        reference = Triangulation(self.path, minimum_gap=0)
+        for _ in range(296):
+            reference.insert_next()
+        tri = Triangulation(self.path, minimum_gap=0)
+        calls = []
+        tri.progress_interval = 100
+        error, count = tri.refine(max_vertices=300,
+                                  progress=lambda *args: calls.append(args))
+        self.assertEqual(count, 300)
+        self.assertEqual(error, reference.heap.max()[0])
+        np.testing.assert_array_equal(tri.mesh_arrays()[1],
+                                      reference.mesh_arrays()[1])
+        self.assertEqual([c[0] for c in calls], [104, 204, 300])
+
+        error, count = tri.refine(max_error=2.0)
+        self.assertLessEqual(error, 2.0)
+        self.assertGreater(error, 0.0)
+
+    def test_refine_rmse(self):
+        tri = Triangulation(self.path, minimum_gap=2, keep_history=False)
+        tri.refine(target_rmse=0.5)
+        rmse = tri.rmse()
+        self.assertLessEqual(rmse, 0.5)
+        self.assertGreater(rmse, 0.45)
+        # The running sums match the triangles and the error map
+        triangles = tri.triangles
+        self.assertAlmostEqual(
+            rmse, np.sqrt(sum(t.squared_error for t in triangles) /
+                          sum(t.pixels for t in triangles)))
+        self.assertAlmostEqual(rmse, np.sqrt(np.mean(tri.error_map() ** 2)),
+                               delta=0.05 * rmse)
+
+        with self.assertRaises(ValueError):
+            Triangulation(self.path, lazy=True).refine(target_rmse=1.0)
+
+    def test_pyramid(self):
+        reference = Triangulation(self.path, minimum_gap=0)
+        reference.refine(max_error=1.0)
+        for lazy in (False, True):
+            tri = Triangulation(self.path, minimum_gap=0, lazy=lazy,
+                                pyramid=True)
+            tri.pyramid_samples = 256
+            tri.refine(max_vertices=50)
+            self.assertTrue(any(t.step > 1 for t in tri.triangles))
+            error, count = tri.refine(max_error=1.0)
+            self.assertLessEqual(error, 1.0)
+            self.assertFalse(tri.pyramid)
+            self.assertTrue(all(t.step == 1 for t in tri.triangles))
+            # The guarantee holds against the full resolution DEM, for all
+            # pixels that may still become vertices
+            errors = np.abs(tri.error_map())[tri.available == 1]
+            self.assertLessEqual(errors.max(), 1.0)
+            self.assertLess(abs(count - len(reference.vertices)),
+                            0.1 * count)
+        with self.assertRaises(ValueError):
+            Triangulation(self.path, windowed=True, pyramid=True)
+
+    def test_nodata(self):
+        dem = Triangulation(self.path).dem.astype(np.float64)
+        void = np.zeros(dem.shape, dtype=bool)
+        void[:150, :120] = True
+        void[300:, 150:] = True
+        holes = dem.copy()
+        holes[:150, :120] = np.nan
+        holes[300:, 150:] = -9999.0
+        mask = ~void
+        mask[300:, 150:] = True
+        polygon = {'type': 'Polygon',
+                   'coordinates': [[(0, 0), (120, 0), (120, 150), (0, 150),
+                                    (0, 0)]]}
+        for tri in (Triangulation(holes, minimum_gap=0, nodata=-9999.0),
+                    Triangulation(dem, minimum_gap=0, mask=~void),
+                    Triangulation(holes, minimum_gap=0, mask=mask,
+                                  nodata=-9999.0),
+                    Triangulation(holes, minimum_gap=0, nodata=-9999.0,
+                                  lazy=True)):
+            self.assertTrue(tri.voids)
+            tri.refine(max_error=1.0)
+            for v in tri.vertices:
+                z = dem[v.y, v.x]
+                if (v.x, v.y) not in ((0, 0), (200, 400)):
+                    self.assertFalse(void[v.y, v.x])
+                    self.assertEqual(v.z, z)
+            errors = tri.error_map()
+            np.testing.assert_array_equal(np.isnan(errors), void)
+            self.assertLessEqual(np.abs(errors[tri.available == 1]).max(),
+                                 1.0)
+            if not tri.lazy:
+                rmse = tri.rmse()
+                self.assertAlmostEqual(rmse,
+                                       np.sqrt(np.mean(errors[~void] ** 2)),
+                                       delta=0.05 * rmse)
+                self.assertTrue(all(element[1].pixels for element in
+                                    tri.heap.elements if element))
+        # Polygons in pixel coordinates for arrays
+        tri = Triangulation(dem, minimum_gap=0, mask=[polygon])
+        inside = np.zeros(dem.shape, dtype=bool)
+        inside[:150, :120] = True
+        np.testing.assert_array_equal(tri.available != 2, inside)
+
+        # Without voids nothing changes
+        reference = Triangulation(dem, minimum_gap=0)
+        reference.refine(max_vertices=200)
+        tri = Triangulation(dem, minimum_gap=0, mask=np.ones(dem.shape, bool))
+        self.assertFalse(tri.voids)
+        tri.refine(max_vertices=200)
+        self.assertEqual([v.pos for v in tri.vertices],
+                         [v.pos for v in reference.vertices])
+
+    def test_deferred_voids(self):
+        # Data only in a corner, the initial triangle without it is void.
+        # Found void by a deferred scan, it leaves the heap.
+        dem = Triangulation(self.path).dem.astype(np.float64)
+        mask = np.zeros(dem.shape, dtype=bool)
+        mask[350:, 150:] = True
+        for tri in (Triangulation(dem, minimum_gap=0, mask=mask, lazy=True),
+                    Triangulation(dem, minimum_gap=0, mask=mask,
+                                  pyramid=True)):
+            tri.lazy_min_pixels = 0
+            tri.refine(max_vertices=4)
+            tri.finish_pyramid()
+            self.assertEqual(sum(map(tri.is_void, tri.triangles)), 1)
+            self.assertEqual(len(tri.heap), 1)
+            for t in tri.triangles:
+                self.assertEqual(t.id == -1, tri.is_void(t))
+            tri.refine(max_error=1.0)
+            self.assertFalse(any(tri.is_void(element[1])
+                                 for element in tri.heap.elements if element))
+
+    def test_lod_mesh(self):
+        tri = Triangulation(self.path, minimum_gap=0, progressive=True)
+        tri.refine(max_vertices=400)
+        for n in (4, 5, 57, 200, 400):
+            reference = Triangulation(self.path, minimum_gap=0)
+            reference.refine(max_vertices=n)
+            vertices, faces = tri.lod_mesh(n)
+            expected_vertices, expected_faces = reference.mesh_arrays()
+            np.testing.assert_array_equal(vertices, expected_vertices)
+            self.assertEqual(sorted(map(tuple, faces)),
+                             sorted(map(tuple, expected_faces)))
+
+        # The recorded errors are those of the greedy candidates
+        reference = Triangulation(self.path, minimum_gap=0)
+        greedy = [reference.insert_next()[0] for _ in range(396)]
+        errors = np.array(tri.insertion_errors)
+        self.assertTrue(np.isnan(errors[:4]).all())
+        np.testing.assert_allclose(errors[4:], greedy, rtol=1e-12)
+        n = tri.lod_vertex_count(3.0)
+        self.assertTrue(np.all(errors[n:] <= 3.0))
+        self.assertGreater(errors[n - 1], 3.0)
+        with self.assertRaises(ValueError):
+            Triangulation(self.path).lod_mesh(4)
+
+    def test_interpolated_map(self):
+        tri = Triangulation(self.path, minimum_gap=0)
+        tri.refine(max_vertices=500)
+        expected = np.array(tri.dem, dtype=float)
+        for triangle in tri.triangles:
+            tri.scan_triangle(triangle, expected)
+        np.testing.assert_array_equal(tri.interpolated_map(), expected)
+
+        windows = list(tri.error_map_windows(rows=37))
+        self.assertEqual([row for row, window in windows],
+                         list(range(0, tri.dem.shape[0], 37)))
+        np.testing.assert_array_equal(
+            np.concatenate([window for row, window in windows]),
+            tri.error_map())
+
+    def test_profiling(self):
+        reference = Triangulation(self.path, minimum_gap=2)
+        reference.refine(max_vertices=300)
+        tri = Triangulation(self.path, minimum_gap=2, progressive=True)
+        self.assertIsNone(tri.stats())
+        initial_pixels = tri.pixels_scanned
+        tri.enable_profiling(log_every=100)
+        with self.assertLogs(level='INFO') as logs:
+            tri.refine(max_vertices=300)
+        self.assertEqual(len(logs.output), 2)
+        np.testing.assert_array_equal(tri.mesh_arrays()[1],
+                                      reference.mesh_arrays()[1])
+
+        stats = tri.stats()
+        phases = stats['phases']
+        self.assertEqual(stats['insertions'], 296)
+        self.assertEqual(phases['insert_site']['calls'], 296)
+        self.assertEqual(phases['search']['calls'], 296)
+        self.assertEqual(phases['mark_availability']['calls'], 296)
+        # Every created triangle is scanned once
+        self.assertEqual(phases['scan_triangle']['calls'],
+                         len(tri.record_born) - 2)
+        self.assertGreater(phases['heap']['calls'], 3 * 296)
+        self.assertEqual(stats['pixels_scanned'],
+                         tri.pixels_scanned - initial_pixels)
+        self.assertGreater(stats['swaps_per_insertion'], 0)
+        self.assertGreater(stats['history_depth_max'], 1)
+        self.assertGreaterEqual(phases['insert_site']['seconds'],
+                                phases['mark_availability']['seconds'])
+
+        tri.disable_profiling()
+        self.assertIsNone(tri.stats())
+        self.assertNotIn('insert_site', vars(tri))
+        self.assertNotIn('insert', vars(tri.heap))
+        tri.insert_next()
+
+    def test_mark_availability(self):
+        tri = Triangulation(np.zeros((50, 70)), minimum_gap=0)
+        rng = np.random.RandomState(1)
+        for _ in range(200):
+            v0 = Vertex(*rng.randint(-3, 73, 2))
+            v1 = Vertex(*rng.randint(-3, 73, 2)) if rng.rand() < 0.7 else None
+            if v1 is not None and v0 == v1:
+                continue
+            radius = int(rng.randint(0, 8))
+            value = int(rng.randint(0, 2))
+            expected = tri.available.copy()
+            points = tri.segment_points(v0, v1) if v1 is not None \
+                else [(v0.x, v0.y)]
+            for s in points:
+                for x, y in tri.circle_points(Vertex(*s), radius):
+                    expected[y, x] = value
+            tri.mark_availability(v0, v1, radius=radius, value=value)
+            np.testing.assert_array_equal(tri.available, expected)
+
+    def test_triag_no_history(self):
+        tri = Triangulation(self.path, minimum_gap=1, keep_history=False)
+        x_vals = np.linspace(tri.min_x, tri.max_x, 10)
+        for x in x_vals:
+            tri.insert_point(Vertex(int(x), tri.min_y))
+            tri.insert_point(Vertex(int(x), tri.max_y))
+        self.do_triangulation(tri, limit=2000)
+        self.assertIsNone(tri.history)
+        self.assert_valid_mesh(tri)
+
+    def test_triag_boundary_points(self):
+        tri = Triangulation(self.path, minimum_gap=0)
+        for x in np.linspace(tri.min_x, tri.max_x, 10):
+            tri.insert_point(Vertex(int(x), tri.min_y))
+        for y in np.linspace(tri.min_y, tri.max_y, 10):
+            tri.insert_point(Vertex(tri.max_x, int(y)))
+        self.assert_valid_mesh(tri)
+
     def test_insert_point_out_of_grid(self):
         tri = Triangulation(self.path, minimum_gap=0)
         with self.assertRaises(IndexError):
@@ -52,12 +385,34 @@ class TestTriangulationRaster(unittest.TestCase):
 
     def test_write_obj_minimal_grid(self):
         tri = Triangulation(self.grid, minimum_gap=0)
-        tri.write_obj('grid.obj')
+        with tempfile.TemporaryDirectory() as directory:
+            tri.write_obj(os.path.join(directory, 'grid.obj'))
 
     def test_write_obj(self):
         tri = Triangulation(self.path, minimum_gap=0)
         self.do_triangulation(tri, limit=4000)
-        tri.write_obj('dgm5.obj')
+        with tempfile.TemporaryDirectory() as directory:
+            tri.write_obj(os.path.join(directory, 'dgm5.obj'))
+
+    def test_write_obj_faces(self):
+        tri = Triangulation(self.path, minimum_gap=0)
+        self.do_triangulation(tri, limit=500)
+        tri.export_chunk_size = 100
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'dgm5.obj')
+            tri.write_obj(filename)
+            with open(filename) as f:
+                lines = [line.split() for line in f]
+        coordinates = [tuple(map(float, l[1:])) for l in lines if l[0] == 'v']
+        faces = [[int(c.split('/')[0]) - 1 for c in l[1:]]
+                 for l in lines if l[0] == 'f']
+        self.assertEqual(len(coordinates), len(tri.vertices))
+        self.assertEqual(len(faces), len(tri.triangles))
+        expected = sorted(sorted(tri.affine * v.pos[:2] for v in t.vertices)
+                          for t in tri.triangles)
+        written = sorted(sorted(coordinates[i][:2] for i in face)
+                         for face in faces)
+        np.testing.assert_allclose(written, expected, atol=1e-3)
 
     def do_triangulation(self, tri, limit=100):
         repeat = True